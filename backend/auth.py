@@ -1,4 +1,4 @@
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Header, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 import hmac
@@ -6,15 +6,29 @@ import hashlib
 import json
 import time
 from urllib.parse import parse_qs
-from typing import Dict, Optional
-from models import User
+from typing import AsyncGenerator, Dict, Optional
+from schemas import UserPrincipal
 from services import UserService
+from principal_cache import principal_cache
+from profile_writes import profile_writes
 from database import get_database
+from replica import later_marker, read_session, write_marker
 import os
 
 security = HTTPBearer()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8482163056:AAFO_l3IuliKB6I81JyQ-3_VrZuQ-8S5P-k")
+# Reject tokens whose initData hash does not verify against BOT_TOKEN
+TELEGRAM_VERIFY_HASH = os.getenv("TELEGRAM_VERIFY_HASH", "false").lower() == "true"
+# Shared secret for the /internal/* status routes; they answer 404 while unset
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+
+def verify_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Guard operator-only routes with the X-Internal-Token header"""
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, INTERNAL_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
 
 def verify_telegram_auth(auth_data: str) -> Dict:
     """Verify Telegram Web App authentication"""
@@ -77,11 +91,30 @@ def verify_telegram_hash(auth_data: Dict, bot_token: str) -> bool:
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_database)
-) -> User:
+) -> UserPrincipal:
     """Get current user from token"""
     try:
+        # Tokens already resolved recently skip parsing, the HMAC check and
+        # the user lookup; profile writes invalidate the entry explicitly
+        cache_key = principal_cache.key_for(credentials.credentials)
+        cached = principal_cache.get(cache_key)
+        if cached is not None:
+            hash_verified, principal = cached
+            if TELEGRAM_VERIFY_HASH and not hash_verified:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication hash"
+                )
+            return profile_writes.overlay(principal)
+        
         # Verify auth data
         user_data = verify_telegram_auth(credentials.credentials)
+        hash_verified = verify_telegram_hash(user_data, BOT_TOKEN)
+        if TELEGRAM_VERIFY_HASH and not hash_verified:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication hash"
+            )
         telegram_id = user_data.get('id')
         
         if not telegram_id:
@@ -92,15 +125,17 @@ async def get_current_user(
         
         # Get user from database
         user_service = UserService(db)
-        user = await user_service.get_user_by_telegram_id(int(telegram_id))
+        principal = await user_service.get_principal_by_telegram_id(int(telegram_id))
         
-        if not user:
+        if not principal:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        return user
+        principal_cache.put(cache_key, hash_verified, principal)
+        # Search-area changes not yet written behind, so the user reads their own writes
+        return profile_writes.overlay(principal)
     
     except HTTPException:
         raise
@@ -108,4 +143,21 @@ async def get_current_user(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
-        )
\ No newline at end of file
+        )
+
+async def get_user_read_database(
+    request: Request,
+    current_user: UserPrincipal = Depends(get_current_user)
+) -> AsyncGenerator[AsyncSession, None]:
+    """get_read_database for authenticated reads, aware of the user's buffered profile writes
+
+    A buffered write may commit after the client got its marker, so the later
+    of the client's and the buffer's marker decides, and is handed back to
+    the client when it is the buffer's.
+    """
+    client_marker = write_marker(request)
+    written_at = later_marker(client_marker, profile_writes.write_marker(current_user.id))
+    if written_at is not None and written_at != client_marker:
+        request.state.written_at = written_at
+    async with read_session(written_at) as session:
+        yield session
@@ -0,0 +1,313 @@
+"""Load test every API route against a local PostGIS database.
+
+Run from the backend directory:
+
+    python -m benchmarks.load_test --users 500 --listings 5000 --likes 5 \
+        --requests 500 --concurrency 20 --output bench.json
+
+By default requests go through httpx's ASGI transport to the app in this
+process, so no network is needed; pass --base-url to hit a running server.
+The in-process app runs its lifespan around the scenarios, so the schema
+check, pool warm-up, metro registry and background workers are set up as in
+a production worker.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select
+
+from database import async_session_maker, engine
+from generate_listings import MOSCOW_BOUNDS, METRO_STATIONS, random_listing_fields
+from models import Listing, User
+from services import MatchingService
+from tiles import tile_for
+
+# Benchmark users live above this telegram id so they never mix with real ones
+TELEGRAM_ID_OFFSET = 9_000_000_000
+LISTING_KEY_PREFIX = "bench-"
+
+
+async def reset(session):
+    """Remove data left by a previous benchmark run"""
+    await session.execute(delete(User).where(User.telegram_id >= TELEGRAM_ID_OFFSET))
+    await session.execute(delete(Listing).where(Listing.external_id.like(f"{LISTING_KEY_PREFIX}%")))
+    await session.commit()
+
+
+async def seed(users: int, listings: int, likes: int, seed_value: int) -> Dict:
+    """Seed users, likes and listings; returns the ids the scenarios need"""
+    random.seed(seed_value)
+    async with async_session_maker() as session:
+        await reset(session)
+
+        listing_rows = []
+        for i in range(listings):
+            fields = random_listing_fields(i)
+            lat, lon = fields.pop('lat'), fields.pop('lon')
+            listing_rows.append(dict(fields, wkt=f'POINT({lon} {lat})', external_id=f"{LISTING_KEY_PREFIX}{i}"))
+        listing_stmt = insert(Listing).values(
+            location=func.ST_GeogFromText(bindparam('wkt')), is_active=True
+        )
+        for start in range(0, len(listing_rows), 1000):
+            await session.execute(listing_stmt, listing_rows[start:start + 1000])
+
+        user_rows = []
+        for i in range(users):
+            lat = random.uniform(MOSCOW_BOUNDS['lat_min'], MOSCOW_BOUNDS['lat_max'])
+            lon = random.uniform(MOSCOW_BOUNDS['lon_min'], MOSCOW_BOUNDS['lon_max'])
+            price_min = random.randint(20, 80) * 1000
+            user_rows.append({
+                'telegram_id': TELEGRAM_ID_OFFSET + i,
+                'username': f"bench_{i}",
+                'first_name': f"Bench {i}",
+                'age': random.randint(18, 60),
+                'price_min': price_min,
+                'price_max': price_min + random.randint(10, 80) * 1000,
+                'metro_station': random.choice(METRO_STATIONS),
+                'search_radius': random.choice([1000, 2000, 3000, 5000]),
+                'is_active': True,
+                'wkt': f'POINT({lon} {lat})',
+            })
+        user_stmt = insert(User).values(search_location=func.ST_GeogFromText(bindparam('wkt')))
+        for start in range(0, len(user_rows), 1000):
+            await session.execute(user_stmt, user_rows[start:start + 1000])
+        await session.commit()
+
+        matching_service = MatchingService(session)
+        await matching_service.rebuild_candidates()
+
+        result = await session.execute(select(User.id, User.telegram_id).where(User.telegram_id >= TELEGRAM_ID_OFFSET))
+        user_ids = {telegram_id: user_id for user_id, telegram_id in result}
+        result = await session.execute(select(Listing.id).where(Listing.external_id.like(f"{LISTING_KEY_PREFIX}%")))
+        listing_ids = [listing_id for (listing_id,) in result]
+
+        # Likes go through the real write path so matches and counts are consistent
+        ids = list(user_ids.values())
+        for liker_id in ids:
+            targets = random.sample([i for i in ids if i != liker_id], min(likes, len(ids) - 1))
+            await matching_service.like_users(liker_id, targets)
+
+        result = await session.execute(select(User.id, User.telegram_id).where(
+            User.telegram_id >= TELEGRAM_ID_OFFSET, User.match_count > 0
+        ).limit(1))
+        matched = result.first()
+        matched_pair = None
+        if matched:
+            matches = await matching_service.get_user_matches(matched.id, limit=1)
+            if matches:
+                matched_pair = (matched.telegram_id, matches[0].user.id)
+
+    return {'user_ids': user_ids, 'listing_ids': listing_ids, 'matched_pair': matched_pair}
+
+
+def auth_headers(telegram_id: int) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {json.dumps({'id': telegram_id})}"}
+
+
+Request = Tuple[str, str, Dict, Optional[Dict], Optional[Dict]]
+
+
+def build_scenarios(data: Dict) -> Dict[str, Callable[[], Request]]:
+    """Route name -> factory of (method, path, headers, params, json body)"""
+    telegram_ids = list(data['user_ids'])
+    user_ids = list(data['user_ids'].values())
+    listing_ids = data['listing_ids']
+
+    def any_user() -> int:
+        return random.choice(telegram_ids)
+
+    def point() -> Dict:
+        return {
+            'lat': random.uniform(MOSCOW_BOUNDS['lat_min'], MOSCOW_BOUNDS['lat_max']),
+            'lon': random.uniform(MOSCOW_BOUNDS['lon_min'], MOSCOW_BOUNDS['lon_max']),
+        }
+
+    scenarios = {
+        "GET /health": lambda: ("GET", "/health", {}, None, None),
+        # create_user takes the raw auth data as a query parameter
+        "POST /api/users/": lambda: (lambda t: ("POST", "/api/users/", {}, {'auth_data': json.dumps({'id': t})}, {
+            'telegram_id': t, 'search_radius': random.choice([1000, 2000, 3000]), **point()
+        }))(any_user()),
+        "GET /api/users/me": lambda: ("GET", "/api/users/me", auth_headers(any_user()), None, None),
+        "PUT /api/users/me": lambda: ("PUT", "/api/users/me", auth_headers(any_user()), None, {
+            'search_radius': random.choice([1000, 2000, 3000]), **point()
+        }),
+        "GET /api/users/potential-matches": lambda: (
+            "GET", "/api/users/potential-matches", auth_headers(any_user()), {'limit': 10}, None
+        ),
+        "GET /api/users/potential-matches/ranked": lambda: (
+            "GET", "/api/users/potential-matches/ranked", auth_headers(any_user()), {'limit': 10}, None
+        ),
+        "GET /api/users/swipe-queue": lambda: (
+            "GET", "/api/users/swipe-queue", auth_headers(any_user()), {'count': 10}, None
+        ),
+        "POST /api/users/{user_id}/like": lambda: (
+            "POST", f"/api/users/{random.choice(user_ids)}/like", auth_headers(any_user()), None, None
+        ),
+        "POST /api/users/likes:batch": lambda: (lambda t: (
+            "POST", "/api/users/likes:batch", auth_headers(t), None,
+            {'user_ids': [str(i) for i in random.sample(user_ids, min(10, len(user_ids))) if i != data['user_ids'][t]]}
+        ))(any_user()),
+        "GET /api/users/matches": lambda: ("GET", "/api/users/matches", auth_headers(any_user()), None, None),
+        "GET /api/users/matches/count": lambda: (
+            "GET", "/api/users/matches/count", auth_headers(any_user()), None, None
+        ),
+        "GET /api/listings/": lambda: (
+            "GET", "/api/listings/", {}, dict(point(), radius=2000, limit=50), None
+        ),
+        "GET /api/listings/faceted": lambda: (
+            "GET", "/api/listings/faceted", {}, dict(point(), radius=2000, limit=50, rooms="1,2"), None
+        ),
+        "GET /api/listings/viewport": lambda: (lambda p, z: (
+            "GET", "/api/listings/viewport", {}, {
+                'min_lat': p['lat'] - 0.05, 'max_lat': p['lat'] + 0.05,
+                'min_lon': p['lon'] - 0.1, 'max_lon': p['lon'] + 0.1, 'zoom': z,
+            }, None
+        ))(point(), random.choice([10, 12, 13, 15, 16])),
+        "GET /api/tiles/listings/{z}/{x}/{y}.mvt": lambda: (lambda p, z: (lambda x, y: (
+            "GET", f"/api/tiles/listings/{z}/{x}/{y}.mvt", {}, None, None
+        ))(*tile_for(p['lat'], p['lon'], z)))(point(), random.choice([10, 12, 14, 16])),
+        "GET /api/listings/search": lambda: ("GET", "/api/listings/search", auth_headers(any_user()), None, None),
+        "POST /api/listings/{listing_id}/like": lambda: (
+            "POST", f"/api/listings/{random.choice(listing_ids)}/like", auth_headers(any_user()), None, None
+        ),
+        "GET /api/listings/liked": lambda: ("GET", "/api/listings/liked", auth_headers(any_user()), None, None),
+        # Name prefix lookup as typed into the station picker
+        "GET /api/metro/stations": lambda: (
+            "GET", "/api/metro/stations", {}, {'q': random.choice(METRO_STATIONS)[:3], 'limit': 20}, None
+        ),
+    }
+
+    if data['matched_pair']:
+        telegram_id, other_id = data['matched_pair']
+        scenarios["GET /api/users/{user_id}/liked-listings"] = lambda: (
+            "GET", f"/api/users/{other_id}/liked-listings", auth_headers(telegram_id), None, None
+        )
+    return scenarios
+
+
+async def run_scenario(client: httpx.AsyncClient, factory: Callable[[], Request], requests: int, concurrency: int) -> Dict:
+    """Drive one route with concurrent clients and summarise its latencies"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, path, headers, params, body = factory()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=headers, params=params, json=body)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "mean": round(float(samples.mean()), 2) if len(samples) else 0.0,
+        },
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenarios(client: httpx.AsyncClient, scenarios: Dict[str, Callable[[], Request]], args) -> Dict:
+    random.seed(args.seed)
+    results = {}
+    for name, factory in scenarios.items():
+        # Warm up caches and the pool before measuring
+        await run_scenario(client, factory, min(args.concurrency, args.requests), args.concurrency)
+        results[name] = await run_scenario(client, factory, args.requests, args.concurrency)
+        print(f"{name}: {results[name]['throughput_rps']} req/s, "
+              f"p95 {results[name]['latency_ms']['p95']} ms")
+    return results
+
+
+async def run(args) -> Dict:
+    data = await seed(args.users, args.listings, args.likes, args.seed)
+    scenarios = build_scenarios(data)
+    if args.only:
+        scenarios = {name: factory for name, factory in scenarios.items() if name in args.only}
+
+    async with AsyncExitStack() as stack:
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+        else:
+            from main import app
+            # ASGITransport does not send lifespan events, so run startup and shutdown here
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+        results = await run_scenarios(await stack.enter_async_context(client), scenarios, args)
+
+    await engine.dispose()
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": args.users,
+            "listings": args.listings,
+            "likes_per_user": args.likes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "base_url": args.base_url,
+        },
+        "endpoints": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test every API route against a local database")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--listings', type=int, default=5000)
+    parser.add_argument('--likes', type=int, default=5, help="likes given by each seeded user")
+    parser.add_argument('--requests', type=int, default=500, help="measured requests per route")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--base-url', help="hit a running server instead of the in-process app")
+    parser.add_argument('--only', nargs='*', help="route names to run, e.g. 'GET /api/listings/'")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
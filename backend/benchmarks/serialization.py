@@ -0,0 +1,124 @@
+"""CPU cost of the list endpoint serialization paths, per 1000 rows.
+
+Compares the default path (Pydantic models validated again through FastAPI's
+response_model and rendered by JSONResponse) with the fast path (plain dicts
+encoded by orjson). Runs without a database:
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from generate_listings import random_listing_fields
+from projections import listing_from_mapping, match_from_mapping, user_profile_from_mapping
+from schemas import ListingResponse, MatchResponse, UserProfileResponse
+from serialization import FastJSONResponse
+
+
+def listing_rows(count: int) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        fields = random_listing_fields(i)
+        fields.update(
+            id=uuid.uuid4(),
+            area=Decimal(str(fields['area'])),
+            metro_station_id=None,
+            is_active=True,
+            created_at=now - timedelta(minutes=i),
+            distance_km=random.uniform(0, 5),
+        )
+        rows.append(fields)
+    return rows
+
+
+def profile_rows(count: int) -> List[Dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': uuid.uuid4(), 'username': f"user_{i}", 'first_name': "Имя", 'last_name': None,
+        'photo_url': None, 'age': random.randint(18, 60), 'bio': "Ищу соседа",
+        'price_min': 30000, 'price_max': 60000, 'metro_station': "Сокол",
+        'search_radius': 2000, 'distance_km': random.uniform(0, 5),
+        'match_id': uuid.uuid4(), 'matched_at': now - timedelta(minutes=i),
+    } for i in range(count)]
+
+
+def model_path(rows: List[Dict], build: Callable, response_type) -> bytes:
+    """What FastAPI does for a list of models with response_model set"""
+    field = create_response_field(name="response", type_=response_type)
+    content = [build(row, False) for row in rows]
+    encoded = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(encoded).body
+
+
+def fast_path(rows: List[Dict], build: Callable) -> bytes:
+    return FastJSONResponse([build(row, True) for row in rows]).body
+
+
+def measure(fn: Callable[[], bytes], repeat: int) -> float:
+    """Best CPU seconds of `repeat` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        best = min(best, time.process_time() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list serialization paths")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cases = {
+        "listings": (
+            listing_rows(args.rows),
+            lambda row, as_dict: listing_from_mapping(row, row['distance_km'], as_dict=as_dict),
+            List[ListingResponse],
+        ),
+        "potential_matches": (
+            profile_rows(args.rows),
+            lambda row, as_dict: user_profile_from_mapping(row, row['distance_km'], as_dict),
+            List[UserProfileResponse],
+        ),
+        "matches": (
+            profile_rows(args.rows),
+            lambda row, as_dict: match_from_mapping(row, as_dict),
+            List[MatchResponse],
+        ),
+    }
+
+    report = {}
+    for name, (rows, build, response_type) in cases.items():
+        slow = model_path(rows, build, response_type)
+        fast = fast_path(rows, build)
+        # The fast path must produce the same document as the schema-validated one
+        assert json.loads(slow) == json.loads(fast), f"{name}: fast path diverges from schema output"
+
+        slow_seconds = measure(lambda: model_path(rows, build, response_type), args.repeat)
+        fast_seconds = measure(lambda: fast_path(rows, build), args.repeat)
+        per_1000 = 1000 / args.rows
+        report[name] = {
+            "model_ms_per_1000_rows": round(slow_seconds * per_1000 * 1000, 2),
+            "fast_ms_per_1000_rows": round(fast_seconds * per_1000 * 1000, 2),
+            "saved_ms_per_1000_rows": round((slow_seconds - fast_seconds) * per_1000 * 1000, 2),
+            "speedup": round(slow_seconds / fast_seconds, 1) if fast_seconds else None,
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
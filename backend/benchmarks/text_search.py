@@ -0,0 +1,209 @@
+"""Query plans of full-text listing search combined with geo and price filters,
+and of the faceted search with attribute filters.
+
+Seeds a synthetic listings table server-side (1M rows by default), then runs
+EXPLAIN ANALYZE on the statements search_listings issues and reports which
+indexes each plan uses. Run from the backend directory against a local
+PostGIS database:
+
+    python -m benchmarks.text_search --rows 1000000 --output fts.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List, Set
+
+from sqlalchemy import text
+
+from database import async_session_maker, engine
+from generate_listings import METRO_STATIONS, MOSCOW_BOUNDS, ROOM_DESCRIPTIONS
+from facets import ListingFilters
+from services import ListingService
+
+LISTING_KEY_PREFIX = "fts-bench-"
+GEO_INDEX = "idx_listings_active_location"
+TEXT_INDEX = "idx_listings_active_search_vector"
+FACET_INDEX = "idx_listings_active_facets"
+BATCH_SIZE = 100_000
+
+STREETS = [
+    "Тверская", "Арбат", "Новый Арбат", "Мясницкая", "Пятницкая", "Покровка",
+    "Большая Дмитровка", "Ленинский проспект", "Профсоюзная", "Садовая-Кудринская",
+    "Бауманская", "Маросейка", "Остоженка", "Пречистенка", "Ходынский бульвар",
+]
+FEATURES = [
+    "евроремонт", "косметический ремонт", "балкон", "лоджия", "вид на парк",
+    "можно с животными", "посудомоечная машина", "кондиционер", "тихий двор",
+    "рядом школа", "паркинг", "консьерж", "новая мебель", "встроенная кухня",
+]
+
+SEED_SQL = """
+    INSERT INTO listings (
+        external_id, title, description, price, address, location, rooms, area,
+        floor, total_floors, metro_station, metro_distance, is_active
+    )
+    SELECT :prefix || i,
+           titles[1 + floor(random() * array_length(titles, 1))::int],
+           features[1 + floor(random() * array_length(features, 1))::int] || ', ' ||
+           features[1 + floor(random() * array_length(features, 1))::int] || '. ' ||
+           titles[1 + floor(random() * array_length(titles, 1))::int],
+           (20 + floor(random() * 130))::int * 1000,
+           'ул. ' || streets[1 + floor(random() * array_length(streets, 1))::int] ||
+           ', д. ' || (1 + floor(random() * 100))::int,
+           ST_SetSRID(ST_MakePoint(
+               :lon_min + random() * (:lon_max - :lon_min),
+               :lat_min + random() * (:lat_max - :lat_min)
+           ), 4326)::geography,
+           1 + floor(random() * 4)::int,
+           round((20 + random() * 130)::numeric, 2),
+           1 + floor(random() * 25)::int,
+           25,
+           stations[1 + floor(random() * array_length(stations, 1))::int],
+           (100 + floor(random() * 2900))::int,
+           true
+    FROM generate_series(:start, :stop) AS i,
+         (SELECT CAST(:titles AS text[]) AS titles,
+                 CAST(:features AS text[]) AS features,
+                 CAST(:streets AS text[]) AS streets,
+                 CAST(:stations AS text[]) AS stations) AS vocabulary
+"""
+
+CASES = {
+    "text": {'q': "евроремонт"},
+    "text_geo": {'q': "евроремонт", 'lat': 55.7558, 'lon': 37.6176, 'radius': 2000},
+    "text_geo_price": {
+        'q': "евроремонт балкон", 'lat': 55.7558, 'lon': 37.6176, 'radius': 3000,
+        'price_min': 40000, 'price_max': 90000,
+    },
+    "street_geo": {'q': "Тверская", 'lat': 55.7648, 'lon': 37.6055, 'radius': 1500},
+    "metro_price": {'q': "Сокол", 'price_max': 60000},
+    "geo_only": {'lat': 55.7558, 'lon': 37.6176, 'radius': 2000},
+}
+# Page plus facet counts, with the composite attribute indexes
+FACET_CASES = {
+    "facets_all": {},
+    "facets_rooms_price": {
+        'price_min': 40000, 'price_max': 90000, 'filters': ListingFilters(rooms=(1, 2)),
+    },
+    "facets_geo_area": {
+        'lat': 55.7558, 'lon': 37.6176, 'radius': 3000,
+        'filters': ListingFilters(area_min=40, metro_distance_max=1000),
+    },
+    "facets_text_rooms": {'q': "евроремонт", 'filters': ListingFilters(rooms=(2, 3))},
+}
+
+
+async def seed(rows: int):
+    async with async_session_maker() as session:
+        await session.execute(
+            text("DELETE FROM listings WHERE external_id LIKE :pattern"),
+            {'pattern': f"{LISTING_KEY_PREFIX}%"}
+        )
+        await session.commit()
+        for start in range(1, rows + 1, BATCH_SIZE):
+            await session.execute(text(SEED_SQL), {
+                'prefix': LISTING_KEY_PREFIX,
+                'start': start,
+                'stop': min(start + BATCH_SIZE - 1, rows),
+                'titles': ROOM_DESCRIPTIONS,
+                'features': FEATURES,
+                'streets': STREETS,
+                'stations': METRO_STATIONS,
+                **MOSCOW_BOUNDS,
+            })
+            await session.commit()
+            print(f"seeded {min(start + BATCH_SIZE - 1, rows)}/{rows}")
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE listings"))
+
+
+def plan_indexes(node: Dict, found: Set[str], node_types: List[str]):
+    node_types.append(node["Node Type"])
+    if "Index Name" in node:
+        found.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        plan_indexes(child, found, node_types)
+
+
+async def explain(driver, statement, repeat: int) -> Dict:
+    """EXPLAIN ANALYZE a statement through the raw asyncpg connection"""
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    sql = str(compiled)
+
+    plan = json.loads(await driver.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *params))[0]
+    indexes: Set[str] = set()
+    node_types: List[str] = []
+    plan_indexes(plan["Plan"], indexes, node_types)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await driver.fetch(sql, *params)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "indexes": sorted(indexes),
+        "uses_geo_index": GEO_INDEX in indexes,
+        "uses_text_index": TEXT_INDEX in indexes,
+        "uses_facet_index": FACET_INDEX in indexes,
+        "node_types": node_types,
+        "planning_ms": plan["Planning Time"],
+        "execution_ms": plan["Execution Time"],
+        "median_ms": round(statistics.median(timings), 2),
+    }
+
+
+async def run(args) -> Dict:
+    if not args.skip_seed:
+        await seed(args.rows)
+
+    service = ListingService(None)
+    report = {}
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        for name, filters in CASES.items():
+            statement = service.search_statement(limit=args.limit, **filters)
+            report[name] = dict(filters=filters, **await explain(driver, statement, args.repeat))
+            print(f"{name}: {report[name]['indexes']} {report[name]['median_ms']} ms")
+        for name, filters in FACET_CASES.items():
+            statement = service.faceted_statement(limit=args.limit, **filters)
+            described = {key: value._asdict() if key == 'filters' else value for key, value in filters.items()}
+            report[name] = dict(filters=described, **await explain(driver, statement, args.repeat))
+            print(f"{name}: {report[name]['indexes']} {report[name]['median_ms']} ms")
+
+    if args.cleanup:
+        async with async_session_maker() as session:
+            await session.execute(
+                text("DELETE FROM listings WHERE external_id LIKE :pattern"),
+                {'pattern': f"{LISTING_KEY_PREFIX}%"}
+            )
+            await session.commit()
+    await engine.dispose()
+    return {"rows": args.rows, "limit": args.limit, "cases": report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain full-text listing search on a synthetic table")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10, help="timed runs per query")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse rows from a previous run")
+    parser.add_argument('--cleanup', action='store_true', help="delete the synthetic rows afterwards")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Integer, and_, func, literal_column
+
+from models import Listing
+
+# Width of the price and area facet buckets
+FACET_PRICE_STEP = int(os.getenv("FACET_PRICE_STEP", "10000"))
+FACET_AREA_STEP = int(os.getenv("FACET_AREA_STEP", "10"))
+MAX_ROOM_VALUES = 10
+
+# GROUPING(rooms, price_bucket, area_bucket) of each facet's grouping set
+ROOMS_SET, PRICE_SET, AREA_SET = 0b011, 0b101, 0b110
+
+
+class ListingFilters(NamedTuple):
+    """Range and set filters on listing attributes besides price"""
+    rooms: Tuple[int, ...] = ()
+    area_min: Optional[float] = None
+    area_max: Optional[float] = None
+    floor_min: Optional[int] = None
+    floor_max: Optional[int] = None
+    total_floors_min: Optional[int] = None
+    total_floors_max: Optional[int] = None
+    metro_distance_max: Optional[int] = None  # meters
+
+    def is_empty(self) -> bool:
+        return not self.rooms and all(value is None for value in self[1:])
+
+
+def parse_listing_filters(rooms: Optional[str] = None, **ranges) -> Optional[ListingFilters]:
+    """Filters from query values, rooms as "1,2,3"; raises ValueError if invalid"""
+    room_values: Tuple[int, ...] = ()
+    if rooms:
+        try:
+            room_values = tuple(sorted({int(value) for value in rooms.split(',') if value.strip()}))
+        except ValueError:
+            raise ValueError("rooms must be a comma-separated list of integers")
+        if len(room_values) > MAX_ROOM_VALUES or any(value <= 0 for value in room_values):
+            raise ValueError("Invalid rooms filter")
+
+    for name in ('area', 'floor', 'total_floors'):
+        low, high = ranges.get(f'{name}_min'), ranges.get(f'{name}_max')
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"{name}_min must not exceed {name}_max")
+    if ranges.get('metro_distance_max') is not None and ranges['metro_distance_max'] < 0:
+        raise ValueError("metro_distance_max must not be negative")
+
+    filters = ListingFilters(rooms=room_values, **ranges)
+    return None if filters.is_empty() else filters
+
+
+def filter_conditions(
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+    filters: Optional[ListingFilters] = None
+) -> Tuple[List, Dict[str, List]]:
+    """WHERE conditions as (shared, per facet dimension)
+
+    Facet counts of a dimension ignore its own conditions, so picking two
+    room counts still shows how many listings every other count has.
+    """
+    by_facet: Dict[str, List] = {'rooms': [], 'price': [], 'area': []}
+    shared: List = []
+    if price_min is not None:
+        by_facet['price'].append(Listing.price >= price_min)
+    if price_max is not None:
+        by_facet['price'].append(Listing.price <= price_max)
+    if filters is None:
+        return shared, by_facet
+
+    if filters.rooms:
+        by_facet['rooms'].append(Listing.rooms.in_(filters.rooms))
+    if filters.area_min is not None:
+        by_facet['area'].append(Listing.area >= filters.area_min)
+    if filters.area_max is not None:
+        by_facet['area'].append(Listing.area <= filters.area_max)
+    if filters.floor_min is not None:
+        shared.append(Listing.floor >= filters.floor_min)
+    if filters.floor_max is not None:
+        shared.append(Listing.floor <= filters.floor_max)
+    if filters.total_floors_min is not None:
+        shared.append(Listing.total_floors >= filters.total_floors_min)
+    if filters.total_floors_max is not None:
+        shared.append(Listing.total_floors <= filters.total_floors_max)
+    if filters.metro_distance_max is not None:
+        shared.append(Listing.metro_distance <= filters.metro_distance_max)
+    return shared, by_facet
+
+
+def facet_aggregate(by_facet: Dict[str, List]) -> Tuple[list, Any]:
+    """Columns and GROUP BY clause of the facet aggregate
+
+    The result is grouped by GROUPING SETS ((rooms), (price_bucket), (area_bucket))
+    so one scan of the matching listings yields all three facets.
+    """
+    # Inlined steps keep the select list and GROUP BY expressions identical
+    price_step = literal_column(str(FACET_PRICE_STEP), Integer)
+    area_step = literal_column(str(FACET_AREA_STEP), Integer)
+    price_bucket = (Listing.price // price_step) * price_step
+    area_bucket = func.floor(Listing.area / area_step) * area_step
+
+    def count(*dimensions):
+        conditions = [c for dimension in dimensions for c in by_facet[dimension]]
+        return func.count().filter(and_(*conditions)) if conditions else func.count()
+
+    return [
+        Listing.rooms,
+        price_bucket.label('price_bucket'),
+        area_bucket.label('area_bucket'),
+        func.grouping(Listing.rooms, price_bucket, area_bucket).label('grouping_set'),
+        count('price', 'area').label('rooms_count'),
+        count('rooms', 'area').label('price_count'),
+        count('rooms', 'price').label('area_count'),
+    ], func.grouping_sets(Listing.rooms, price_bucket, area_bucket)
+
+
+def facets_from_rows(rows: Optional[List]) -> Dict[str, List[Dict]]:
+    """ListingFacets dict from the aggregated facet rows
+
+    Each row is [rooms, price_bucket, area_bucket, grouping_set,
+    rooms_count, price_count, area_count]; empty buckets are dropped.
+    """
+    facets = {'rooms': [], 'price': [], 'area': []}
+    for rooms, price_bucket, area_bucket, grouping_set, rooms_count, price_count, area_count in rows or ():
+        if grouping_set == ROOMS_SET and rooms is not None and rooms_count:
+            facets['rooms'].append({'value': rooms, 'count': rooms_count})
+        elif grouping_set == PRICE_SET and price_bucket is not None and price_count:
+            facets['price'].append({
+                'min': price_bucket, 'max': price_bucket + FACET_PRICE_STEP, 'count': price_count
+            })
+        elif grouping_set == AREA_SET and area_bucket is not None and area_count:
+            area = float(area_bucket)
+            facets['area'].append({'min': area, 'max': area + FACET_AREA_STEP, 'count': area_count})
+
+    facets['rooms'].sort(key=lambda facet: facet['value'])
+    facets['price'].sort(key=lambda facet: facet['min'])
+    facets['area'].sort(key=lambda facet: facet['min'])
+    return facets
@@ -5,8 +5,11 @@ from faker.providers import internet, lorem
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import func
 from models import Listing
+from listing_expiry import LISTING_TTL_DAYS
+from metro import read_metro_dataset
+from services import MetroService
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 fake = Faker('ru_RU')
 fake.add_provider(internet)
@@ -48,6 +51,59 @@ ROOM_DESCRIPTIONS = [
     "Стильная квартира с современным дизайном"
 ]
 
+def random_listing_fields(i: int) -> dict:
+    """Random apartment in Moscow, as plain column values plus lat/lon"""
+    # Random coordinates within Moscow
+    lat = random.uniform(MOSCOW_BOUNDS['lat_min'], MOSCOW_BOUNDS['lat_max'])
+    lon = random.uniform(MOSCOW_BOUNDS['lon_min'], MOSCOW_BOUNDS['lon_max'])
+    
+    # Random apartment details
+    rooms = random.randint(1, 4)
+    area = random.uniform(20, 150)
+    floor = random.randint(1, 25)
+    total_floors = max(floor, random.randint(floor, 30))
+    
+    # Price based on rooms and area (rough Moscow prices)
+    base_price = rooms * 25000 + area * 300
+    price = int(base_price * random.uniform(0.7, 1.5))
+    
+    metro_station = random.choice(METRO_STATIONS)
+    metro_distance = random.randint(50, 1500)  # meters to metro
+    
+    # Generate address
+    street_names = [
+        "улица Тверская", "Ленинский проспект", "улица Арбат", "Кутузовский проспект",
+        "Садовое кольцо", "улица Баумана", "проспект Мира", "Варшавское шоссе",
+        "Ленинградский проспект", "Рублевское шоссе", "улица Пречистенка"
+    ]
+    street = random.choice(street_names)
+    house_number = random.randint(1, 200)
+    building = random.choice(['', 'А', 'Б', 'В', '1', '2'])
+    address = f"{street}, {house_number}{building}"
+    
+    # Sample photos (placeholder URLs)
+    photos = [
+        f"https://picsum.photos/800/600?random={i}_1",
+        f"https://picsum.photos/800/600?random={i}_2",
+        f"https://picsum.photos/800/600?random={i}_3"
+    ]
+    
+    return {
+        'title': f"{rooms}-комнатная квартира, {int(area)} м²",
+        'description': random.choice(ROOM_DESCRIPTIONS),
+        'price': price,
+        'address': address,
+        'lat': lat,
+        'lon': lon,
+        'rooms': rooms,
+        'area': round(area, 1),
+        'floor': floor,
+        'total_floors': total_floors,
+        'metro_station': metro_station,
+        'metro_distance': metro_distance,
+        'photos': photos
+    }
+
 async def generate_listings(count: int = 1000):
     """Generate random apartment listings in Moscow"""
     
@@ -59,56 +115,15 @@ async def generate_listings(count: int = 1000):
         listings = []
         
         for i in range(count):
-            # Random coordinates within Moscow
-            lat = random.uniform(MOSCOW_BOUNDS['lat_min'], MOSCOW_BOUNDS['lat_max'])
-            lon = random.uniform(MOSCOW_BOUNDS['lon_min'], MOSCOW_BOUNDS['lon_max'])
-            
-            # Random apartment details
-            rooms = random.randint(1, 4)
-            area = random.uniform(20, 150)
-            floor = random.randint(1, 25)
-            total_floors = max(floor, random.randint(floor, 30))
-            
-            # Price based on rooms and area (rough Moscow prices)
-            base_price = rooms * 25000 + area * 300
-            price = int(base_price * random.uniform(0.7, 1.5))
-            
-            metro_station = random.choice(METRO_STATIONS)
-            metro_distance = random.randint(50, 1500)  # meters to metro
-            
-            # Generate address
-            street_names = [
-                "улица Тверская", "Ленинский проспект", "улица Арбат", "Кутузовский проспект",
-                "Садовое кольцо", "улица Баумана", "проспект Мира", "Варшавское шоссе",
-                "Ленинградский проспект", "Рублевское шоссе", "улица Пречистенка"
-            ]
-            street = random.choice(street_names)
-            house_number = random.randint(1, 200)
-            building = random.choice(['', 'А', 'Б', 'В', '1', '2'])
-            address = f"{street}, {house_number}{building}"
-            
-            # Sample photos (placeholder URLs)
-            photos = [
-                f"https://picsum.photos/800/600?random={i}_1",
-                f"https://picsum.photos/800/600?random={i}_2",
-                f"https://picsum.photos/800/600?random={i}_3"
-            ]
+            fields = random_listing_fields(i)
+            lat, lon = fields.pop('lat'), fields.pop('lon')
             
             # Create listing
             listing = Listing(
-                title=f"{rooms}-комнатная квартира, {int(area)} м²",
-                description=random.choice(ROOM_DESCRIPTIONS),
-                price=price,
-                address=address,
+                **fields,
                 location=func.ST_GeogFromText(f'POINT({lon} {lat})'),
-                rooms=rooms,
-                area=round(area, 1),
-                floor=floor,
-                total_floors=total_floors,
-                metro_station=metro_station,
-                metro_distance=metro_distance,
-                photos=photos,
-                is_active=True
+                is_active=True,
+                expires_at=datetime.utcnow() + timedelta(days=LISTING_TTL_DAYS)
             )
             
             listings.append(listing)
@@ -125,6 +140,10 @@ async def generate_listings(count: int = 1000):
             session.add_all(listings)
             await session.commit()
         
+        
+        # Link the new listings to their nearest registered station
+        await MetroService(session).sync_stations(read_metro_dataset())
+        
         print(f"Successfully generated {count} listings!")
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""Deactivates expired listings and archives long-inactive ones in small batches.
+
+Runs in the background of every worker; a Postgres advisory lock keeps it to
+one sweep at a time across workers. Also runnable once, e.g. from cron:
+
+    python -m listing_expiry
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from database import async_session_maker, engine
+from services import ListingService
+
+logger = logging.getLogger(__name__)
+
+# Imported and generated listings expire this many days after their last refresh
+LISTING_TTL_DAYS = int(os.getenv("LISTING_TTL_DAYS", "30"))
+# Inactive listings move to listings_archive after this many days, their likes
+# to listing_likes_archive
+LISTING_ARCHIVE_DAYS = int(os.getenv("LISTING_ARCHIVE_DAYS", "30"))
+# Seconds between sweeps, 0 disables the background sweeper
+LISTING_SWEEP_SECONDS = float(os.getenv("LISTING_SWEEP_SECONDS", "300"))
+# Rows per UPDATE/DELETE, small enough to keep locks and WAL bursts short
+LISTING_SWEEP_BATCH = int(os.getenv("LISTING_SWEEP_BATCH", "500"))
+# Pause between batches so the sweep never monopolizes the primary
+LISTING_SWEEP_PAUSE = float(os.getenv("LISTING_SWEEP_PAUSE", "0.05"))
+
+SWEEP_LOCK_KEY = 0x6C697374  # pg_try_advisory_lock key shared by all workers
+
+
+class ListingSweeper:
+    def __init__(self):
+        self.deactivated = 0
+        self.archived = 0
+        self.sweeps = 0
+        self.last_sweep_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _drain(self, step) -> int:
+        total = 0
+        while True:
+            async with async_session_maker() as session:
+                count = await step(ListingService(session))
+            total += count
+            if count < LISTING_SWEEP_BATCH:
+                return total
+            await asyncio.sleep(LISTING_SWEEP_PAUSE)
+
+    async def sweep(self) -> Optional[Dict[str, int]]:
+        """One full pass, or None when another worker holds the sweep lock"""
+        started = time.perf_counter()
+        async with engine.connect() as conn:
+            # Session-level lock held on an autocommit connection, so no
+            # transaction stays open for the whole pass
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            locked = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {'key': SWEEP_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                return None
+            try:
+                deactivated = await self._drain(
+                    lambda service: service.deactivate_expired(LISTING_SWEEP_BATCH)
+                )
+                archived = await self._drain(
+                    lambda service: service.archive_inactive(LISTING_SWEEP_BATCH, LISTING_ARCHIVE_DAYS)
+                )
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': SWEEP_LOCK_KEY})
+
+        self.deactivated += deactivated
+        self.archived += archived
+        self.sweeps += 1
+        self.last_sweep_seconds = time.perf_counter() - started
+        if deactivated or archived:
+            logger.info("Deactivated %d expired listings, archived %d in %.2fs",
+                        deactivated, archived, self.last_sweep_seconds)
+        return {'deactivated': deactivated, 'archived': archived}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Listing sweep failed")
+            await asyncio.sleep(LISTING_SWEEP_SECONDS)
+
+    def start(self):
+        if LISTING_SWEEP_SECONDS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+listing_sweeper = ListingSweeper()
+
+
+if __name__ == "__main__":
+    print(asyncio.run(listing_sweeper.sweep()))
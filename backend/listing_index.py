@@ -0,0 +1,250 @@
+import asyncio
+import bisect
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker
+from models import Listing
+from projections import FieldSelection, listing_columns, listing_from_mapping
+from schemas import ListingResponse
+
+# Listing search backend: "postgis" (default) or "memory"
+LISTING_SEARCH_ENGINE = os.getenv("LISTING_SEARCH_ENGINE", "postgis")
+# Seconds between incremental refreshes of the in-memory index
+LISTING_INDEX_REFRESH_SECONDS = float(os.getenv("LISTING_INDEX_REFRESH_SECONDS", "5"))
+# Grid cell size in degrees
+LISTING_INDEX_CELL_DEGREES = float(os.getenv("LISTING_INDEX_CELL_DEGREES", "0.01"))
+
+# Start of the oldest transaction still open on the primary. listings.updated_at
+# is always set by the database to now(), its transaction's start, so rows
+# committed after a refresh carry an updated_at at or after this horizon; the
+# next refresh re-reads from there instead of trusting a fixed overlap. Needs
+# every writer to run as the app's database role (or the role to hold
+# pg_read_all_stats), otherwise their xact_start is hidden. A transaction left
+# open for long holds the horizon back and makes refreshes re-read more rows.
+OPEN_TRANSACTIONS_HORIZON_SQL = """
+    SELECT COALESCE(min(xact_start), now())
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND xact_start IS NOT NULL
+"""
+
+# WGS84 ellipsoid, the same one PostGIS uses for geography distances
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+# Shortest meridian degree on WGS84, used to size bounding boxes conservatively
+MIN_METERS_PER_DEGREE = 110574.0
+
+
+def geodesic_distance(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorised Vincenty inverse on WGS84, in meters"""
+    f = WGS84_F
+    L = np.radians(lons - lon)
+    U1 = math.atan((1 - f) * math.tan(math.radians(lat)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lats)))
+    sin_u1, cos_u1 = math.sin(U1), math.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    for _ in range(200):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt(
+            (cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2
+        )
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+            )
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+        if np.all(np.abs(lam - lam_prev) < 1e-12):
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (
+        cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        )
+    )
+    return WGS84_B * A * (sigma - delta_sigma)
+
+
+class ListingIndex:
+    """In-process index of active listings for radius, price and nearest-first search"""
+
+    def __init__(self, cell_degrees: float = LISTING_INDEX_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees)) + 1
+        self.rows: Dict[uuid.UUID, dict] = {}
+        self.watermark: Optional[datetime] = None
+        # Next refresh reads rows with updated_at >= min(watermark, horizon)
+        self.horizon: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+        self._build()
+
+    def _cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        rows = np.floor((lats + 90) / self.cell_degrees).astype(np.int64)
+        cols = np.floor((lons + 180) / self.cell_degrees).astype(np.int64)
+        return rows * self.columns + cols
+
+    def _build(self):
+        """Rebuild the coordinate, price and grid arrays from the row store"""
+        # Position i in every array refers to self.records[i]; records are
+        # kept in id order so the id rank doubles as the tie-breaker
+        self.ids: List[uuid.UUID] = sorted(self.rows)
+        self.records = [self.rows[listing_id] for listing_id in self.ids]
+        count = len(self.records)
+        self.lats = np.fromiter((r['lat'] for r in self.records), dtype=np.float64, count=count)
+        self.lons = np.fromiter((r['lon'] for r in self.records), dtype=np.float64, count=count)
+        self.prices = np.fromiter((r['price'] for r in self.records), dtype=np.int64, count=count)
+        self.ranks = np.arange(count, dtype=np.int64)
+
+        keys = self._cell_keys(self.lats, self.lons)
+        self.cell_order = np.argsort(keys, kind='stable')
+        self.cell_keys = keys[self.cell_order]
+
+    def apply(self, rows) -> int:
+        """Upsert changed listing rows, dropping inactive ones; returns rows changed"""
+        changed = 0
+        for row in rows:
+            data = dict(row._mapping)
+            updated_at = data.pop('updated_at', None)
+            if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+            if data['is_active']:
+                if self.rows.get(data['id']) == data:
+                    continue
+                self.rows[data['id']] = data
+            elif self.rows.pop(data['id'], None) is None:
+                continue
+            changed += 1
+        if changed:
+            self._build()
+        return changed
+
+    async def refresh(self, db: AsyncSession, max_age: Optional[float] = None) -> int:
+        """Load listings changed since the last refresh, on a session of the primary
+
+        With max_age, skip the refresh if another one finished within that
+        many seconds while this call waited for the lock.
+        """
+        async with self._lock:
+            if max_age is not None and time.monotonic() - self.refreshed_at < max_age:
+                return 0
+            # Taken before the rows are read, so it covers every transaction
+            # whose commit the read below may not see
+            horizon = (await db.execute(text(OPEN_TRANSACTIONS_HORIZON_SQL))).scalar()
+            query = select(*listing_columns(), Listing.updated_at)
+            if self.watermark is None:
+                query = query.where(Listing.is_active == True)
+            else:
+                query = query.where(Listing.updated_at >= min(self.watermark, self.horizon))
+            result = await db.execute(query)
+            changed = self.apply(result)
+            self.horizon = horizon
+            self.refreshed_at = time.monotonic()
+            return changed
+
+    async def refresh_if_stale(self):
+        """Refresh when the last refresh is older than the configured interval"""
+        if time.monotonic() - self.refreshed_at >= LISTING_INDEX_REFRESH_SECONDS:
+            # The primary, not the request's session: a replica neither sees the
+            # primary's open transactions nor is guaranteed to be caught up
+            async with async_session_maker() as session:
+                await self.refresh(session, max_age=LISTING_INDEX_REFRESH_SECONDS)
+
+    def _within_box(self, lat: float, lon: float, radius: float) -> np.ndarray:
+        """Positions of listings in grid cells covering the search circle"""
+        dlat = radius / MIN_METERS_PER_DEGREE + self.cell_degrees
+        lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        dlon = dlat / cos_lat if cos_lat > 1e-6 else 360.0
+        if lon - dlon < -180 or lon + dlon > 180:
+            # Circle wraps the antimeridian or a pole, fall back to a full scan
+            return self.ranks
+
+        row_min, row_max = (int(math.floor((v + 90) / self.cell_degrees)) for v in (lat_min, lat_max))
+        col_min, col_max = (int(math.floor((v + 180) / self.cell_degrees)) for v in (lon - dlon, lon + dlon))
+        chunks = []
+        for row in range(row_min, row_max + 1):
+            start = np.searchsorted(self.cell_keys, row * self.columns + col_min, side='left')
+            stop = np.searchsorted(self.cell_keys, row * self.columns + col_max, side='right')
+            if stop > start:
+                chunks.append(self.cell_order[start:stop])
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def search(
+        self,
+        lat: float = None,
+        lon: float = None,
+        radius: int = 1000,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 50,
+        after: Optional[Tuple] = None,
+        as_dict: bool = False,
+        selection: Optional[FieldSelection] = None
+    ) -> List[ListingResponse]:
+        """Same contract as the PostGIS search: nearest first by (distance, id), or id order"""
+        if lat is not None and lon is not None:
+            candidates = self._within_box(lat, lon, radius)
+        else:
+            candidates = self.ranks
+
+        mask = np.ones(len(candidates), dtype=bool)
+        if price_min is not None:
+            mask &= self.prices[candidates] >= price_min
+        if price_max is not None:
+            mask &= self.prices[candidates] <= price_max
+        candidates = candidates[mask]
+
+        if lat is None or lon is None:
+            candidates = np.sort(candidates)
+            if after:
+                candidates = candidates[candidates >= bisect.bisect_right(self.ids, after[1])]
+            return [
+                listing_from_mapping(self.records[i], as_dict=as_dict, selection=selection)
+                for i in candidates[:limit]
+            ]
+
+        meters = geodesic_distance(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = meters <= radius
+        candidates, distances = candidates[inside], meters[inside] / 1000
+
+        if after:
+            after_distance, after_id = after
+            after_rank = bisect.bisect_right(self.ids, after_id)
+            keep = (distances > after_distance) | ((distances == after_distance) & (candidates >= after_rank))
+            candidates, distances = candidates[keep], distances[keep]
+
+        order = np.lexsort((candidates, distances))[:limit]
+        return [
+            listing_from_mapping(
+                self.records[candidates[i]], float(distances[i]), as_dict=as_dict, selection=selection
+            )
+            for i in order
+        ]
+
+
+listing_index = ListingIndex()
@@ -1,30 +1,84 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from contextlib import asynccontextmanager
 import os
-from typing import AsyncGenerator
+import logging
+import time
+from typing import AsyncGenerator, Optional
 import asyncio
+from datetime import datetime
 
-from models import User, Listing, UserLike, UserMatch, ListingLike
+from models import Listing, UserLike, UserMatch, ListingLike
 from schemas import (
-    UserCreate, UserUpdate, UserResponse,
-    ListingResponse, UserProfileResponse,
-    LikeUserRequest, MatchResponse
+    UserCreate, UserUpdate, UserResponse, UserPrincipal,
+    ListingResponse, ViewportResponse, FacetedListingsResponse, UserProfileResponse, ScoredUserProfileResponse,
+    LikeUserRequest, LikeBatchRequest, LikeResult, MatchResponse, MetroStationResponse
 )
-from database import get_database, init_database
-from auth import verify_telegram_auth, get_current_user
-from services import UserService, ListingService, MatchingService
+from database import (
+    engine, read_engine, async_session_maker, get_database, get_pool_status, get_replica_pool_status,
+    check_schema_version, warm_pool
+)
+from replica import WRITE_MARKER_HEADER, ReadYourWritesMiddleware, get_read_database, replica_router
+from auth import verify_telegram_auth, verify_internal_token, get_current_user, get_user_read_database
+from services import UserService, ListingService, MatchingService, MetroService
+from metro import metro_registry
+from principal_cache import principal_cache
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, instrument_engine, registry
+from serialization import FAST_SERIALIZATION, list_response
+from swipe_queue import swipe_queues
+from profile_writes import PROFILE_WRITE_MAX_DELAY, profile_writes
+from listing_expiry import listing_sweeper
+from vector_tiles import listing_tiles
+from etags import ETAG_HEADER, etag_matches, make_etag, not_modified, set_etag
+from facets import ListingFilters, parse_listing_filters
+from projections import FieldSelection, listing_selection, user_profile_selection
+from pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, next_cursor, distance_key, created_at_key, rank_key, score_key
+
+# Startup timings are logged at INFO even without a logging config
+startup_logger = logging.getLogger("social_rent.startup")
+startup_logger.setLevel(logging.INFO)
+if not startup_logger.handlers:
+    startup_logger.addHandler(logging.StreamHandler())
 
 # Initialize FastAPI app
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await init_database()
+    # Startup: the schema is owned by `alembic upgrade head`, only its version is checked
+    started = time.perf_counter()
+    timings = {}
+    
+    phase_started = time.perf_counter()
+    revision = await check_schema_version()
+    timings['schema_check'] = time.perf_counter() - phase_started
+    
+    phase_started = time.perf_counter()
+    await warm_pool(engine)
+    if read_engine is not None:
+        await warm_pool(read_engine)
+    timings['pool_warmup'] = time.perf_counter() - phase_started
+    
+    phase_started = time.perf_counter()
+    async with async_session_maker() as session:
+        stations = await MetroService(session).load_registry()
+    timings['metro_registry'] = time.perf_counter() - phase_started
+    
+    startup_logger.info(
+        "Worker %s started in %.1f ms at schema %s (%s), %d metro stations",
+        os.getpid(), (time.perf_counter() - started) * 1000, revision,
+        ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items()),
+        stations
+    )
+    listing_sweeper.start()
     yield
     # Shutdown - cleanup if needed
+    await listing_sweeper.close()
+    await profile_writes.close()
+    await swipe_queues.close()
 
 app = FastAPI(
     title="Social Rent API",
@@ -40,11 +94,100 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, WRITE_MARKER_HEADER],
 )
 
+# Negotiated brotli/gzip for responses above COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+
+# Clients that just wrote read from the primary for a while
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Per-route latency, SQL statement count and DB time, served at /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if read_engine is not None:
+    instrument_engine(read_engine)
+registry.register("db_pool_checked_out", "gauge", "Connections checked out of the pool",
+                  lambda: get_pool_status()["checked_out"])
+registry.register("db_pool_idle", "gauge", "Idle connections in the pool",
+                  lambda: get_pool_status()["idle"])
+registry.register("db_pool_overflow", "gauge", "Overflow connections in use",
+                  lambda: get_pool_status()["overflow"])
+registry.register("db_pool_waits_total", "counter", "Checkouts that waited for a connection to be returned",
+                  lambda: get_pool_status()["waits"])
+registry.register("db_pool_wait_seconds_total", "counter", "Time checkouts spent waiting for a connection to be returned",
+                  lambda: get_pool_status()["wait_seconds_total"])
+registry.register("auth_cache_hits_total", "counter", "Principal cache hits",
+                  lambda: principal_cache.hits)
+registry.register("auth_cache_misses_total", "counter", "Principal cache misses",
+                  lambda: principal_cache.misses)
+registry.register("profile_updates_buffered_total", "counter", "Search-area updates accepted write-behind",
+                  lambda: profile_writes.submitted)
+registry.register("profile_update_writes_total", "counter", "Coalesced search-area UPDATEs written",
+                  lambda: profile_writes.writes)
+registry.register("profile_update_failures_total", "counter", "Coalesced search-area UPDATEs that failed and were retried",
+                  lambda: profile_writes.failures)
+registry.register("listings_deactivated_total", "counter", "Expired listings deactivated by the sweeper",
+                  lambda: listing_sweeper.deactivated)
+registry.register("listings_archived_total", "counter", "Inactive listings moved to listings_archive",
+                  lambda: listing_sweeper.archived)
+registry.register("replica_reads_total", "counter", "Read-only requests served by the replica",
+                  lambda: replica_router.replica_reads)
+registry.register("replica_fallback_reads_total", "counter", "Read-only requests routed to the primary",
+                  lambda: replica_router.primary_reads)
+registry.register("replica_lag_seconds", "gauge", "Last measured replica lag, -1 when unknown",
+                  lambda: -1 if replica_router.lag is None else replica_router.lag)
+registry.register("listing_tiles_hits_total", "counter", "Vector tiles served from the disk cache",
+                  lambda: listing_tiles.hits)
+registry.register("listing_tiles_renders_total", "counter", "Vector tiles rendered by PostGIS",
+                  lambda: listing_tiles.renders)
+
 # Security
 security = HTTPBearer()
 
+# Field selection: view=summary|full or fields=a,b,c on listing and match endpoints
+def listing_fields(view: Optional[str] = None, fields: Optional[str] = None) -> Optional[FieldSelection]:
+    """Selects listing fields, keeping the (distance or rank, id) page keys"""
+    try:
+        return listing_selection(view, fields, required=('distance', 'rank'))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# Range/set filters on listing attributes, rooms as a comma-separated list
+def listing_filters(
+    rooms: Optional[str] = None,
+    area_min: Optional[float] = None,
+    area_max: Optional[float] = None,
+    floor_min: Optional[int] = None,
+    floor_max: Optional[int] = None,
+    total_floors_min: Optional[int] = None,
+    total_floors_max: Optional[int] = None,
+    metro_distance_max: Optional[int] = None
+) -> Optional[ListingFilters]:
+    try:
+        return parse_listing_filters(
+            rooms, area_min=area_min, area_max=area_max, floor_min=floor_min, floor_max=floor_max,
+            total_floors_min=total_floors_min, total_floors_max=total_floors_max,
+            metro_distance_max=metro_distance_max
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def station_location(station_id: int):
+    """Coordinates of a registered metro station, 400 when unknown"""
+    station = metro_registry.get(station_id)
+    if station is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown metro station")
+    return station.lat, station.lon
+
+def match_fields(view: Optional[str] = None, fields: Optional[str] = None) -> Optional[FieldSelection]:
+    """Selects the fields of the matched user's profile"""
+    try:
+        return user_profile_selection(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 # Routes
 
 @app.get("/")
@@ -55,6 +198,26 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics of this worker"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/internal/auth-cache", dependencies=[Depends(verify_internal_token)])
+async def auth_cache_stats():
+    """Hit/miss counters of the authenticated-principal cache"""
+    return principal_cache.stats()
+
+@app.get("/internal/pool", dependencies=[Depends(verify_internal_token)])
+async def pool_status():
+    """Connection pool usage and checkout wait times of this worker"""
+    return get_pool_status()
+
+@app.get("/internal/replica", dependencies=[Depends(verify_internal_token)])
+async def replica_status():
+    """Replica pool, last measured lag and read routing counts of this worker"""
+    return {**replica_router.stats(), "pool": get_replica_pool_status()}
+
 # User endpoints
 @app.post("/api/users/", response_model=UserResponse)
 async def create_user(
@@ -63,95 +226,329 @@ async def create_user(
     db: AsyncSession = Depends(get_database)
 ):
     """Create or update user profile"""
+    # Buffered search-area changes must not land on top of this write
+    await profile_writes.flush_telegram_user(current_user['id'])
     user_service = UserService(db)
-    user = await user_service.create_or_update_user(current_user['id'], user_data)
+    try:
+        user = await user_service.create_or_update_user(current_user['id'], user_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    swipe_queues.invalidate(user.id)
     return user
 
 @app.get("/api/users/me", response_model=UserResponse)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
     """Get current user profile"""
+    # Every profile write bumps updated_at, so it versions the whole payload.
+    # It is read from the database: the cached principal is only invalidated
+    # in the worker that handled the write
+    user_service = UserService(db)
+    updated_at = await user_service.get_updated_at(current_user.id)
+    if updated_at is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    if updated_at > current_user.updated_at:
+        # Written through another worker since this one cached the principal
+        principal_cache.invalidate(current_user.telegram_id)
+        principal = await user_service.get_principal_by_telegram_id(current_user.telegram_id)
+        if principal is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        current_user = profile_writes.overlay(principal)
+    # Buffered write-behind changes bump the overlaid updated_at on top of it
+    etag = make_etag("me", current_user.id, updated_at.isoformat(), current_user.updated_at.isoformat())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return current_user
 
 @app.put("/api/users/me", response_model=UserResponse)
 async def update_user_profile(
+    request: Request,
     user_data: UserUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
     """Update current user profile"""
+    if profile_writes.accepts(user_data):
+        # Location/radius/price bursts are coalesced into one write
+        try:
+            user = profile_writes.submit(current_user, user_data)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        # The row changes when the burst is written; this marker is an estimate for
+        # other workers, reads here follow profile_writes.write_marker until it commits
+        request.state.written_at = time.time() + PROFILE_WRITE_MAX_DELAY
+        return user
+    await profile_writes.flush(current_user.id)
     user_service = UserService(db)
-    user = await user_service.update_user(current_user.id, user_data)
+    try:
+        user = await user_service.update_user(current_user.id, user_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    swipe_queues.invalidate(user.id)
     return user
 
 @app.get("/api/users/potential-matches", response_model=list[UserProfileResponse])
 async def get_potential_matches(
-    limit: int = 10,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_database)
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_read_database)
 ):
     """Get potential matches based on overlapping search areas"""
-    matching_service = MatchingService(db)
-    matches = await matching_service.get_potential_matches(current_user.id, limit)
-    return matches
+    await profile_writes.flush(current_user.id)
+    matching_service = MatchingService(db, as_dict=FAST_SERIALIZATION)
+    try:
+        matches = await matching_service.get_potential_matches(current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    next_page = next_cursor(matches, limit, distance_key)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return list_response(matches, response)
+
+@app.get("/api/users/potential-matches/ranked", response_model=list[ScoredUserProfileResponse])
+async def get_ranked_matches(
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_user_read_database)
+):
+    """Get potential matches ordered by search area, price, distance and age fit"""
+    await profile_writes.flush(current_user.id)
+    matching_service = MatchingService(db, as_dict=FAST_SERIALIZATION)
+    try:
+        matches = await matching_service.get_ranked_matches(current_user, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    next_page = next_cursor(matches, limit, score_key)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return list_response(matches, response)
+
+@app.get("/api/users/swipe-queue", response_model=list[UserProfileResponse])
+async def get_swipe_queue(
+    count: int = 10,
+    current_user: UserPrincipal = Depends(get_current_user)
+):
+    """Take the next candidates from the server-side swipe queue"""
+    await profile_writes.flush(current_user.id)
+    candidates = await swipe_queues.pop(current_user.id, count)
+    return list_response(candidates)
 
 @app.post("/api/users/{user_id}/like")
 async def like_user(
     user_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
     """Like another user"""
     matching_service = MatchingService(db)
-    result = await matching_service.like_user(current_user.id, user_id)
+    try:
+        result = await matching_service.like_user(current_user.id, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    swipe_queues.discard(current_user.id, [user_id])
     return result
 
+@app.post("/api/users/likes:batch", response_model=list[LikeResult])
+async def like_users_batch(
+    batch: LikeBatchRequest,
+    current_user: UserPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_database)
+):
+    """Apply a queue of likes in one request and one transaction"""
+    matching_service = MatchingService(db)
+    try:
+        results = await matching_service.like_users(current_user.id, batch.user_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    swipe_queues.discard(current_user.id, batch.user_ids)
+    return results
+
 @app.get("/api/users/matches", response_model=list[MatchResponse])
 async def get_user_matches(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    current_user: UserPrincipal = Depends(get_current_user),
+    selection: Optional[FieldSelection] = Depends(match_fields),
+    db: AsyncSession = Depends(get_user_read_database)
+):
+    """Get user's matches (mutual likes), optionally only those created after `since`"""
+    matching_service = MatchingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
+    watermark = await matching_service.get_matches_watermark(current_user.id)
+    etag = make_etag("matches", current_user.id, *watermark, request.url.query)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
+    try:
+        matches = await matching_service.get_user_matches(current_user.id, limit, cursor, since)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    next_page = next_cursor(matches, limit, created_at_key)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return list_response(matches, response, selection=selection)
+
+@app.get("/api/users/matches/count")
+async def get_user_match_count(
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get user's matches (mutual likes)"""
+    """Get the number of matches of the current user"""
     matching_service = MatchingService(db)
-    matches = await matching_service.get_user_matches(current_user.id)
-    return matches
+    count = await matching_service.get_match_count(current_user.id)
+    return {"count": count}
+
+# Metro endpoints
+@app.get("/api/metro/stations", response_model=list[MetroStationResponse])
+async def get_metro_stations(q: Optional[str] = None, limit: int = 20):
+    """Registered metro stations, optionally filtered by name prefix"""
+    return metro_registry.search(q, min(max(limit, 1), 500))
 
 # Listing endpoints
 @app.get("/api/listings/", response_model=list[ListingResponse])
 async def get_listings(
+    response: Response,
     lat: float = None,
     lon: float = None,
     radius: int = 1000,  # meters
     price_min: int = None,
     price_max: int = None,
-    limit: int = 50,
-    db: AsyncSession = Depends(get_database)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,  # full-text query, results ranked by relevance
+    station_id: Optional[int] = None,  # search around this metro station instead of lat/lon
+    filters: Optional[ListingFilters] = Depends(listing_filters),
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_read_database)
 ):
-    """Get listings based on location and filters"""
-    listing_service = ListingService(db)
-    listings = await listing_service.search_listings(
-        lat=lat, lon=lon, radius=radius,
-        price_min=price_min, price_max=price_max,
-        limit=limit
-    )
-    return listings
+    """Get listings based on location, price, attribute and text filters"""
+    if station_id is not None:
+        lat, lon = station_location(station_id)
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
+    try:
+        listings = await listing_service.search_listings(
+            lat=lat, lon=lon, radius=radius,
+            price_min=price_min, price_max=price_max,
+            limit=limit, cursor=cursor, q=q, filters=filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    next_page = next_cursor(listings, limit, rank_key if q else distance_key)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return list_response(listings, response, selection=selection)
+
+@app.get("/api/listings/faceted", response_model=FacetedListingsResponse)
+async def get_faceted_listings(
+    response: Response,
+    lat: float = None,
+    lon: float = None,
+    radius: int = 1000,  # meters
+    price_min: int = None,
+    price_max: int = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    station_id: Optional[int] = None,
+    filters: Optional[ListingFilters] = Depends(listing_filters),
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_read_database)
+):
+    """Same search as /api/listings/ plus room, price and area facet counts"""
+    if station_id is not None:
+        lat, lon = station_location(station_id)
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
+    try:
+        result = await listing_service.search_listings_with_facets(
+            lat=lat, lon=lon, radius=radius,
+            price_min=price_min, price_max=price_max,
+            limit=limit, cursor=cursor, q=q, filters=filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    next_page = next_cursor(result['listings'], limit, rank_key if q else distance_key)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return list_response(result, response, selection=selection)
 
 @app.get("/api/listings/search", response_model=list[ListingResponse])
 async def search_listings_for_user(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_database)
+    current_user: UserPrincipal = Depends(get_current_user),
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_user_read_database)
 ):
     """Get listings based on current user's search criteria"""
-    listing_service = ListingService(db)
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
     listings = await listing_service.get_listings_for_user(current_user)
-    return listings
+    return list_response(listings, selection=selection)
+
+@app.get("/api/listings/viewport", response_model=ViewportResponse)
+async def get_viewport_listings(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    zoom: int,
+    price_min: int = None,
+    price_max: int = None,
+    limit: int = 500,
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_read_database)
+):
+    """Get listings in a map viewport, clustered on a grid when zoomed out"""
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
+    try:
+        viewport = await listing_service.get_viewport(
+            min_lat=min_lat, min_lon=min_lon, max_lat=max_lat, max_lon=max_lon,
+            zoom=zoom, price_min=price_min, price_max=price_max, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return list_response(viewport, selection=selection)
+
+@app.get("/api/tiles/listings/{z}/{x}/{y}.mvt")
+async def get_listing_tile(
+    z: int,
+    x: int,
+    y: int,
+    price_min: int = None,
+    price_max: int = None,
+    db: AsyncSession = Depends(get_database)
+):
+    """Active listings of an XYZ tile as a Mapbox Vector Tile"""
+    try:
+        tile = await listing_tiles.get(db, z, x, y, price_min, price_max)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=60"}
+    )
 
 @app.post("/api/listings/{listing_id}/like")
 async def like_listing(
     listing_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserPrincipal = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
     """Like a listing"""
@@ -161,19 +558,29 @@ async def like_listing(
 
 @app.get("/api/listings/liked", response_model=list[ListingResponse])
 async def get_liked_listings(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_database)
+    request: Request,
+    response: Response,
+    current_user: UserPrincipal = Depends(get_current_user),
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_user_read_database)
 ):
     """Get current user's liked listings"""
-    listing_service = ListingService(db)
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
+    watermark = await listing_service.get_liked_watermark(current_user.id)
+    etag = make_etag("liked", current_user.id, *watermark, request.url.query)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    
     listings = await listing_service.get_user_liked_listings(current_user.id)
-    return listings
+    return list_response(listings, response, selection=selection)
 
 @app.get("/api/users/{user_id}/liked-listings", response_model=list[ListingResponse])
 async def get_user_liked_listings(
     user_id: str,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_database)
+    current_user: UserPrincipal = Depends(get_current_user),
+    selection: Optional[FieldSelection] = Depends(listing_fields),
+    db: AsyncSession = Depends(get_user_read_database)
 ):
     """Get liked listings of a matched user"""
     matching_service = MatchingService(db)
@@ -185,9 +592,9 @@ async def get_user_liked_listings(
             detail="You can only view liked listings of matched users"
         )
     
-    listing_service = ListingService(db)
+    listing_service = ListingService(db, as_dict=FAST_SERIALIZATION, selection=selection)
     listings = await listing_service.get_user_liked_listings(user_id)
-    return listings
+    return list_response(listings, selection=selection)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,136 @@
+import os
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Weights of the score components, normalized to sum to 1
+MATCH_WEIGHTS = {
+    'overlap': float(os.getenv("MATCH_WEIGHT_OVERLAP", "0.4")),
+    'price': float(os.getenv("MATCH_WEIGHT_PRICE", "0.3")),
+    'distance': float(os.getenv("MATCH_WEIGHT_DISTANCE", "0.2")),
+    'age': float(os.getenv("MATCH_WEIGHT_AGE", "0.1")),
+}
+# Nearest candidates fetched per ranked page; the score only reorders these
+MATCH_POOL_SIZE = int(os.getenv("MATCH_POOL_SIZE", "500"))
+# The distance component halves every this many km between search centers
+MATCH_DISTANCE_HALF_KM = float(os.getenv("MATCH_DISTANCE_HALF_KM", "2.0"))
+# The age component halves every this many years of age difference
+MATCH_AGE_HALF_YEARS = float(os.getenv("MATCH_AGE_HALF_YEARS", "5.0"))
+
+# Radius assumed for users without one, as in refresh_candidates
+DEFAULT_SEARCH_RADIUS = 1000
+# Component value when either side left the compared fields empty
+NEUTRAL = 0.5
+
+
+class CandidatePool(NamedTuple):
+    """Column arrays of the candidate set, missing values as NaN"""
+    ids: np.ndarray            # candidate ids as strings, in uuid order
+    distance_km: np.ndarray
+    search_radius: np.ndarray  # meters
+    price_min: np.ndarray
+    price_max: np.ndarray
+    age: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows) -> "CandidatePool":
+        """Pool from row mappings with id, distance_km, search_radius, price_min, price_max and age"""
+        def column(name):
+            # NumPy turns None into NaN for float arrays
+            return np.array([row[name] for row in rows], dtype=np.float64)
+        return cls(
+            ids=np.array([str(row['id']) for row in rows], dtype=str),
+            distance_km=column('distance_km'),
+            search_radius=column('search_radius'),
+            price_min=column('price_min'),
+            price_max=column('price_max'),
+            age=column('age'),
+        )
+
+
+class PoolScores(NamedTuple):
+    """Weighted score and its components in [0, 1], one entry per candidate"""
+    score: np.ndarray
+    overlap: np.ndarray
+    price: np.ndarray
+    distance: np.ndarray
+    age: np.ndarray
+
+
+def circle_overlap(distance: np.ndarray, r1: np.ndarray, r2: np.ndarray) -> np.ndarray:
+    """Lens area shared by two circles, as a fraction of the smaller one"""
+    distance, r1, r2 = np.broadcast_arrays(distance, r1, r2)
+    smaller = np.minimum(r1, r2)
+    # Guard the lens formula; contained and disjoint pairs are replaced below
+    d = np.maximum(distance, 1e-9)
+    alpha = np.arccos(np.clip((d * d + r1 * r1 - r2 * r2) / (2 * d * r1), -1.0, 1.0))
+    beta = np.arccos(np.clip((d * d + r2 * r2 - r1 * r1) / (2 * d * r2), -1.0, 1.0))
+    kite = (-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2)
+    lens = r1 * r1 * alpha + r2 * r2 * beta - 0.5 * np.sqrt(np.maximum(kite, 0.0))
+
+    area = np.where(distance >= r1 + r2, 0.0, lens)
+    area = np.where(distance <= np.abs(r1 - r2), np.pi * smaller * smaller, area)
+    return np.clip(area / (np.pi * smaller * smaller), 0.0, 1.0)
+
+
+def interval_overlap(low1, high1, low2: np.ndarray, high2: np.ndarray) -> np.ndarray:
+    """Shared part of two price ranges, as a fraction of the narrower one
+
+    A missing lower bound is 0; a missing upper bound on either side gives
+    NEUTRAL, since an open range says nothing about the budget.
+    """
+    low1 = np.nan_to_num(np.asarray(low1, dtype=np.float64), nan=0.0)
+    low2 = np.nan_to_num(low2, nan=0.0)
+    shared = np.minimum(high1, high2) - np.maximum(low1, low2)
+    narrower = np.minimum(high1 - low1, high2 - low2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(narrower > 0, shared / narrower, (shared >= 0).astype(np.float64))
+    fraction = np.clip(fraction, 0.0, 1.0)
+    return np.where(np.isnan(high1) | np.isnan(high2), NEUTRAL, fraction)
+
+
+def score_pool(
+    radius: Optional[float],
+    price_min: Optional[float],
+    price_max: Optional[float],
+    age: Optional[float],
+    pool: CandidatePool
+) -> PoolScores:
+    """Score every candidate of the pool against the user's search settings"""
+    def value(field):
+        return np.nan if field is None else float(field)
+
+    my_radius = float(radius or DEFAULT_SEARCH_RADIUS)
+    their_radius = np.nan_to_num(pool.search_radius, nan=DEFAULT_SEARCH_RADIUS)
+
+    overlap = circle_overlap(pool.distance_km * 1000, my_radius, their_radius)
+    price = interval_overlap(value(price_min), value(price_max), pool.price_min, pool.price_max)
+    distance = np.exp2(-pool.distance_km / MATCH_DISTANCE_HALF_KM)
+    age_score = np.exp2(-np.abs(pool.age - value(age)) / MATCH_AGE_HALF_YEARS)
+    age_score = np.where(np.isnan(age_score), NEUTRAL, age_score)
+
+    total = sum(MATCH_WEIGHTS.values()) or 1.0
+    score = (
+        MATCH_WEIGHTS['overlap'] * overlap
+        + MATCH_WEIGHTS['price'] * price
+        + MATCH_WEIGHTS['distance'] * distance
+        + MATCH_WEIGHTS['age'] * age_score
+    ) / total
+    return PoolScores(score, overlap, price, distance, age_score)
+
+
+def top_k(scores: PoolScores, ids: np.ndarray, k: int, after: Optional[Tuple[float, str]] = None) -> np.ndarray:
+    """Indices of the k best candidates ordered by (score desc, id), past the keyset position `after`"""
+    candidates = np.arange(len(ids))
+    if after is not None:
+        after_score, after_id = after
+        past = (scores.score < after_score) | ((scores.score == after_score) & (ids > after_id))
+        candidates = candidates[past]
+    if len(candidates) > k:
+        # Partial selection first, so only the k winners get fully sorted
+        best = np.argpartition(-scores.score[candidates], k - 1)[:k]
+        cutoff = scores.score[candidates[best]].min()
+        # Keep every candidate tied at the cutoff, the id decides among them
+        candidates = candidates[scores.score[candidates] >= cutoff]
+    order = np.lexsort((ids[candidates], -scores.score[candidates]))
+    return candidates[order][:k]
@@ -0,0 +1,198 @@
+import bisect
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger("social_rent.slow_query")
+
+# Statements slower than this many seconds are candidates for the slow-query log
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.2"))
+# Fraction of slow statements that are actually logged
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.1"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """SQL activity of the request being served"""
+    __slots__ = ('scope', 'statements', 'db_seconds')
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def route_name(scope: dict) -> str:
+    """Route template of a request, so label cardinality stays bounded"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.series: Dict[Tuple, List] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            # bucket counts (last one is +Inf), sum
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+
+class MetricsRegistry:
+    """Per-route request and SQL metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.request_statements = Histogram(STATEMENT_BUCKETS)
+        self.requests: Dict[Tuple, int] = {}
+        self.db_statements: Dict[Tuple, int] = {}
+        self.db_seconds: Dict[Tuple, float] = {}
+        self.slow_queries: Dict[Tuple, int] = {}
+        # Extra gauges/counters collected at scrape time: name -> (type, help, callable)
+        self.collectors: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float, stats: RequestStats):
+        labels = (route, method)
+        self.request_latency.observe(labels, seconds)
+        self.request_statements.observe(labels, stats.statements)
+        key = (route, method, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.db_statements[labels] = self.db_statements.get(labels, 0) + stats.statements
+        self.db_seconds[labels] = self.db_seconds.get(labels, 0.0) + stats.db_seconds
+
+    def register(self, name: str, metric_type: str, help_text: str, collect: Callable[[], float]):
+        self.collectors[name] = (metric_type, help_text, collect)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, metric_type: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        def fmt(names: Tuple[str, ...], values: Tuple) -> str:
+            return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+        for name, help_text, histogram in (
+            ("http_request_duration_seconds", "Request latency by route", self.request_latency),
+            ("http_request_db_statements", "SQL statements issued per request by route", self.request_statements),
+        ):
+            header(name, "histogram", help_text)
+            for labels, (counts, total) in sorted(histogram.series.items()):
+                base = fmt(("route", "method"), labels)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{name}_bucket{{{base},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{base}}} {total}")
+                lines.append(f"{name}_count{{{base}}} {cumulative}")
+
+        header("http_requests_total", "counter", "Requests by route, method and status")
+        for labels, value in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{{{fmt(('route', 'method', 'status'), labels)}}} {value}")
+
+        header("db_statements_total", "counter", "SQL statements by route")
+        for labels, value in sorted(self.db_statements.items()):
+            lines.append(f"db_statements_total{{{fmt(('route', 'method'), labels)}}} {value}")
+
+        header("db_duration_seconds_total", "counter", "Time spent in SQL statements by route")
+        for labels, value in sorted(self.db_seconds.items()):
+            lines.append(f"db_duration_seconds_total{{{fmt(('route', 'method'), labels)}}} {value}")
+
+        header("db_slow_statements_total", "counter", "SQL statements slower than SLOW_QUERY_SECONDS by route")
+        for labels, value in sorted(self.slow_queries.items()):
+            lines.append(f"db_slow_statements_total{{{fmt(('route',), labels)}}} {value}")
+
+        for name, (metric_type, help_text, collect) in self.collectors.items():
+            header(name, metric_type, help_text)
+            lines.append(f"{name} {collect()}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and attaching its SQL counters"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            registry.observe_request(
+                route_name(scope), scope["method"], status_code,
+                time.perf_counter() - started, stats
+            )
+            _request_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _request_stats.get()
+    if stats is None:
+        return
+
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        route = route_name(stats.scope)
+        registry.slow_queries[(route,)] = registry.slow_queries.get((route,), 0) + 1
+        if random.random() < SLOW_QUERY_SAMPLE_RATE:
+            logger.warning("Slow query %.3fs on %s %s: %s", elapsed, stats.scope["method"], route,
+                           " ".join(statement.split())[:1000])
+
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute, drop their start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    """Count and time every statement executed through an async engine"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
@@ -0,0 +1,91 @@
+import csv
+import os
+from typing import Dict, List, Optional
+
+from schemas import MetroStationResponse
+
+# Bundled offline station list, loaded into metro_stations at startup
+METRO_DATASET = os.getenv(
+    "METRO_DATASET", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metro_stations.csv")
+)
+# Listings given their nearest station per UPDATE statement
+METRO_ASSIGN_BATCH = int(os.getenv("METRO_ASSIGN_BATCH", "5000"))
+
+
+def nearest_station_sql(batch: int = METRO_ASSIGN_BATCH) -> str:
+    """UPDATE giving up to `batch` unassigned listings their nearest station
+
+    metro_station_id always links the nearest registered station, which the
+    station filter uses. The displayed metro_station and metro_distance are
+    only filled in when the feed gave no station. updated_at is bumped so the
+    in-memory index and the tile and ETag watermarks pick up the change.
+    The LATERAL subquery is a KNN lookup on the GIST index of metro_stations.
+    """
+    return f"""
+        UPDATE listings l
+        SET metro_station_id = nearest.station_id,
+            metro_station = CASE WHEN l.metro_station IS NULL THEN nearest.name ELSE l.metro_station END,
+            metro_distance = CASE WHEN l.metro_station IS NULL THEN nearest.distance ELSE l.metro_distance END,
+            updated_at = now()
+        FROM (
+            SELECT pending.id AS listing_id, s.id AS station_id, s.name,
+                   round(ST_Distance(pending.location, s.location))::int AS distance
+            FROM (
+                SELECT id, location FROM listings
+                WHERE metro_station_id IS NULL
+                LIMIT {int(batch)}
+            ) pending
+            CROSS JOIN LATERAL (
+                SELECT id, name, location FROM metro_stations
+                ORDER BY metro_stations.location <-> pending.location
+                LIMIT 1
+            ) s
+        ) nearest
+        WHERE l.id = nearest.listing_id
+    """
+
+
+def normalize_station_name(name: str) -> str:
+    return " ".join(name.lower().replace("ё", "е").split())
+
+
+def read_metro_dataset(path: str = METRO_DATASET) -> List[Dict]:
+    """Stations of the bundled CSV as dicts with name, line, lat and lon"""
+    with open(path, newline='', encoding='utf-8') as source:
+        return [
+            {'name': row['name'].strip(), 'line': row['line'].strip(),
+             'lat': float(row['lat']), 'lon': float(row['lon'])}
+            for row in csv.DictReader(source)
+        ]
+
+
+class MetroRegistry:
+    """Metro stations held in memory once synced, so lookups need no query"""
+
+    def __init__(self):
+        self.by_id: Dict[int, MetroStationResponse] = {}
+        self.by_name: Dict[str, MetroStationResponse] = {}
+
+    def load(self, stations: List[MetroStationResponse]):
+        self.by_id = {station.id: station for station in stations}
+        self.by_name = {}
+        for station in sorted(stations, key=lambda s: s.id):
+            # Interchanges share a name; the first line listed wins
+            self.by_name.setdefault(normalize_station_name(station.name), station)
+
+    def get(self, station_id: int) -> Optional[MetroStationResponse]:
+        return self.by_id.get(station_id)
+
+    def find(self, name: str) -> Optional[MetroStationResponse]:
+        """Station by name, ignoring case, ё/е and extra spaces"""
+        return self.by_name.get(normalize_station_name(name))
+
+    def search(self, query: Optional[str] = None, limit: int = 20) -> List[MetroStationResponse]:
+        stations = sorted(self.by_id.values(), key=lambda s: (s.name, s.line))
+        if query:
+            needle = normalize_station_name(query)
+            stations = [s for s in stations if normalize_station_name(s.name).startswith(needle)]
+        return stations[:limit]
+
+
+metro_registry = MetroRegistry()
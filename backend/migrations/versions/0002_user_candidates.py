@@ -0,0 +1,33 @@
+"""Precomputed overlap relation between users' search areas
+
+Filled for every user by MatchingService.rebuild_candidates and kept current
+by refresh_candidates when a user's search area changes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE user_candidates (
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            candidate_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            distance_km DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, candidate_id)
+        )
+    """)
+    op.execute("CREATE INDEX idx_user_candidates_lookup ON user_candidates(user_id, distance_km, candidate_id)")
+    op.execute("CREATE INDEX idx_user_candidates_candidate ON user_candidates(candidate_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE user_candidates")
@@ -0,0 +1,20 @@
+"""Key of each listing in its source feed, used by import_listings.py to upsert
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE listings ADD COLUMN external_id VARCHAR(255) UNIQUE")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE listings DROP COLUMN external_id")
@@ -0,0 +1,70 @@
+"""Stored match count per user and keyset indexes for the match list
+
+MatchingService.like_users creates matches and bumps match_count in the
+same statement, so the init.sql trigger that created matches on its own
+(without counting them) is dropped.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trigger_create_match ON user_likes")
+    op.execute("DROP FUNCTION IF EXISTS create_match_on_mutual_like()")
+    op.execute("ALTER TABLE users ADD COLUMN match_count INTEGER NOT NULL DEFAULT 0")
+    op.execute("""
+        UPDATE users
+        SET match_count = c.matches
+        FROM (
+            SELECT user_id, count(*) AS matches
+            FROM (
+                SELECT user1_id AS user_id FROM user_matches
+                UNION ALL
+                SELECT user2_id FROM user_matches
+            ) sides
+            GROUP BY user_id
+        ) c
+        WHERE users.id = c.user_id
+    """)
+    op.execute("CREATE INDEX idx_user_matches_user1_created ON user_matches(user1_id, created_at, id)")
+    op.execute("CREATE INDEX idx_user_matches_user2_created ON user_matches(user2_id, created_at, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX idx_user_matches_user2_created")
+    op.execute("DROP INDEX idx_user_matches_user1_created")
+    op.execute("ALTER TABLE users DROP COLUMN match_count")
+    op.execute("""
+        CREATE FUNCTION create_match_on_mutual_like()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM user_likes
+                WHERE liker_id = NEW.liked_id AND liked_id = NEW.liker_id
+            ) THEN
+                INSERT INTO user_matches (user1_id, user2_id)
+                VALUES (
+                    LEAST(NEW.liker_id, NEW.liked_id),
+                    GREATEST(NEW.liker_id, NEW.liked_id)
+                )
+                ON CONFLICT (user1_id, user2_id) DO NOTHING;
+            END IF;
+
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trigger_create_match
+            AFTER INSERT ON user_likes
+            FOR EACH ROW
+            EXECUTE FUNCTION create_match_on_mutual_like()
+    """)
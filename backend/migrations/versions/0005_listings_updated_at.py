@@ -0,0 +1,23 @@
+"""Index listings.updated_at for the change watermarks
+
+The in-memory search index, the tile cache and the liked-listings ETag all
+read listings changed since a watermark.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX idx_listings_updated_at ON listings(updated_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX idx_listings_updated_at")
@@ -0,0 +1,30 @@
+"""Russian full-text document per listing, weighted title > metro/address > description
+
+Adding the stored generated column rewrites the listings table.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE listings ADD COLUMN search_vector TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(metro_station, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(address, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX idx_listings_search_vector ON listings USING GIN(search_vector)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE listings DROP COLUMN search_vector")
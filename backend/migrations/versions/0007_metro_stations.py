@@ -0,0 +1,36 @@
+"""Metro station registry, and the nearest station of listings and users
+
+The stations themselves are loaded by 0010.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE metro_stations (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            line VARCHAR(255) NOT NULL,
+            location GEOGRAPHY(POINT, 4326) NOT NULL,
+            CONSTRAINT uq_metro_stations_name_line UNIQUE(name, line)
+        )
+    """)
+    op.execute("CREATE INDEX idx_metro_stations_location ON metro_stations USING GIST(location)")
+    op.execute("ALTER TABLE users ADD COLUMN metro_station_id INTEGER REFERENCES metro_stations(id) ON DELETE SET NULL")
+    op.execute("ALTER TABLE listings ADD COLUMN metro_station_id INTEGER REFERENCES metro_stations(id) ON DELETE SET NULL")
+    op.execute("CREATE INDEX idx_listings_metro_station ON listings(metro_station_id)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE listings DROP COLUMN metro_station_id")
+    op.execute("ALTER TABLE users DROP COLUMN metro_station_id")
+    op.execute("DROP TABLE metro_stations")
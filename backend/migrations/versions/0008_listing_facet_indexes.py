@@ -0,0 +1,22 @@
+"""Indexes for the attribute filters and facet counts of the listing search
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX idx_listings_facets ON listings(is_active, rooms, price, area)")
+    op.execute("CREATE INDEX idx_listings_metro_distance ON listings(is_active, metro_distance, price)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX idx_listings_metro_distance")
+    op.execute("DROP INDEX idx_listings_facets")
@@ -0,0 +1,43 @@
+"""Store timestamps as TIMESTAMPTZ, matching DateTime(timezone=True) in models.py
+
+init.sql declared them as TIMESTAMP while create_all made TIMESTAMPTZ. The
+existing values were written as UTC (datetime.utcnow() and a UTC server clock).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+TIMESTAMP_COLUMNS = {
+    'users': ('created_at', 'updated_at'),
+    'listings': ('created_at', 'updated_at'),
+    'user_likes': ('created_at',),
+    'user_matches': ('created_at',),
+    'listing_likes': ('created_at',),
+    'user_candidates': ('created_at',),
+}
+
+
+def upgrade() -> None:
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        # One ALTER per table, so each table is rewritten once
+        op.execute(f"ALTER TABLE {table} " + ", ".join(
+            f"ALTER COLUMN {column} TYPE TIMESTAMPTZ USING {column} AT TIME ZONE 'UTC', "
+            f"ALTER COLUMN {column} SET DEFAULT now()"
+            for column in columns
+        ))
+
+
+def downgrade() -> None:
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        op.execute(f"ALTER TABLE {table} " + ", ".join(
+            f"ALTER COLUMN {column} TYPE TIMESTAMP USING {column} AT TIME ZONE 'UTC', "
+            f"ALTER COLUMN {column} SET DEFAULT CURRENT_TIMESTAMP"
+            for column in columns
+        ))
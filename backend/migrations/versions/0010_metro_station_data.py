@@ -0,0 +1,35 @@
+"""Load the bundled metro station dataset
+
+Listings are linked to their nearest station by generate_listings.py and
+import_listings.py, or by MetroService.sync_stations.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-16
+"""
+from alembic import op
+from sqlalchemy import text
+
+from metro import read_metro_dataset
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+INSERT_STATION = text("""
+    INSERT INTO metro_stations (name, line, location)
+    VALUES (:name, :line, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography)
+    ON CONFLICT (name, line) DO NOTHING
+""")
+
+
+def upgrade() -> None:
+    # Bound per row so `alembic upgrade --sql` renders the values too
+    for station in read_metro_dataset():
+        op.execute(INSERT_STATION.bindparams(**station))
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM metro_stations")
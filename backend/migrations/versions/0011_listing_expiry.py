@@ -0,0 +1,91 @@
+"""Listing expiry, an archive table and indexes restricted to active listings
+
+Every hot listing query filters on is_active = true, so the location, price,
+text and facet indexes only cover active rows and shrink as the sweeper
+deactivates and archives stale listings. Indexes are built CONCURRENTLY
+outside the migration transaction so the listings table stays writable.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+# Existing listings expire this long after their last update
+BACKFILL_TTL = "30 days"
+
+ACTIVE_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_location ON listings USING GIST(location) WHERE is_active",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_price ON listings(price) WHERE is_active",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_search_vector ON listings USING GIN(search_vector) WHERE is_active",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_facets ON listings(rooms, price, area) WHERE is_active",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_metro_distance ON listings(metro_distance, price) WHERE is_active",
+    # Sweeper scan for active listings past their expiry
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active_expires ON listings(expires_at) WHERE is_active",
+    # Sweeper scan for inactive listings due for the archive
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_inactive_updated ON listings(updated_at) WHERE NOT is_active",
+]
+FULL_INDEXES = [
+    "idx_listings_location", "idx_listings_price", "idx_listings_active", "idx_listings_search_vector",
+    "idx_listings_facets", "idx_listings_metro_distance",
+]
+RESTORED_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_location ON listings USING GIST(location)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_price ON listings(price)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_active ON listings(is_active)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_search_vector ON listings USING GIN(search_vector)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_facets ON listings(is_active, rooms, price, area)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_listings_metro_distance ON listings(is_active, metro_distance, price)",
+]
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE listings ADD COLUMN expires_at TIMESTAMPTZ")
+    op.execute(f"UPDATE listings SET expires_at = updated_at + interval '{BACKFILL_TTL}' WHERE is_active")
+    op.execute("""
+        CREATE TABLE listings_archive (
+            id UUID PRIMARY KEY,
+            external_id VARCHAR(255),
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            price INTEGER NOT NULL,
+            address VARCHAR(500),
+            location GEOGRAPHY(POINT, 4326) NOT NULL,
+            rooms INTEGER,
+            area DECIMAL(7,2),
+            floor INTEGER,
+            total_floors INTEGER,
+            metro_station VARCHAR(255),
+            metro_distance INTEGER,
+            metro_station_id INTEGER,
+            photos TEXT[],
+            created_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ,
+            expires_at TIMESTAMPTZ,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX idx_listings_archive_external_id ON listings_archive(external_id)")
+
+    with op.get_context().autocommit_block():
+        for statement in ACTIVE_INDEXES:
+            op.execute(statement)
+        for index in FULL_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for statement in RESTORED_INDEXES:
+            op.execute(statement)
+        for statement in ACTIVE_INDEXES:
+            index = statement.split("IF NOT EXISTS ")[1].split()[0]
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+
+    op.execute("DROP TABLE listings_archive")
+    op.execute("ALTER TABLE listings DROP COLUMN expires_at")
@@ -0,0 +1,34 @@
+"""Keep the likes of archived listings in listing_likes_archive
+
+Deleting a listing cascades to listing_likes, so archiving used to drop
+users' likes of it. ListingService.archive_inactive now moves them here in
+the same statement that moves the listing to listings_archive.
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE listing_likes_archive (
+            id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            listing_id UUID NOT NULL,
+            created_at TIMESTAMPTZ,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX idx_listing_likes_archive_user ON listing_likes_archive(user_id)")
+    op.execute("CREATE INDEX idx_listing_likes_archive_listing ON listing_likes_archive(listing_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE listing_likes_archive")
@@ -1,18 +1,38 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, CheckConstraint, ARRAY, DECIMAL, BigInteger
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, CheckConstraint, ARRAY, DECIMAL, BigInteger, Float, Index, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from geoalchemy2 import Geography
 import uuid
 
 Base = declarative_base()
 
+LISTING_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(metro_station, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(address, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+class MetroStation(Base):
+    __tablename__ = "metro_stations"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    line = Column(String(255), nullable=False)
+    location = Column(Geography('POINT', srid=4326, spatial_index=False), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('name', 'line', name='uq_metro_stations_name_line'),
+        Index('idx_metro_stations_location', 'location', postgresql_using='gist'),
+    )
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    telegram_id = Column(BigInteger, unique=True, nullable=False)
     username = Column(String(255), nullable=True)
     first_name = Column(String(255), nullable=True)
     last_name = Column(String(255), nullable=True)
@@ -22,8 +42,10 @@ class User(Base):
     price_min = Column(Integer, CheckConstraint('price_min >= 0'), nullable=True)
     price_max = Column(Integer, CheckConstraint('price_max >= price_min'), nullable=True)
     metro_station = Column(String(255), nullable=True)
-    search_location = Column(Geography('POINT', srid=4326), nullable=True)
+    metro_station_id = Column(Integer, ForeignKey("metro_stations.id", ondelete="SET NULL"), nullable=True)
+    search_location = Column(Geography('POINT', srid=4326, spatial_index=False), nullable=True)
     search_radius = Column(Integer, CheckConstraint('search_radius > 0'), nullable=True)  # in meters
+    match_count = Column(Integer, nullable=False, server_default='0')  # maintained on match insert
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -33,6 +55,12 @@ class User(Base):
     likes_received = relationship("UserLike", foreign_keys="UserLike.liked_id", back_populates="liked")
     listing_likes = relationship("ListingLike", back_populates="user")
 
+    # Named as in the migrations, so autogenerate sees no difference
+    __table_args__ = (
+        Index('idx_users_telegram_id', 'telegram_id'),
+        Index('idx_users_location', 'search_location', postgresql_using='gist'),
+    )
+
 
 class Listing(Base):
     __tablename__ = "listings"
@@ -42,28 +70,94 @@ class Listing(Base):
     description = Column(Text, nullable=True)
     price = Column(Integer, CheckConstraint('price >= 0'), nullable=False)
     address = Column(String(500), nullable=True)
-    location = Column(Geography('POINT', srid=4326), nullable=False, index=True)
+    location = Column(Geography('POINT', srid=4326, spatial_index=False), nullable=False)
     rooms = Column(Integer, CheckConstraint('rooms > 0'), nullable=True)
     area = Column(DECIMAL(7, 2), CheckConstraint('area > 0'), nullable=True)
     floor = Column(Integer, nullable=True)
     total_floors = Column(Integer, nullable=True)
     metro_station = Column(String(255), nullable=True)
     metro_distance = Column(Integer, nullable=True)  # in meters
+    metro_station_id = Column(Integer, ForeignKey("metro_stations.id", ondelete="SET NULL"), nullable=True)
     photos = Column(ARRAY(Text), nullable=True)
-    is_active = Column(Boolean, default=True, index=True)
+    external_id = Column(String(255), unique=True, nullable=True)  # key in the source feed
+    is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=True)  # deactivated by the sweeper once past
+    # Russian full-text document, weighted title > metro/address > description
+    search_vector = Column(TSVECTOR, Computed(LISTING_SEARCH_VECTOR, persisted=True), nullable=True)
 
     # Relationships
     likes = relationship("ListingLike", back_populates="listing")
 
+    __table_args__ = (
+        # Hot queries only read active listings, so their indexes skip the rest
+        Index('idx_listings_active_location', 'location', postgresql_using='gist', postgresql_where=text('is_active')),
+        Index('idx_listings_active_price', 'price', postgresql_where=text('is_active')),
+        Index('idx_listings_active_search_vector', 'search_vector', postgresql_using='gin',
+              postgresql_where=text('is_active')),
+        # Covers the rooms/price/area filters and facet counts with index-only scans
+        Index('idx_listings_active_facets', 'rooms', 'price', 'area', postgresql_where=text('is_active')),
+        Index('idx_listings_active_metro_distance', 'metro_distance', 'price', postgresql_where=text('is_active')),
+        Index('idx_listings_active_expires', 'expires_at', postgresql_where=text('is_active')),
+        Index('idx_listings_inactive_updated', 'updated_at', postgresql_where=text('NOT is_active')),
+        # Change watermarks and station backfills read every row
+        Index('idx_listings_updated_at', 'updated_at'),
+        Index('idx_listings_metro_station', 'metro_station_id'),
+    )
+
+
+class ListingArchive(Base):
+    """Listings moved out of the listings table long after they were deactivated"""
+    __tablename__ = "listings_archive"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    external_id = Column(String(255), nullable=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    price = Column(Integer, nullable=False)
+    address = Column(String(500), nullable=True)
+    location = Column(Geography('POINT', srid=4326, spatial_index=False), nullable=False)
+    rooms = Column(Integer, nullable=True)
+    area = Column(DECIMAL(7, 2), nullable=True)
+    floor = Column(Integer, nullable=True)
+    total_floors = Column(Integer, nullable=True)
+    metro_station = Column(String(255), nullable=True)
+    metro_distance = Column(Integer, nullable=True)
+    metro_station_id = Column(Integer, nullable=True)
+    photos = Column(ARRAY(Text), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_listings_archive_external_id', 'external_id'),
+    )
+
+
+class ListingLikeArchive(Base):
+    """Likes of listings moved to listings_archive, kept instead of cascading away"""
+    __tablename__ = "listing_likes_archive"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    listing_id = Column(UUID(as_uuid=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_listing_likes_archive_user', 'user_id'),
+        Index('idx_listing_likes_archive_listing', 'listing_id'),
+    )
+
 
 class UserLike(Base):
     __tablename__ = "user_likes"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    liker_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    liked_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    liker_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    liked_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -72,6 +166,9 @@ class UserLike(Base):
 
     __table_args__ = (
         CheckConstraint('liker_id != liked_id', name='check_no_self_like'),
+        UniqueConstraint('liker_id', 'liked_id'),
+        Index('idx_user_likes_liker', 'liker_id'),
+        Index('idx_user_likes_liked', 'liked_id'),
     )
 
 
@@ -89,6 +186,9 @@ class UserMatch(Base):
 
     __table_args__ = (
         CheckConstraint('user1_id != user2_id', name='check_no_self_match'),
+        UniqueConstraint('user1_id', 'user2_id'),
+        Index('idx_user_matches_user1_created', 'user1_id', 'created_at', 'id'),
+        Index('idx_user_matches_user2_created', 'user2_id', 'created_at', 'id'),
     )
 
 
@@ -96,10 +196,31 @@ class ListingLike(Base):
     __tablename__ = "listing_likes"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
-    listing_id = Column(UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    listing_id = Column(UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="listing_likes")
-    listing = relationship("Listing", back_populates="likes")
\ No newline at end of file
+    listing = relationship("Listing", back_populates="likes")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'listing_id'),
+        Index('idx_listing_likes_user', 'user_id'),
+        Index('idx_listing_likes_listing', 'listing_id'),
+    )
+
+
+class UserCandidate(Base):
+    """Precomputed overlap relation between users' search areas, stored in both directions"""
+    __tablename__ = "user_candidates"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    candidate_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    distance_km = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_user_candidates_lookup', 'user_id', 'distance_km', 'candidate_id'),
+        Index('idx_user_candidates_candidate', 'candidate_id'),
+    )
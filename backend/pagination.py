@@ -0,0 +1,89 @@
+import base64
+import json
+import math
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Largest page a paginated endpoint serves in one response
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+# Listing pages are keyed on (distance or text rank, id); distance is None without a location
+LISTING_CURSOR = ((float, type(None)), uuid.UUID)
+
+def encode_cursor(*values: Any) -> str:
+    """Encode a keyset position into an opaque URL-safe cursor"""
+    payload = []
+    for value in values:
+        if isinstance(value, uuid.UUID):
+            payload.append({"u": str(value)})
+        elif isinstance(value, datetime):
+            payload.append({"t": value.isoformat()})
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _typed(value: Any, expected) -> Any:
+    """The value if it is of the expected type (or tuple of types), ints widened to float"""
+    expected = expected if isinstance(expected, tuple) else (expected,)
+    if float in expected and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, expected) or isinstance(value, bool) and bool not in expected:
+        raise ValueError("Invalid cursor")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError("Invalid cursor")
+    return value
+
+def decode_cursor(cursor: str, types: Tuple) -> Tuple:
+    """Decode a cursor produced by encode_cursor into values of the given types
+
+    Each entry of types is a type or a tuple of types, as for isinstance.
+    Raises ValueError if the cursor is malformed or holds other types, so
+    a forged cursor is a 400 rather than a database type error.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = []
+        for value in payload:
+            if isinstance(value, dict) and "u" in value:
+                values.append(uuid.UUID(value["u"]))
+            elif isinstance(value, dict) and "t" in value:
+                values.append(datetime.fromisoformat(value["t"]))
+            else:
+                values.append(value)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    return tuple(_typed(value, expected) for value, expected in zip(values, types))
+
+def next_cursor(items: Sequence, limit: int, key: Callable[[Any], Tuple]) -> Optional[str]:
+    """Cursor pointing after the last item, or None when the page is the last one"""
+    if not items or len(items) < limit:
+        return None
+    return encode_cursor(*key(items[-1]))
+
+def _field(item, name: str):
+    # Items are response models, or plain dicts on the fast serialization path
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+def distance_key(item) -> Tuple:
+    """Keyset position of a distance-ordered item"""
+    return (_field(item, 'distance'), _field(item, 'id'))
+
+def created_at_key(item) -> Tuple:
+    """Keyset position of a newest-first item"""
+    return (_field(item, 'created_at'), _field(item, 'id'))
+
+def rank_key(item) -> Tuple:
+    """Keyset position of a relevance-ordered item"""
+    return (_field(item, 'rank'), _field(item, 'id'))
+
+def score_key(item) -> Tuple:
+    """Keyset position of a match-score-ordered item"""
+    return (_field(item, 'score'), str(_field(item, 'id')))
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from schemas import UserPrincipal
+
+# Seconds a resolved principal stays valid
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+# Maximum number of cached principals, least recently used are evicted first
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+class PrincipalCache:
+    """TTL + LRU cache from verified auth tokens to user principals
+
+    The cache is per worker and invalidate() only clears the worker that
+    handled a profile write. Other workers may serve the previous profile
+    fields for up to PRINCIPAL_CACHE_TTL seconds after a write. /api/users/me
+    checks updated_at against the database, so it is never stale and its
+    ETag changes at once.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_size: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # key -> (expires_at, hash_verified, principal)
+        self._entries: "OrderedDict[str, Tuple[float, bool, UserPrincipal]]" = OrderedDict()
+        # telegram_id -> keys, so profile writes can drop every token of a user
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        """Cache key of a raw auth token; covers the initData hash and every signed field"""
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bool, UserPrincipal]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, hash_verified, principal = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return hash_verified, principal
+
+    def put(self, key: str, hash_verified: bool, principal: UserPrincipal):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, hash_verified, principal)
+        self._keys_by_user.setdefault(principal.telegram_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, telegram_id: int):
+        """Drop every cached principal of a user after their profile changed"""
+        for key in self._keys_by_user.pop(telegram_id, set()):
+            self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def _remove(self, key: str):
+        _, _, principal = self._entries.pop(key)
+        keys = self._keys_by_user.get(principal.telegram_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[principal.telegram_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+principal_cache = PrincipalCache()
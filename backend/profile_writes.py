@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from database import async_session_maker
+from principal_cache import principal_cache
+from replica import READ_YOUR_WRITES_SECONDS
+from schemas import UserPrincipal, UserUpdate
+from services import UserService
+from swipe_queue import swipe_queues
+
+logger = logging.getLogger(__name__)
+
+# Coalesce location/radius/price updates instead of writing each one
+PROFILE_WRITE_BEHIND = os.getenv("PROFILE_WRITE_BEHIND", "true").lower() == "true"
+# A burst is written once no change arrived for this many seconds...
+PROFILE_WRITE_DELAY = float(os.getenv("PROFILE_WRITE_DELAY", "1.0"))
+# ...or this long after its first change, whichever comes first. The write
+# marker answered to a buffered update points this far ahead, the buffer's
+# own marker moves to the commit time once the write lands
+PROFILE_WRITE_MAX_DELAY = float(os.getenv("PROFILE_WRITE_MAX_DELAY", "3.0"))
+# Failed writes are retried until they land, backing off up to this many seconds;
+# from the PROFILE_WRITE_RETRIES-th failure on they are logged as errors
+PROFILE_WRITE_RETRY_MAX_DELAY = float(os.getenv("PROFILE_WRITE_RETRY_MAX_DELAY", "30"))
+PROFILE_WRITE_RETRIES = 3
+
+# Fields of UserUpdate that may be written behind
+SEARCH_AREA_FIELDS = frozenset({'lat', 'lon', 'search_radius', 'price_min', 'price_max'})
+
+
+class PendingUpdate:
+    """Coalesced search-area changes of one user, not yet written"""
+
+    def __init__(self, telegram_id: int):
+        self.telegram_id = telegram_id
+        self.fields: Dict[str, object] = {}
+        self.first_at = time.monotonic()
+        self.last_at = self.first_at
+        self.changed_at = datetime.now(timezone.utc)
+        self.attempts = 0
+        # Earliest monotonic time of the next attempt after a failed write
+        self.retry_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+        # Set once a write of these fields finished, successfully or not
+        self.written = asyncio.Event()
+
+    def deadline(self) -> float:
+        return max(self.retry_at, min(self.last_at + PROFILE_WRITE_DELAY, self.first_at + PROFILE_WRITE_MAX_DELAY))
+
+
+class ProfileWriteBuffer:
+    """Write-behind buffer for rapid profile search-area updates
+
+    Slider drags and map pin moves arrive as bursts of PUT /api/users/me;
+    each burst becomes one UPDATE. Until it is written, the pending fields
+    are overlaid on the user's principal so the same user reads their own
+    writes. A failed write keeps its fields buffered and overlaid and is
+    retried in the background; a flush() that cannot write raises instead
+    of letting the caller read stale rows. write_marker() tells read routing
+    when a user's buffered changes committed, including those written by a
+    retry long after the request was answered. The buffer lives in one worker:
+    requests of the user served by another worker may see the previous
+    values for up to PROFILE_WRITE_MAX_DELAY, or until a failing write lands.
+    """
+
+    def __init__(self):
+        self.pending: Dict[uuid.UUID, PendingUpdate] = {}
+        # Updates whose UPDATE is running right now
+        self.writing: Dict[uuid.UUID, PendingUpdate] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # Unix time each user's last buffered write committed, oldest first
+        self.committed_at: "OrderedDict[uuid.UUID, float]" = OrderedDict()
+        self.submitted = 0
+        self.writes = 0
+        self.failures = 0
+
+    @staticmethod
+    def accepts(user_data: UserUpdate) -> bool:
+        fields = user_data.dict(exclude_unset=True)
+        return PROFILE_WRITE_BEHIND and bool(fields) and set(fields) <= SEARCH_AREA_FIELDS
+
+    def submit(self, principal: UserPrincipal, user_data: UserUpdate) -> UserPrincipal:
+        """Queue an update and return the principal as it will be once written
+
+        Raises ValueError if the merged price range would be invalid.
+        """
+        fields = user_data.dict(exclude_unset=True)
+        if (fields.get('lat') is None) != (fields.get('lon') is None):
+            # Like update_user, a point needs both coordinates
+            fields.pop('lat', None)
+            fields.pop('lon', None)
+
+        pending = self.pending.get(principal.id)
+        merged = {**(pending.fields if pending else {}), **fields}
+        price_min = merged.get('price_min', principal.price_min)
+        price_max = merged.get('price_max', principal.price_max)
+        if price_min is not None and price_max is not None and price_max < price_min:
+            raise ValueError("price_max must be greater than or equal to price_min")
+
+        if pending is None:
+            pending = self.pending[principal.id] = PendingUpdate(principal.telegram_id)
+        pending.fields = merged
+        pending.last_at = time.monotonic()
+        pending.changed_at = datetime.now(timezone.utc)
+        if pending.task is None:
+            self._schedule(principal.id, pending)
+        self.submitted += 1
+        return self.overlay(principal)
+
+    def overlay(self, principal: UserPrincipal) -> UserPrincipal:
+        """The principal with the user's unwritten changes applied"""
+        changes = {}
+        for buffered in (self.writing.get(principal.id), self.pending.get(principal.id)):
+            if buffered is not None:
+                changes.update(buffered.fields, updated_at=buffered.changed_at)
+        return principal.model_copy(update=changes) if changes else principal
+
+    def _schedule(self, user_id: uuid.UUID, pending: PendingUpdate):
+        pending.task = asyncio.create_task(self._write_when_due(user_id, pending))
+        self._tasks.add(pending.task)
+        pending.task.add_done_callback(self._tasks.discard)
+
+    async def _write_when_due(self, user_id: uuid.UUID, pending: PendingUpdate):
+        while True:
+            delay = pending.deadline() - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        pending.task = None
+        try:
+            await self._write(user_id, pending)
+        except Exception:
+            pass  # Logged and queued for retry by _write
+
+    async def _write(self, user_id: uuid.UUID, pending: PendingUpdate):
+        """Write the buffered fields; on failure they are queued again and the error re-raised"""
+        # Keep one write per user in flight, in submission order
+        while user_id in self.writing:
+            await self.writing[user_id].written.wait()
+        if self.pending.get(user_id) is not pending:
+            return
+        # Changes arriving while this write runs start a new burst
+        del self.pending[user_id]
+        self.writing[user_id] = pending
+        fields = dict(pending.fields)
+        try:
+            async with async_session_maker() as session:
+                telegram_id = await UserService(session).update_search_area(user_id, fields)
+        except Exception:
+            self.failures += 1
+            self._retry(user_id, pending, fields)
+            raise
+        else:
+            self.writes += 1
+            self._committed(user_id)
+            principal_cache.invalidate(telegram_id or pending.telegram_id)
+            if 'lat' in fields or 'search_radius' in fields:
+                swipe_queues.invalidate(user_id)
+        finally:
+            del self.writing[user_id]
+            pending.written.set()
+
+    def _committed(self, user_id: uuid.UUID):
+        """Record the commit time of a user's write as their write marker"""
+        now = time.time()
+        self.committed_at.pop(user_id, None)
+        self.committed_at[user_id] = now
+        while self.committed_at and now - next(iter(self.committed_at.values())) > READ_YOUR_WRITES_SECONDS:
+            self.committed_at.popitem(last=False)
+
+    def write_marker(self, user_id: uuid.UUID) -> Optional[float]:
+        """Unix time of the user's last committed buffered write; now while one is still buffered"""
+        if user_id in self.pending or user_id in self.writing:
+            return time.time()
+        committed_at = self.committed_at.get(user_id)
+        if committed_at is None or time.time() - committed_at > READ_YOUR_WRITES_SECONDS:
+            return None
+        return committed_at
+
+    def _retry(self, user_id: uuid.UUID, failed: PendingUpdate, fields: Dict[str, object]):
+        """Buffer the fields of a failed write again, so they stay overlaid and get retried"""
+        attempts = failed.attempts + 1
+        level = logging.ERROR if attempts >= PROFILE_WRITE_RETRIES else logging.WARNING
+        logger.log(level, "Profile update of user %s failed %d times, retrying", user_id, attempts, exc_info=True)
+
+        pending = self.pending.get(user_id)
+        if pending is None:
+            pending = self.pending[user_id] = PendingUpdate(failed.telegram_id)
+            pending.changed_at = failed.changed_at
+            pending.fields = fields
+        else:
+            # Values submitted meanwhile win over the failed ones
+            pending.fields = {**fields, **pending.fields}
+        pending.attempts = attempts
+        pending.retry_at = time.monotonic() + min(PROFILE_WRITE_DELAY * 2 ** attempts, PROFILE_WRITE_RETRY_MAX_DELAY)
+        if pending.task is None:
+            self._schedule(user_id, pending)
+
+    async def flush(self, user_id: uuid.UUID):
+        """Write a user's buffered changes now, before a read or write that needs them in the database
+
+        Returns once nothing of the user is buffered or being written; raises
+        the database error if the write fails, the changes stay buffered.
+        """
+        while True:
+            in_flight = self.writing.get(user_id)
+            if in_flight is not None:
+                await in_flight.written.wait()
+                continue
+            pending = self.pending.get(user_id)
+            if pending is None:
+                return
+            if pending.task is not None:
+                pending.task.cancel()
+                pending.task = None
+            await self._write(user_id, pending)
+
+    async def flush_telegram_user(self, telegram_id: int):
+        """flush() for a caller known only by its Telegram id"""
+        buffered = {**self.writing, **self.pending}
+        for user_id, update in buffered.items():
+            if update.telegram_id == telegram_id:
+                await self.flush(user_id)
+
+    async def close(self):
+        """Write everything still buffered, on shutdown"""
+        while self.writing or self.pending:
+            user_id = next(iter({**self.writing, **self.pending}))
+            try:
+                await self.flush(user_id)
+            except Exception:
+                lost = self.pending.pop(user_id)
+                if lost.task is not None:
+                    lost.task.cancel()
+                logger.error("Profile update of user %s lost at shutdown: %s", user_id, lost.fields)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+profile_writes = ProfileWriteBuffer()
@@ -0,0 +1,157 @@
+from sqlalchemy import func
+from models import Listing, User
+from schemas import ListingResponse, UserProfileResponse, ScoredUserProfileResponse, MatchResponse
+from typing import NamedTuple, Optional, Tuple
+
+# Plain listing columns returned as-is by every listing endpoint
+LISTING_FIELDS = (
+    'id', 'title', 'description', 'price', 'address', 'rooms', 'area',
+    'floor', 'total_floors', 'metro_station', 'metro_distance', 'metro_station_id',
+    'photos', 'is_active', 'created_at'
+)
+# Key order of the serialized schemas, used by the plain dict mappers
+LISTING_RESPONSE_KEYS = tuple(ListingResponse.model_fields)
+USER_PROFILE_RESPONSE_KEYS = tuple(UserProfileResponse.model_fields)
+
+# Named field sets for the view= parameter; "full" is the whole schema
+LISTING_VIEWS = {
+    'summary': (
+        'id', 'title', 'price', 'address', 'rooms', 'area', 'metro_station',
+        'metro_distance', 'metro_station_id', 'photos', 'lat', 'lon', 'distance', 'rank', 'is_liked'
+    ),
+}
+USER_PROFILE_VIEWS = {
+    'summary': ('id', 'username', 'first_name', 'last_name', 'photo_url', 'age', 'distance'),
+}
+
+class FieldSelection(NamedTuple):
+    """Response keys picked with view=/fields=, always encoded as plain dicts"""
+    keys: Tuple[str, ...]
+    # Keep only the first photo, enough for a thumbnail
+    first_photo_only: bool = False
+
+def select_fields(known: Tuple[str, ...], views: dict, view: Optional[str] = None,
+                  fields: Optional[str] = None, required: Tuple[str, ...] = ()) -> Optional[FieldSelection]:
+    """Parse view=/fields= query values; None means the full schema"""
+    first_photo_only = False
+    if fields:
+        requested = tuple(field.strip() for field in fields.split(',') if field.strip())
+        unknown = [field for field in requested if field not in known]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    elif view is None or view == 'full':
+        return None
+    elif view in views:
+        requested = views[view]
+        first_photo_only = view == 'summary' and 'photos' in requested
+    else:
+        raise ValueError(f"Unknown view: {view}")
+
+    # id is always returned, plus whatever the endpoint pages by
+    selected = {'id', *required, *requested}
+    if selected >= set(known) and not first_photo_only:
+        return None
+    return FieldSelection(tuple(key for key in known if key in selected), first_photo_only)
+
+def listing_selection(view: Optional[str] = None, fields: Optional[str] = None,
+                      required: Tuple[str, ...] = ()) -> Optional[FieldSelection]:
+    return select_fields(LISTING_RESPONSE_KEYS, LISTING_VIEWS, view, fields, required)
+
+def user_profile_selection(view: Optional[str] = None, fields: Optional[str] = None) -> Optional[FieldSelection]:
+    return select_fields(USER_PROFILE_RESPONSE_KEYS, USER_PROFILE_VIEWS, view, fields)
+
+def listing_columns(selection: Optional[FieldSelection] = None) -> list:
+    """Columns of the shared listing projection, coordinates included"""
+    keys = LISTING_RESPONSE_KEYS if selection is None else selection.keys
+    columns = []
+    for field in LISTING_FIELDS:
+        if field not in keys:
+            continue
+        if field == 'photos' and selection is not None and selection.first_photo_only:
+            columns.append(Listing.photos[1:1].label('photos'))
+        else:
+            columns.append(getattr(Listing, field))
+    # Coordinates come straight from the main query as numeric columns,
+    # so building a page never needs a per-row ST_AsText lookup
+    if 'lat' in keys:
+        columns.append(func.ST_Y(func.geometry(Listing.location)).label('lat'))
+    if 'lon' in keys:
+        columns.append(func.ST_X(func.geometry(Listing.location)).label('lon'))
+    return columns
+
+def listing_from_row(row, is_liked: bool = False, as_dict: bool = False,
+                     selection: Optional[FieldSelection] = None):
+    """Build a ListingResponse (or its plain dict) from a row of the listing projection"""
+    data = row._mapping
+    return listing_from_mapping(data, data.get('distance_km'), is_liked, as_dict, selection)
+
+def listing_from_mapping(data, distance: Optional[float] = None, is_liked: bool = False, as_dict: bool = False,
+                         selection: Optional[FieldSelection] = None):
+    """Build a ListingResponse from projected listing fields
+
+    With as_dict the result is a plain dict shaped exactly like the
+    ListingResponse JSON, for list endpoints that encode it directly.
+    A selection always yields a dict holding only the selected keys.
+    """
+    if selection is not None:
+        computed = {'distance': distance, 'rank': data.get('rank'), 'is_liked': is_liked}
+        listing = {key: computed[key] if key in computed else data[key] for key in selection.keys}
+        if listing.get('area') is not None:
+            listing['area'] = float(listing['area'])
+        if selection.first_photo_only and listing.get('photos'):
+            listing['photos'] = listing['photos'][:1]
+        return listing
+
+    area = data['area']
+    listing = {
+        **{field: data[field] for field in LISTING_FIELDS},
+        'area': float(area) if area is not None else None,
+        'lat': data['lat'],
+        'lon': data['lon'],
+        'distance': distance,
+        'rank': data.get('rank'),
+        'is_liked': is_liked
+    }
+    if as_dict:
+        return {key: listing[key] for key in LISTING_RESPONSE_KEYS}
+    return ListingResponse(**listing)
+
+# Public profile columns shown to other users
+USER_PROFILE_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'photo_url', 'age', 'bio',
+    'price_min', 'price_max', 'metro_station', 'search_radius'
+)
+
+def user_profile_columns(selection: Optional[FieldSelection] = None) -> list:
+    """Columns of the public user profile projection"""
+    return [
+        getattr(User, field) for field in USER_PROFILE_FIELDS
+        if selection is None or field in selection.keys
+    ]
+
+def user_profile_from_mapping(data, distance: Optional[float] = None, as_dict: bool = False,
+                              selection: Optional[FieldSelection] = None):
+    """Build a UserProfileResponse (or its plain dict) from projected profile fields"""
+    if selection is not None:
+        return {key: distance if key == 'distance' else data[key] for key in selection.keys}
+    profile = {field: data[field] for field in USER_PROFILE_FIELDS}
+    profile['distance'] = distance
+    if as_dict:
+        return {key: profile[key] for key in USER_PROFILE_RESPONSE_KEYS}
+    return UserProfileResponse(**profile)
+
+def scored_profile_from_mapping(data, distance: float, score: float, components: dict, as_dict: bool = False):
+    """Build a ScoredUserProfileResponse (or its plain dict) from profile fields and match score"""
+    profile = user_profile_from_mapping(data, distance, as_dict=True)
+    profile['score'] = score
+    profile['components'] = components
+    if as_dict:
+        return profile
+    return ScoredUserProfileResponse(**profile)
+
+def match_from_mapping(data, as_dict: bool = False, selection: Optional[FieldSelection] = None):
+    """Build a MatchResponse from a match row joined with the other user's profile"""
+    user = user_profile_from_mapping(data, as_dict=as_dict, selection=selection)
+    if as_dict or selection is not None:
+        return {'id': data['match_id'], 'user': user, 'created_at': data['matched_at']}
+    return MatchResponse(id=data['match_id'], user=user, created_at=data['matched_at'])
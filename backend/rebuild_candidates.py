@@ -0,0 +1,12 @@
+import asyncio
+from database import async_session_maker
+from services import MatchingService
+
+async def rebuild_candidates():
+    """Backfill the user_candidates table for all existing users"""
+    async with async_session_maker() as session:
+        await MatchingService(session).rebuild_candidates()
+        print("Candidate table rebuilt")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_candidates())
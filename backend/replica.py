@@ -0,0 +1,179 @@
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import MutableHeaders
+
+from database import async_session_maker, read_engine, read_session_maker
+
+logger = logging.getLogger("social_rent.replica")
+
+# Reads go to the primary while the replica is further behind than this
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# Seconds between replica lag checks
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+# Write markers older than this are ignored; also the marker cookie's lifetime
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# Safety margin for WAL not yet received by the replica when its lag was measured
+READ_YOUR_WRITES_MARGIN = float(os.getenv("READ_YOUR_WRITES_MARGIN", "1"))
+
+# The client carries the time of its last write back on every request, so any
+# worker can tell whether the replica has replayed it: the response header is
+# echoed by the frontend, the cookie covers same-origin clients
+WRITE_MARKER_HEADER = "X-Last-Write"
+WRITE_MARKER_COOKIE = "last_write"
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+# Replay delay of a standby; zero once it has replayed all WAL it received,
+# so an idle primary does not look like a lagging replica
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def write_marker(request: Request) -> Optional[float]:
+    """Unix time of the client's last write, from its header or cookie; None if absent or expired"""
+    raw = request.headers.get(WRITE_MARKER_HEADER) or request.cookies.get(WRITE_MARKER_COOKIE)
+    try:
+        written_at = float(raw)
+    except (TypeError, ValueError):
+        return None
+    now = time.time()
+    if now - written_at > READ_YOUR_WRITES_SECONDS:
+        return None
+    # A marker from the future keeps the client on the primary for at most the window
+    return min(written_at, now + READ_YOUR_WRITES_SECONDS)
+
+
+class ReplicaRouter:
+    """Chooses between the replica and the primary for read-only requests
+
+    Reads use the replica unless it lags more than REPLICA_MAX_LAG_SECONDS,
+    its lag cannot be measured, or the client's last write (its write marker)
+    may not have been replayed yet. The replica has replayed everything
+    committed before the time of the last lag check minus the lag, less
+    READ_YOUR_WRITES_MARGIN for WAL still in transit.
+    """
+
+    def __init__(self):
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        # Unix time the replica had replayed through at the last lag check
+        self.replayed_through: Optional[float] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    async def replica_lag(self) -> Optional[float]:
+        """Replica lag in seconds, re-measured every REPLICA_LAG_CHECK_SECONDS; None if unreachable"""
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= REPLICA_LAG_CHECK_SECONDS:
+            self.checked_at = now
+            checked_wall = time.time()
+            try:
+                async with read_engine.connect() as conn:
+                    self.lag = float((await conn.execute(text(REPLICA_LAG_SQL))).scalar())
+                self.replayed_through = checked_wall - self.lag - READ_YOUR_WRITES_MARGIN
+            except Exception as e:
+                logger.warning("Replica lag check failed, reading from the primary: %s", e)
+                self.lag = None
+                self.replayed_through = None
+        return self.lag
+
+    async def use_replica(self, written_at: Optional[float]) -> bool:
+        if read_engine is None:
+            return False
+        lag = await self.replica_lag()
+        if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+            return False
+        return written_at is None or written_at < self.replayed_through
+
+    def stats(self) -> dict:
+        return {
+            "configured": read_engine is not None,
+            "lag_seconds": self.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "replayed_through": self.replayed_through,
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+def later_marker(*markers: Optional[float]) -> Optional[float]:
+    """The latest of some write markers, None if there is none"""
+    return max((marker for marker in markers if marker is not None), default=None)
+
+
+@asynccontextmanager
+async def read_session(written_at: Optional[float]) -> AsyncIterator[AsyncSession]:
+    """Session on the replica if it replayed a write made at written_at, else on the primary"""
+    if await replica_router.use_replica(written_at):
+        replica_router.replica_reads += 1
+        session_maker = read_session_maker
+    else:
+        replica_router.primary_reads += 1
+        session_maker = async_session_maker
+
+    async with session_maker() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+async def get_read_database(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Dependency to get a session for read-only endpoints, on the replica when fresh"""
+    async with read_session(write_marker(request)) as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware handing clients a write marker on every successful write request
+
+    The marker is the response time, or request.state.written_at when the
+    endpoint knows its changes land later (write-behind). Reads that set
+    request.state.written_at pass on a newer marker the server learned of,
+    e.g. a buffered write that committed after its request was answered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marker(message):
+            state = scope.get("state", {})
+            if (
+                message["type"] == "http.response.start" and message["status"] < 400
+                and (scope["method"] in WRITE_METHODS or "written_at" in state)
+            ):
+                written_at = state.get("written_at", time.time())
+                marker = f"{written_at:.3f}"
+                headers = MutableHeaders(scope=message)
+                headers.append(WRITE_MARKER_HEADER, marker)
+                headers.append(
+                    "Set-Cookie",
+                    f"{WRITE_MARKER_COOKIE}={marker}; Max-Age={int(READ_YOUR_WRITES_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_marker)
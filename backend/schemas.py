@@ -27,14 +27,17 @@ class UserCreate(UserBase):
     telegram_id: int
     lat: Optional[float] = None
     lon: Optional[float] = None
+    metro_station_id: Optional[int] = None  # search from this station when no lat/lon
 
 class UserUpdate(UserBase):
     lat: Optional[float] = None
     lon: Optional[float] = None
+    metro_station_id: Optional[int] = None
 
 class UserResponse(UserBase):
     id: UUID
     telegram_id: int
+    metro_station_id: Optional[int] = None
     is_active: bool
     created_at: datetime
     updated_at: datetime
@@ -42,6 +45,11 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class UserPrincipal(UserResponse):
+    """Authenticated user resolved from the auth token, cached between requests"""
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
 class UserProfileResponse(UserBase):
     id: UUID
     distance: Optional[float] = None  # Distance in km from current user
@@ -49,6 +57,17 @@ class UserProfileResponse(UserBase):
     class Config:
         from_attributes = True
 
+class MatchScoreComponents(BaseModel):
+    """Parts of a potential match's score, each in [0, 1]"""
+    overlap: float   # Shared part of the two search circles
+    price: float     # Shared part of the two price ranges
+    distance: float  # Closeness of the two search centers
+    age: float       # Closeness in age
+
+class ScoredUserProfileResponse(UserProfileResponse):
+    score: float  # Weighted sum of the components
+    components: MatchScoreComponents
+
 # Listing schemas
 class ListingBase(BaseModel):
     title: str
@@ -64,14 +83,16 @@ class ListingBase(BaseModel):
     photos: Optional[List[str]] = None
 
 class ListingCreate(ListingBase):
-    lat: float
-    lon: float
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
 
 class ListingResponse(ListingBase):
     id: UUID
     lat: float
     lon: float
+    metro_station_id: Optional[int] = None  # Nearest registered station
     distance: Optional[float] = None  # Distance in km from search point
+    rank: Optional[float] = None  # Text relevance when searching with q
     is_liked: Optional[bool] = False
     is_active: bool
     created_at: datetime
@@ -79,10 +100,60 @@ class ListingResponse(ListingBase):
     class Config:
         from_attributes = True
 
+class ListingCluster(BaseModel):
+    lat: float
+    lon: float
+    count: int
+    price_min: int
+    price_max: int
+
+class ViewportResponse(BaseModel):
+    zoom: int
+    clustered: bool
+    clusters: List[ListingCluster] = []
+    listings: List[ListingResponse] = []
+    truncated: bool = False  # More listings in the viewport than were returned
+
+class FacetCount(BaseModel):
+    value: int
+    count: int
+
+class FacetBucket(BaseModel):
+    min: float
+    max: float  # exclusive
+    count: int
+
+class ListingFacets(BaseModel):
+    rooms: List[FacetCount] = []
+    price: List[FacetBucket] = []
+    area: List[FacetBucket] = []
+
+class FacetedListingsResponse(BaseModel):
+    listings: List[ListingResponse] = []
+    facets: ListingFacets
+
+# Metro schemas
+class MetroStationResponse(BaseModel):
+    id: int
+    name: str
+    line: str
+    lat: float
+    lon: float
+
 # Like and Match schemas
 class LikeUserRequest(BaseModel):
     user_id: UUID
 
+class LikeBatchRequest(BaseModel):
+    user_ids: List[UUID] = Field(..., max_length=100)
+
+class LikeResult(BaseModel):
+    user_id: UUID
+    liked: bool
+    already_liked: bool
+    match: bool
+    match_id: Optional[UUID] = None
+
 class MatchResponse(BaseModel):
     id: UUID
     user: UserProfileResponse
@@ -0,0 +1,33 @@
+import os
+from typing import Any, List, Optional
+
+from projections import FieldSelection
+
+import orjson
+from fastapi import Response
+
+# Encode heavy list endpoints straight from rows with orjson instead of
+# building Pydantic models and validating them again through response_model
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() == "true"
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson, matching Pydantic's JSON for our schemas"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # OPT_UTC_Z renders UTC datetimes with a "Z" suffix like Pydantic does
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def list_response(items: List, response: Optional[Response] = None, selection: Optional[FieldSelection] = None):
+    """Return list content as-is, or pre-encoded when the fast path is on
+
+    Returning a Response directly bypasses the sub-response, so headers set
+    on it (e.g. the next-page cursor) are carried over explicitly. Partial
+    field selections are always pre-encoded, they would fail response_model.
+    """
+    if not FAST_SERIALIZATION and selection is None:
+        return items
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(items, headers=headers)
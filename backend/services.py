@@ -1,9 +1,19 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, text
-from sqlalchemy.orm import selectinload
-from geoalchemy2.functions import ST_DWithin, ST_Distance, ST_GeogFromText, ST_AsText
-from models import User, Listing, UserLike, UserMatch, ListingLike
-from schemas import UserCreate, UserUpdate, ListingResponse, UserProfileResponse, MatchResponse
+from sqlalchemy import JSON, select, update, and_, or_, func, text, tuple_, case, true
+from geoalchemy2.functions import ST_DWithin, ST_Distance
+from models import User, Listing, UserMatch, ListingLike, MetroStation
+from schemas import UserCreate, UserUpdate, UserPrincipal, ListingResponse, UserProfileResponse, ScoredUserProfileResponse, MatchResponse, MetroStationResponse
+from projections import FieldSelection, listing_columns, listing_from_row, user_profile_columns, user_profile_from_mapping, scored_profile_from_mapping, match_from_mapping
+from pagination import LISTING_CURSOR, decode_cursor
+from match_scoring import MATCH_POOL_SIZE, MATCH_WEIGHTS, CandidatePool, score_pool, top_k
+from facets import ListingFilters, facet_aggregate, facets_from_rows, filter_conditions
+from listing_index import LISTING_SEARCH_ENGINE, OPEN_TRANSACTIONS_HORIZON_SQL, listing_index
+from principal_cache import principal_cache
+from metro import metro_registry, nearest_station_sql
+from tiles import (
+    CLUSTER_CELL_BITS, CLUSTER_MAX_ZOOM, MAX_VIEWPORT_TILES, MVT_BUFFER, MVT_EXTENT, cluster_cache,
+    buffered_tile_bounds, geography_envelope, range_bounds, tile_range, tiles_in_range
+)
 from typing import List, Optional, Dict
 import uuid
 from datetime import datetime
@@ -18,6 +28,9 @@ class UserService:
         stmt = select(User).where(User.telegram_id == telegram_id)
         result = await self.db.execute(stmt)
         existing_user = result.scalar_one_or_none()
+        user_data = self._apply_metro_station(
+            user_data, has_location=existing_user is not None and existing_user.search_location is not None
+        )
 
         if existing_user:
             # Update existing user
@@ -32,7 +45,11 @@ class UserService:
                 existing_user.search_location = func.ST_GeogFromText(location_text)
             
             existing_user.updated_at = datetime.utcnow()
+            if self._search_area_changed(user_data):
+                await self.db.flush()
+                await MatchingService(self.db).refresh_candidates(existing_user.id)
             await self.db.commit()
+            principal_cache.invalidate(telegram_id)
             await self.db.refresh(existing_user)
             return existing_user
         else:
@@ -46,7 +63,11 @@ class UserService:
                 new_user.search_location = func.ST_GeogFromText(location_text)
             
             self.db.add(new_user)
+            if self._search_area_changed(user_data):
+                await self.db.flush()
+                await MatchingService(self.db).refresh_candidates(new_user.id)
             await self.db.commit()
+            principal_cache.invalidate(telegram_id)
             await self.db.refresh(new_user)
             return new_user
 
@@ -58,6 +79,7 @@ class UserService:
         
         if not user:
             raise ValueError("User not found")
+        user_data = self._apply_metro_station(user_data, has_location=user.search_location is not None)
         
         # Update fields
         for field, value in user_data.dict(exclude_unset=True, exclude={'lat', 'lon'}).items():
@@ -69,16 +91,94 @@ class UserService:
             user.search_location = func.ST_GeogFromText(location_text)
         
         user.updated_at = datetime.utcnow()
+        if self._search_area_changed(user_data):
+            await self.db.flush()
+            await MatchingService(self.db).refresh_candidates(user.id)
         await self.db.commit()
+        principal_cache.invalidate(user.telegram_id)
         await self.db.refresh(user)
         return user
 
+    async def update_search_area(self, user_id: uuid.UUID, fields: Dict[str, any]) -> Optional[int]:
+        """Apply coalesced location/radius/price changes in a single UPDATE
+
+        Returns the user's telegram_id, or None if the user no longer exists.
+        """
+        values = {key: fields[key] for key in ('search_radius', 'price_min', 'price_max') if key in fields}
+        if fields.get('lat') is not None and fields.get('lon') is not None:
+            values['search_location'] = func.ST_GeogFromText(f"POINT({fields['lon']} {fields['lat']})")
+        stmt = update(User).where(User.id == user_id).values(
+            **values, updated_at=func.now()
+        ).returning(User.telegram_id)
+        telegram_id = (await self.db.execute(stmt)).scalar()
+        
+        if telegram_id is not None and ('search_location' in values or 'search_radius' in values):
+            await MatchingService(self.db).refresh_candidates(user_id)
+        await self.db.commit()
+        return telegram_id
+
+    @staticmethod
+    def _apply_metro_station(user_data, has_location: bool):
+        """Link the profile to a registered station, searching around it when there is no point
+
+        An explicitly chosen station id moves the search point; a station typed
+        by name only places it when the profile has no location yet.
+        """
+        fields = user_data.dict(exclude_unset=True)
+        if fields.get('metro_station_id') is not None:
+            station = metro_registry.get(user_data.metro_station_id)
+            if station is None:
+                raise ValueError("Unknown metro station")
+            move_search_point = True
+        elif fields.get('metro_station'):
+            station = metro_registry.find(user_data.metro_station)
+            if station is None:
+                # Free text outside the registry is kept as typed
+                return user_data.model_copy(update={'metro_station_id': None})
+            move_search_point = not has_location
+        else:
+            return user_data
+        
+        changes = {'metro_station': station.name, 'metro_station_id': station.id}
+        if move_search_point and (user_data.lat is None or user_data.lon is None):
+            changes.update(lat=station.lat, lon=station.lon)
+        return user_data.model_copy(update=changes)
+
+    @staticmethod
+    def _search_area_changed(user_data) -> bool:
+        """Whether an update touches the location or radius of the search area"""
+        if user_data.lat is not None and user_data.lon is not None:
+            return True
+        return 'search_radius' in user_data.dict(exclude_unset=True)
+
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Get user by telegram ID"""
         stmt = select(User).where(User.telegram_id == telegram_id)
         result = await self.db.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_principal_by_telegram_id(self, telegram_id: int) -> Optional[UserPrincipal]:
+        """Get the cacheable principal of a user, search point included"""
+        stmt = select(
+            User,
+            func.ST_Y(func.geometry(User.search_location)).label('lat'),
+            func.ST_X(func.geometry(User.search_location)).label('lon')
+        ).where(User.telegram_id == telegram_id)
+        result = await self.db.execute(stmt)
+        row = result.one_or_none()
+        if row is None:
+            return None
+        
+        user, lat, lon = row
+        principal = UserPrincipal.model_validate(user)
+        principal.lat, principal.lon = lat, lon
+        return principal
+
+    async def get_updated_at(self, user_id: uuid.UUID) -> Optional[datetime]:
+        """Stored profile version of a user, bumped by every profile write"""
+        result = await self.db.execute(select(User.updated_at).where(User.id == user_id))
+        return result.scalar_one_or_none()
+
     async def get_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
         """Get user by ID"""
         stmt = select(User).where(User.id == user_id)
@@ -87,148 +187,327 @@ class UserService:
 
 
 class MatchingService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, as_dict: bool = False, selection: Optional[FieldSelection] = None):
         self.db = db
+        # Return list results as plain dicts ready for FastJSONResponse
+        self.as_dict = as_dict
+        # Fields picked with view=/fields=, narrowing both the SELECT and the payload
+        self.selection = selection
 
-    async def get_potential_matches(self, user_id: uuid.UUID, limit: int = 10) -> List[UserProfileResponse]:
+    async def get_potential_matches(
+        self,
+        user_id: uuid.UUID,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> List[UserProfileResponse]:
         """Get potential matches based on overlapping search areas"""
-        # Get current user
-        current_user_stmt = select(User).where(User.id == user_id)
-        result = await self.db.execute(current_user_stmt)
-        current_user = result.scalar_one_or_none()
-        
-        if not current_user or not current_user.search_location:
-            return []
+        after = decode_cursor(cursor, (float, uuid.UUID)) if cursor else None
 
-        # Find users with overlapping search areas
-        # Users are potential matches if:
-        # 1. Their search area overlaps with current user's search area
-        # 2. Current user's search area overlaps with their search area
-        # 3. They haven't been liked by current user yet
-        # 4. They are active
+        # Overlapping search areas are precomputed in user_candidates (see
+        # refresh_candidates), so this is an index range scan on
+        # (user_id, distance_km, candidate_id) minus users already liked.
+        # Pages are keyed on (distance_km, id) so deep scrolling never scans
+        # past rows that were already returned
         
-        stmt = text("""
-            SELECT u.*, 
-                   ST_Distance(u.search_location, :current_location) / 1000 as distance_km
-            FROM users u
-            WHERE u.id != :user_id 
+        keyset = ""
+        if after:
+            keyset = "AND (c.distance_km, c.candidate_id) > (:after_distance, :after_id)"
+        
+        stmt = text(f"""
+            SELECT u.id, u.username, u.first_name, u.last_name, u.photo_url, u.age,
+                   u.bio, u.price_min, u.price_max, u.metro_station, u.search_radius,
+                   c.distance_km
+            FROM user_candidates c
+            JOIN users u ON u.id = c.candidate_id
+            WHERE c.user_id = :user_id
               AND u.is_active = true
-              AND u.search_location IS NOT NULL
-              AND u.search_radius IS NOT NULL
-              AND (
-                  ST_DWithin(u.search_location, :current_location, u.search_radius)
-                  OR ST_DWithin(:current_location, u.search_location, :current_radius)
+              AND NOT EXISTS (
+                  SELECT 1 FROM user_likes l
+                  WHERE l.liker_id = :user_id AND l.liked_id = c.candidate_id
               )
-              AND u.id NOT IN (
-                  SELECT liked_id FROM user_likes WHERE liker_id = :user_id
-              )
-            ORDER BY distance_km
+              {keyset}
+            ORDER BY c.distance_km, c.candidate_id
             LIMIT :limit
         """)
         
-        result = await self.db.execute(stmt, {
+        params = {
             'user_id': user_id,
-            'current_location': current_user.search_location,
-            'current_radius': current_user.search_radius or 1000,
             'limit': limit
-        })
+        }
+        if after:
+            params['after_distance'], params['after_id'] = after
         
-        users_data = result.fetchall()
+        result = await self.db.execute(stmt, params)
         
-        # Convert to UserProfileResponse
-        matches = []
-        for row in users_data:
-            user_dict = dict(row._mapping)
-            distance = user_dict.pop('distance_km', None)
-            
-            match = UserProfileResponse(
-                id=user_dict['id'],
-                username=user_dict['username'],
-                first_name=user_dict['first_name'],
-                last_name=user_dict['last_name'],
-                photo_url=user_dict['photo_url'],
-                age=user_dict['age'],
-                bio=user_dict['bio'],
-                price_min=user_dict['price_min'],
-                price_max=user_dict['price_max'],
-                metro_station=user_dict['metro_station'],
-                search_radius=user_dict['search_radius'],
-                distance=distance
+        return [
+            user_profile_from_mapping(row._mapping, row._mapping['distance_km'], self.as_dict)
+            for row in result
+        ]
+
+    async def get_ranked_matches(
+        self,
+        user: UserPrincipal,
+        limit: int = 10,
+        cursor: Optional[str] = None
+    ) -> List[ScoredUserProfileResponse]:
+        """Get potential matches ordered by match score instead of distance alone"""
+        after = decode_cursor(cursor, (float, str)) if cursor else None
+
+        # One index range scan fetches the MATCH_POOL_SIZE nearest candidates;
+        # NumPy scores the whole pool and pages through it by (score desc, id)
+        result = await self.db.execute(text("""
+            SELECT u.id, u.username, u.first_name, u.last_name, u.photo_url, u.age,
+                   u.bio, u.price_min, u.price_max, u.metro_station, u.search_radius,
+                   c.distance_km
+            FROM user_candidates c
+            JOIN users u ON u.id = c.candidate_id
+            WHERE c.user_id = :user_id
+              AND u.is_active = true
+              AND NOT EXISTS (
+                  SELECT 1 FROM user_likes l
+                  WHERE l.liker_id = :user_id AND l.liked_id = c.candidate_id
+              )
+            ORDER BY c.distance_km, c.candidate_id
+            LIMIT :pool_size
+        """), {'user_id': user.id, 'pool_size': MATCH_POOL_SIZE})
+        rows = [row._mapping for row in result]
+        if not rows:
+            return []
+
+        pool = CandidatePool.from_rows(rows)
+        scores = score_pool(user.search_radius, user.price_min, user.price_max, user.age, pool)
+        picked = top_k(scores, pool.ids, limit, after).tolist()
+
+        components = {name: getattr(scores, name)[picked].tolist() for name in MATCH_WEIGHTS}
+        return [
+            scored_profile_from_mapping(
+                rows[index], rows[index]['distance_km'], float(scores.score[index]),
+                {name: values[position] for name, values in components.items()},
+                self.as_dict
             )
-            matches.append(match)
-        
-        return matches
+            for position, index in enumerate(picked)
+        ]
 
-    async def like_user(self, liker_id: uuid.UUID, liked_id: uuid.UUID) -> Dict[str, any]:
-        """Like another user, creates match if mutual"""
-        # Check if like already exists
-        existing_like_stmt = select(UserLike).where(
-            and_(UserLike.liker_id == liker_id, UserLike.liked_id == liked_id)
+    async def refresh_candidates(self, user_id: uuid.UUID):
+        """Recompute the candidate pairs of one user after a location or radius change"""
+        # Users are candidates of each other if either one's search center lies
+        # within the other's search radius. Only pairs involving this user are
+        # touched; both directions are stored so lookups stay on user_id.
+        # Inactive users keep their pairs and are filtered out on read, so
+        # reactivating one needs no refresh of everyone around them
+        await self.db.execute(
+            text("DELETE FROM user_candidates WHERE user_id = :user_id OR candidate_id = :user_id"),
+            {'user_id': user_id}
         )
-        result = await self.db.execute(existing_like_stmt)
-        existing_like = result.scalar_one_or_none()
+        await self.db.execute(text("""
+            WITH pairs AS (
+                SELECT me.id AS user_id,
+                       u.id AS candidate_id,
+                       ST_Distance(u.search_location, me.search_location) / 1000 AS distance_km,
+                       -- u is listed to me; users without a radius are never listed
+                       u.search_radius IS NOT NULL AND (
+                           ST_DWithin(u.search_location, me.search_location, u.search_radius)
+                           OR ST_DWithin(me.search_location, u.search_location, COALESCE(me.search_radius, 1000))
+                       ) AS forward,
+                       -- me is listed to u, who searches 1000 m without a radius
+                       me.search_radius IS NOT NULL AND (
+                           ST_DWithin(me.search_location, u.search_location, me.search_radius)
+                           OR ST_DWithin(u.search_location, me.search_location, COALESCE(u.search_radius, 1000))
+                       ) AS reverse
+                FROM users me
+                JOIN users u
+                  ON u.id != me.id
+                 AND u.search_location IS NOT NULL
+                 AND ST_DWithin(
+                     u.search_location, me.search_location,
+                     GREATEST(COALESCE(u.search_radius, 1000), COALESCE(me.search_radius, 1000))
+                 )
+                WHERE me.id = :user_id
+                  AND me.search_location IS NOT NULL
+            )
+            INSERT INTO user_candidates (user_id, candidate_id, distance_km)
+            SELECT user_id, candidate_id, distance_km FROM pairs WHERE forward
+            UNION ALL
+            SELECT candidate_id, user_id, distance_km FROM pairs WHERE reverse
+        """), {'user_id': user_id})
+
+    async def rebuild_candidates(self):
+        """Recompute the whole candidate table, used to backfill existing users"""
+        await self.db.execute(text("TRUNCATE user_candidates"))
+        await self.db.execute(text("""
+            INSERT INTO user_candidates (user_id, candidate_id, distance_km)
+            SELECT me.id, u.id, ST_Distance(u.search_location, me.search_location) / 1000
+            FROM users me
+            JOIN users u
+              ON u.id != me.id
+             AND u.search_location IS NOT NULL
+             AND u.search_radius IS NOT NULL
+             AND (
+                 ST_DWithin(u.search_location, me.search_location, u.search_radius)
+                 OR ST_DWithin(me.search_location, u.search_location, COALESCE(me.search_radius, 1000))
+             )
+            WHERE me.search_location IS NOT NULL
+        """))
+        await self.db.commit()
+
+    async def like_user(self, liker_id: uuid.UUID, liked_id: uuid.UUID) -> Optional[Dict[str, any]]:
+        """Like another user, creates match if mutual; None if the user does not exist"""
+        results = await self.like_users(liker_id, [liked_id])
+        if not results:
+            return None
         
-        if existing_like:
+        result = results[0]
+        if not result["liked"]:
             return {"already_liked": True, "match": False}
         
-        # Create like
-        new_like = UserLike(liker_id=liker_id, liked_id=liked_id)
-        self.db.add(new_like)
+        return {
+            "liked": True,
+            "match": result["match"],
+            "match_id": result["match_id"],
+            "message": "It's a match! 🎉" if result["match"] else "Like sent!"
+        }
+
+    async def like_users(self, liker_id: uuid.UUID, liked_ids: List[uuid.UUID]) -> List[Dict[str, any]]:
+        """Apply a batch of likes in one statement and one transaction"""
+        if any(str(liked_id) == str(liker_id) for liked_id in liked_ids):
+            raise ValueError("Cannot like yourself")
+        if not liked_ids:
+            return []
         
-        # Check for mutual like (match will be created by database trigger)
-        mutual_like_stmt = select(UserLike).where(
-            and_(UserLike.liker_id == liked_id, UserLike.liked_id == liker_id)
-        )
-        result = await self.db.execute(mutual_like_stmt)
-        mutual_like = result.scalar_one_or_none()
+        # The insert, the mutual-like lookup and the match insert all run in
+        # a single statement; unknown users are skipped by the join on users
+        stmt = text("""
+            WITH targets AS (
+                SELECT DISTINCT u.id AS liked_id
+                FROM unnest(CAST(:liked_ids AS uuid[])) AS t(liked_id)
+                JOIN users u ON u.id = t.liked_id
+            ),
+            inserted AS (
+                INSERT INTO user_likes (liker_id, liked_id)
+                SELECT CAST(:liker_id AS uuid), liked_id FROM targets
+                ON CONFLICT (liker_id, liked_id) DO NOTHING
+                RETURNING liked_id
+            ),
+            mutual AS (
+                SELECT i.liked_id
+                FROM inserted i
+                JOIN user_likes l
+                  ON l.liker_id = i.liked_id AND l.liked_id = CAST(:liker_id AS uuid)
+            ),
+            matched AS (
+                INSERT INTO user_matches (user1_id, user2_id)
+                SELECT LEAST(CAST(:liker_id AS uuid), liked_id),
+                       GREATEST(CAST(:liker_id AS uuid), liked_id)
+                FROM mutual
+                ON CONFLICT (user1_id, user2_id) DO NOTHING
+                RETURNING id, user1_id, user2_id
+            ),
+            counted AS (
+                UPDATE users
+                SET match_count = users.match_count + c.matches
+                FROM (
+                    SELECT user_id, count(*) AS matches
+                    FROM (
+                        SELECT user1_id AS user_id FROM matched
+                        UNION ALL
+                        SELECT user2_id FROM matched
+                    ) sides
+                    GROUP BY user_id
+                ) c
+                WHERE users.id = c.user_id
+            )
+            SELECT t.liked_id,
+                   i.liked_id IS NOT NULL AS liked,
+                   mu.liked_id IS NOT NULL AS is_match,
+                   COALESCE(ma.id, um.id) AS match_id
+            FROM targets t
+            LEFT JOIN inserted i ON i.liked_id = t.liked_id
+            LEFT JOIN mutual mu ON mu.liked_id = t.liked_id
+            LEFT JOIN matched ma
+              ON ma.user1_id = LEAST(CAST(:liker_id AS uuid), t.liked_id)
+             AND ma.user2_id = GREATEST(CAST(:liker_id AS uuid), t.liked_id)
+            LEFT JOIN user_matches um
+              ON mu.liked_id IS NOT NULL
+             AND um.user1_id = LEAST(CAST(:liker_id AS uuid), t.liked_id)
+             AND um.user2_id = GREATEST(CAST(:liker_id AS uuid), t.liked_id)
+        """)
         
+        result = await self.db.execute(stmt, {
+            'liker_id': liker_id,
+            'liked_ids': [uuid.UUID(str(liked_id)) for liked_id in liked_ids]
+        })
+        rows = {row.liked_id: row for row in result}
         await self.db.commit()
         
-        return {
-            "liked": True,
-            "match": bool(mutual_like),
-            "message": "It's a match! 🎉" if mutual_like else "Like sent!"
-        }
+        # Keep the caller's order; ids that matched no user are dropped
+        results = []
+        for liked_id in dict.fromkeys(uuid.UUID(str(liked_id)) for liked_id in liked_ids):
+            row = rows.get(liked_id)
+            if row is None:
+                continue
+            results.append({
+                "user_id": liked_id,
+                "liked": row.liked,
+                "already_liked": not row.liked,
+                "match": row.is_match,
+                "match_id": row.match_id
+            })
+        return results
 
-    async def get_user_matches(self, user_id: uuid.UUID) -> List[MatchResponse]:
-        """Get user's matches (mutual likes)"""
-        stmt = select(UserMatch).options(
-            selectinload(UserMatch.user1),
-            selectinload(UserMatch.user2)
-        ).where(
+    async def get_user_matches(
+        self,
+        user_id: uuid.UUID,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        since: Optional[datetime] = None
+    ) -> List[MatchResponse]:
+        """Get user's matches (mutual likes), newest first"""
+        # Join only the other user's public columns instead of hydrating
+        # both sides of every match
+        other_id = case(
+            (UserMatch.user1_id == user_id, UserMatch.user2_id),
+            else_=UserMatch.user1_id
+        )
+        stmt = select(
+            UserMatch.id.label('match_id'),
+            UserMatch.created_at.label('matched_at'),
+            *user_profile_columns(self.selection)
+        ).join(User, User.id == other_id).where(
             or_(UserMatch.user1_id == user_id, UserMatch.user2_id == user_id)
-        ).order_by(UserMatch.created_at.desc())
+        )
         
-        result = await self.db.execute(stmt)
-        matches = result.scalars().all()
+        # Polling clients only fetch matches newer than the last one they saw
+        if since is not None:
+            stmt = stmt.where(UserMatch.created_at > since)
         
-        match_responses = []
-        for match in matches:
-            # Get the other user
-            other_user = match.user2 if match.user1_id == user_id else match.user1
-            
-            user_profile = UserProfileResponse(
-                id=other_user.id,
-                username=other_user.username,
-                first_name=other_user.first_name,
-                last_name=other_user.last_name,
-                photo_url=other_user.photo_url,
-                age=other_user.age,
-                bio=other_user.bio,
-                price_min=other_user.price_min,
-                price_max=other_user.price_max,
-                metro_station=other_user.metro_station,
-                search_radius=other_user.search_radius
+        # Keyset on (created_at, id) keeps pages stable while new matches arrive
+        if cursor:
+            after_created_at, after_id = decode_cursor(cursor, (datetime, uuid.UUID))
+            stmt = stmt.where(
+                tuple_(UserMatch.created_at, UserMatch.id) < tuple_(after_created_at, after_id)
             )
-            
-            match_response = MatchResponse(
-                id=match.id,
-                user=user_profile,
-                created_at=match.created_at
-            )
-            match_responses.append(match_response)
         
-        return match_responses
+        stmt = stmt.order_by(UserMatch.created_at.desc(), UserMatch.id.desc()).limit(limit)
+        
+        result = await self.db.execute(stmt)
+        return [match_from_mapping(row._mapping, self.as_dict, self.selection) for row in result]
+
+    async def get_matches_watermark(self, user_id: uuid.UUID) -> tuple:
+        """Count and latest change of a user's matches and matched profiles, for ETags"""
+        result = await self.db.execute(text("""
+            SELECT count(*) AS count, max(m.created_at) AS matched_at, max(u.updated_at) AS updated_at
+            FROM user_matches m
+            JOIN users u
+              ON u.id = CASE WHEN m.user1_id = :user_id THEN m.user2_id ELSE m.user1_id END
+            WHERE m.user1_id = :user_id OR m.user2_id = :user_id
+        """), {'user_id': user_id})
+        return tuple(result.one())
+
+    async def get_match_count(self, user_id: uuid.UUID) -> int:
+        """Get user's match count, maintained by the like statement"""
+        stmt = select(User.match_count).where(User.id == user_id)
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none() or 0
 
     async def are_users_matched(self, user1_id: uuid.UUID, user2_id: uuid.UUID) -> bool:
         """Check if two users are matched"""
@@ -243,10 +522,62 @@ class MatchingService:
         return bool(match)
 
 
-class ListingService:
+class MetroService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    async def sync_stations(self, stations: List[Dict]) -> int:
+        """Upsert the bundled station dataset, load the registry and assign listings
+
+        Returns the number of listings given a nearest station.
+        """
+        if stations:
+            await self.db.execute(text("""
+                INSERT INTO metro_stations (name, line, location)
+                VALUES (:name, :line, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography)
+                ON CONFLICT (name, line) DO UPDATE SET location = EXCLUDED.location
+            """), stations)
+            await self.db.commit()
+        
+        await self.load_registry()
+        return await self.assign_nearest_stations()
+
+    async def load_registry(self) -> int:
+        """Load the stations into the in-memory registry, returns how many"""
+        stations = await self.get_stations()
+        metro_registry.load(stations)
+        return len(stations)
+
+    async def get_stations(self) -> List[MetroStationResponse]:
+        stmt = select(
+            MetroStation.id, MetroStation.name, MetroStation.line,
+            func.ST_Y(func.geometry(MetroStation.location)).label('lat'),
+            func.ST_X(func.geometry(MetroStation.location)).label('lon')
+        ).order_by(MetroStation.id)
+        result = await self.db.execute(stmt)
+        return [MetroStationResponse(**row._mapping) for row in result]
+
+    async def assign_nearest_stations(self) -> int:
+        """Give every listing without one its nearest station, in batches"""
+        if not metro_registry.by_id:
+            return 0
+        assigned = 0
+        while True:
+            result = await self.db.execute(text(nearest_station_sql()))
+            await self.db.commit()
+            if not result.rowcount:
+                return assigned
+            assigned += result.rowcount
+
+
+class ListingService:
+    def __init__(self, db: AsyncSession, as_dict: bool = False, selection: Optional[FieldSelection] = None):
+        self.db = db
+        # Return list results as plain dicts ready for FastJSONResponse
+        self.as_dict = as_dict
+        # Fields picked with view=/fields=, narrowing both the SELECT and the payload
+        self.selection = selection
+
     async def search_listings(
         self, 
         lat: float = None, 
@@ -254,128 +585,457 @@ class ListingService:
         radius: int = 1000,
         price_min: int = None,
         price_max: int = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        q: Optional[str] = None,
+        filters: Optional[ListingFilters] = None
     ) -> List[ListingResponse]:
-        """Search listings based on location and filters"""
+        """Search listings based on location, price, attribute and text filters"""
+        after = self.listing_after(cursor, lat, lon, q)
         
-        query = select(Listing).where(Listing.is_active == True)
+        if LISTING_SEARCH_ENGINE == "memory" and not q and filters is None:
+            # Answer from the in-process index, kept fresh from listings.updated_at
+            await listing_index.refresh_if_stale()
+            return listing_index.search(
+                lat=lat, lon=lon, radius=radius,
+                price_min=price_min, price_max=price_max,
+                limit=limit, after=after, as_dict=self.as_dict,
+                selection=self.selection
+            )
         
-        # Location filter
+        query = self.search_statement(lat, lon, radius, price_min, price_max, limit, after, q, filters)
+        result = await self.db.execute(query)
+        return [listing_from_row(row, as_dict=self.as_dict, selection=self.selection) for row in result]
+
+    @staticmethod
+    def listing_after(cursor: Optional[str], lat: Optional[float], lon: Optional[float], q: Optional[str]):
+        """Keyset position of a listing cursor, its sort key required when paging by distance or rank"""
+        if not cursor:
+            return None
+        after = decode_cursor(cursor, LISTING_CURSOR)
+        if after[0] is None and (q or (lat is not None and lon is not None)):
+            raise ValueError("Invalid cursor")
+        return after
+
+    async def search_listings_with_facets(
+        self,
+        lat: float = None,
+        lon: float = None,
+        radius: int = 1000,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        q: Optional[str] = None,
+        filters: Optional[ListingFilters] = None
+    ) -> Dict:
+        """A page of search_listings plus facet counts, in one round trip
+
+        Facets count every matching listing regardless of the cursor.
+        """
+        after = self.listing_after(cursor, lat, lon, q)
+        query = self.faceted_statement(lat, lon, radius, price_min, price_max, limit, after, q, filters)
+        rows = (await self.db.execute(query)).all()
+        
+        return {
+            'listings': [
+                listing_from_row(row, as_dict=self.as_dict, selection=self.selection)
+                for row in rows if row.id is not None
+            ],
+            'facets': facets_from_rows(rows[0].facets if rows else None),
+        }
+
+    def faceted_statement(
+        self,
+        lat: float = None,
+        lon: float = None,
+        radius: int = 1000,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 50,
+        after: Optional[tuple] = None,
+        q: Optional[str] = None,
+        filters: Optional[ListingFilters] = None
+    ):
+        """The search_statement page left-joined to a one-row facet aggregate"""
+        page = self.search_statement(
+            lat, lon, radius, price_min, price_max, limit, after, q, filters
+        ).subquery('page')
+        
+        shared, by_facet = filter_conditions(price_min, price_max, filters)
+        columns, grouping_sets = facet_aggregate(by_facet)
+        facet_rows = select(*columns).where(
+            *self._match_conditions(lat, lon, radius, q), *shared
+        ).group_by(grouping_sets).subquery('facet_rows')
+        facets = select(
+            func.json_agg(func.json_build_array(*facet_rows.c), type_=JSON).label('facets')
+        ).subquery('facets')
+        
+        if q:
+            order = (page.c.rank.desc(), page.c.id)
+        elif lat is not None and lon is not None:
+            order = (page.c.distance_km, page.c.id)
+        else:
+            order = (page.c.id,)
+        # The one-row facets side keeps the facets when the page is empty
+        return select(facets.c.facets, page).select_from(
+            facets.outerjoin(page, true())
+        ).order_by(*order)
+
+    @staticmethod
+    def _match_conditions(lat: float = None, lon: float = None, radius: int = 1000, q: Optional[str] = None) -> list:
+        """Activity, location and text conditions shared by results and facets"""
+        conditions = [Listing.is_active == True]
         if lat is not None and lon is not None:
             search_point = func.ST_GeogFromText(f'POINT({lon} {lat})')
+            conditions.append(ST_DWithin(Listing.location, search_point, radius))
+        if q:
+            conditions.append(Listing.search_vector.op('@@')(func.websearch_to_tsquery('russian', q)))
+        return conditions
+
+    def search_statement(
+        self,
+        lat: float = None,
+        lon: float = None,
+        radius: int = 1000,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 50,
+        after: Optional[tuple] = None,
+        q: Optional[str] = None,
+        filters: Optional[ListingFilters] = None
+    ):
+        """SELECT behind search_listings, all filters in one statement"""
+        query = select(*listing_columns(self.selection)).where(Listing.is_active == True)
+        
+        # Location filter, paged by (distance_km, id) unless ranked by text
+        if lat is not None and lon is not None:
+            search_point = func.ST_GeogFromText(f'POINT({lon} {lat})')
+            distance_km = ST_Distance(Listing.location, search_point) / 1000
             query = query.where(
                 ST_DWithin(Listing.location, search_point, radius)
             ).add_columns(
-                (ST_Distance(Listing.location, search_point) / 1000).label('distance_km')
-            ).order_by(
-                ST_Distance(Listing.location, search_point)
+                distance_km.label('distance_km')
             )
+            if not q:
+                query = query.order_by(distance_km, Listing.id)
+                if after:
+                    query = query.where(tuple_(distance_km, Listing.id) > tuple_(*after))
+        elif not q:
+            query = query.order_by(Listing.id)
+            if after:
+                query = query.where(Listing.id > after[1])
         
-        # Price filters
-        if price_min is not None:
-            query = query.where(Listing.price >= price_min)
-        if price_max is not None:
-            query = query.where(Listing.price <= price_max)
-        
-        query = query.limit(limit)
-        
-        result = await self.db.execute(query)
+        # Text filter on the GIN-indexed tsvector, paged by (rank desc, id)
+        if q:
+            tsquery = func.websearch_to_tsquery('russian', q)
+            rank = func.ts_rank_cd(Listing.search_vector, tsquery)
+            query = query.where(
+                Listing.search_vector.op('@@')(tsquery)
+            ).add_columns(
+                rank.label('rank')
+            ).order_by(
+                rank.desc(), Listing.id
+            )
+            if after:
+                after_rank, after_id = after
+                query = query.where(or_(
+                    rank < after_rank,
+                    and_(rank == after_rank, Listing.id > after_id)
+                ))
         
-        listings = []
-        if lat is not None and lon is not None:
-            # When location filter is applied, we get tuples with distance
-            rows = result.fetchall()
-            for row in rows:
-                if isinstance(row, tuple) and len(row) > 1:
-                    listing, distance = row[0], row[1]
-                else:
-                    listing = row[0]
-                    distance = None
-                
-                # Extract coordinates  
-                location_stmt = select(func.ST_AsText(listing.location))
-                loc_result = await self.db.execute(location_stmt)
-                location_text = loc_result.scalar()
-                
-                # Parse POINT(lon lat) format
-                coords = location_text.replace('POINT(', '').replace(')', '').split()
-                listing_lon, listing_lat = float(coords[0]), float(coords[1])
-                
-                listing_response = ListingResponse(
-                    id=listing.id,
-                    title=listing.title,
-                    description=listing.description,
-                    price=listing.price,
-                    address=listing.address,
-                    lat=listing_lat,
-                    lon=listing_lon,
-                    rooms=listing.rooms,
-                    area=listing.area,
-                    floor=listing.floor,
-                    total_floors=listing.total_floors,
-                    metro_station=listing.metro_station,
-                    metro_distance=listing.metro_distance,
-                    photos=listing.photos,
-                    distance=distance,
-                    is_active=listing.is_active,
-                    created_at=listing.created_at
-                )
-                listings.append(listing_response)
-        else:
-            # Without location filter, we get just the listing objects
-            result_listings = result.scalars().all()
-            for listing in result_listings:
-                # Extract coordinates
-                location_stmt = select(func.ST_AsText(listing.location))
-                loc_result = await self.db.execute(location_stmt)
-                location_text = loc_result.scalar()
-                
-                # Parse POINT(lon lat) format
-                coords = location_text.replace('POINT(', '').replace(')', '').split()
-                listing_lon, listing_lat = float(coords[0]), float(coords[1])
-                
-                listing_response = ListingResponse(
-                    id=listing.id,
-                    title=listing.title,
-                    description=listing.description,
-                    price=listing.price,
-                    address=listing.address,
-                    lat=listing_lat,
-                    lon=listing_lon,
-                    rooms=listing.rooms,
-                    area=listing.area,
-                    floor=listing.floor,
-                    total_floors=listing.total_floors,
-                    metro_station=listing.metro_station,
-                    metro_distance=listing.metro_distance,
-                    photos=listing.photos,
-                    is_active=listing.is_active,
-                    created_at=listing.created_at
-                )
-                listings.append(listing_response)
+        # Price and attribute filters
+        shared, by_facet = filter_conditions(price_min, price_max, filters)
+        query = query.where(*shared, *[c for conditions in by_facet.values() for c in conditions])
         
-        return listings
+        return query.limit(limit)
 
-    async def get_listings_for_user(self, user: User) -> List[ListingResponse]:
+    async def get_listings_for_user(self, user: UserPrincipal) -> List[ListingResponse]:
         """Get listings based on user's search criteria"""
-        if not user.search_location:
+        if user.lat is None or user.lon is None:
             return []
         
-        # Extract coordinates from user location
-        location_stmt = select(func.ST_AsText(user.search_location))
-        result = await self.db.execute(location_stmt)
-        location_text = result.scalar()
-        coords = location_text.replace('POINT(', '').replace(')', '').split()
-        user_lon, user_lat = float(coords[0]), float(coords[1])
-        
         return await self.search_listings(
-            lat=user_lat,
-            lon=user_lon,
+            lat=user.lat,
+            lon=user.lon,
             radius=user.search_radius or 1000,
             price_min=user.price_min,
             price_max=user.price_max
         )
 
+    async def get_viewport(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        zoom: int,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 500
+    ) -> Dict[str, any]:
+        """Listings inside a map viewport, grid-clustered below CLUSTER_MAX_ZOOM"""
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise ValueError("Invalid viewport bounds")
+        if not 0 <= zoom <= 22:
+            raise ValueError("Zoom must be between 0 and 22")
+        limit = max(1, min(limit, 2000))
+        
+        if zoom >= CLUSTER_MAX_ZOOM:
+            listings = await self._viewport_listings(
+                min_lat, min_lon, max_lat, max_lon, price_min, price_max, limit + 1
+            )
+            return {
+                'zoom': zoom, 'clustered': False, 'clusters': [],
+                'listings': listings[:limit], 'truncated': len(listings) > limit
+            }
+        
+        x_min, y_min, x_max, y_max = tile_range(min_lat, min_lon, max_lat, max_lon, zoom)
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > MAX_VIEWPORT_TILES:
+            raise ValueError("Viewport spans too many tiles for this zoom")
+        
+        # Clusters are cached per tile, so panning only computes newly exposed tiles
+        tiles = {}
+        missing = []
+        for x, y in tiles_in_range(x_min, y_min, x_max, y_max):
+            cached = cluster_cache.get((zoom, x, y, price_min, price_max))
+            if cached is None:
+                missing.append((x, y))
+            else:
+                tiles[(x, y)] = cached
+        
+        if missing:
+            block = (
+                min(x for x, _ in missing), min(y for _, y in missing),
+                max(x for x, _ in missing), max(y for _, y in missing)
+            )
+            computed = await self._cluster_tiles(zoom, *block, price_min, price_max)
+            for x, y in tiles_in_range(*block):
+                tiles[(x, y)] = computed.get((x, y), [])
+                cluster_cache.put((zoom, x, y, price_min, price_max), tiles[(x, y)])
+        
+        clusters = [cluster for tile in tiles.values() for cluster in tile]
+        return {'zoom': zoom, 'clustered': True, 'clusters': clusters, 'listings': [], 'truncated': False}
+
+    async def _viewport_listings(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+        price_min: Optional[int], price_max: Optional[int], limit: int
+    ) -> List[ListingResponse]:
+        lat = func.ST_Y(func.geometry(Listing.location))
+        lon = func.ST_X(func.geometry(Listing.location))
+        query = select(*listing_columns(self.selection)).where(
+            Listing.is_active == True,
+            lat.between(min_lat, max_lat),
+            lon.between(min_lon, max_lon)
+        )
+        envelope = geography_envelope(min_lon, min_lat, max_lon, max_lat)
+        if envelope:
+            # Bounding-box overlap is answered by the GIST index on location
+            query = query.where(Listing.location.op('&&')(
+                func.geography(func.ST_MakeEnvelope(*envelope, 4326))
+            ))
+        if price_min is not None:
+            query = query.where(Listing.price >= price_min)
+        if price_max is not None:
+            query = query.where(Listing.price <= price_max)
+        
+        result = await self.db.execute(query.order_by(Listing.id).limit(limit))
+        return [listing_from_row(row, as_dict=self.as_dict, selection=self.selection) for row in result]
+
+    async def _cluster_tiles(
+        self, zoom: int, x_min: int, y_min: int, x_max: int, y_max: int,
+        price_min: Optional[int], price_max: Optional[int]
+    ) -> Dict[tuple, List[Dict[str, any]]]:
+        """Grid clusters of a block of tiles, keyed by tile
+
+        Each tile is split into 2**CLUSTER_CELL_BITS cells per side, i.e. the
+        cells are the tiles CLUSTER_CELL_BITS zoom levels deeper.
+        """
+        bits = CLUSTER_CELL_BITS
+        params = {
+            'n': 2 ** (zoom + bits),
+            'cx_min': x_min << bits, 'cx_max': ((x_max + 1) << bits) - 1,
+            'cy_min': y_min << bits, 'cy_max': ((y_max + 1) << bits) - 1,
+        }
+        filters = ""
+        envelope = geography_envelope(*range_bounds(x_min, y_min, x_max, y_max, zoom))
+        if envelope:
+            filters += " AND location && ST_MakeEnvelope(:west, :south, :east, :north, 4326)::geography"
+            params['west'], params['south'], params['east'], params['north'] = envelope
+        if price_min is not None:
+            filters += " AND price >= :price_min"
+            params['price_min'] = price_min
+        if price_max is not None:
+            filters += " AND price <= :price_max"
+            params['price_max'] = price_max
+        
+        result = await self.db.execute(text(f"""
+            WITH points AS (
+                SELECT ST_X(geometry(location)) AS lon, ST_Y(geometry(location)) AS lat, price
+                FROM listings
+                WHERE is_active = true{filters}
+            ), cells AS (
+                SELECT floor((lon + 180) / 360 * :n)::int AS cx,
+                       floor((1 - asinh(tan(radians(lat))) / pi()) / 2 * :n)::int AS cy,
+                       lon, lat, price
+                FROM points
+            )
+            SELECT cx, cy, count(*) AS count, avg(lat) AS lat, avg(lon) AS lon,
+                   min(price) AS price_min, max(price) AS price_max
+            FROM cells
+            WHERE cx BETWEEN :cx_min AND :cx_max
+              AND cy BETWEEN :cy_min AND :cy_max
+            GROUP BY cx, cy
+        """), params)
+        
+        tiles: Dict[tuple, List[Dict[str, any]]] = {}
+        for row in result:
+            tiles.setdefault((row.cx >> bits, row.cy >> bits), []).append({
+                'lat': float(row.lat),
+                'lon': float(row.lon),
+                'count': row.count,
+                'price_min': row.price_min,
+                'price_max': row.price_max,
+            })
+        return tiles
+
+    async def get_listings_watermark(self) -> Optional[datetime]:
+        """Latest listings.updated_at, advanced by any insert, edit or deactivation"""
+        result = await self.db.execute(select(func.max(Listing.updated_at)))
+        return result.scalar()
+
+    async def get_open_transactions_horizon(self) -> datetime:
+        """Start of the oldest open transaction; rows committed from now on have updated_at at or after it"""
+        result = await self.db.execute(text(OPEN_TRANSACTIONS_HORIZON_SQL))
+        return result.scalar()
+
+    def _tile_filters(self, z: int, x: int, y: int, price_min: Optional[int], price_max: Optional[int]) -> tuple:
+        """Index prefilter for a tile and its buffer plus the price filters, as SQL and parameters"""
+        envelope = geography_envelope(*buffered_tile_bounds(x, y, z))
+        spatial, params = "true", {}
+        if envelope is not None:
+            spatial = "location && ST_MakeEnvelope(:west, :south, :east, :north, 4326)::geography"
+            params['west'], params['south'], params['east'], params['north'] = envelope
+        prices = ""
+        if price_min is not None:
+            prices += " AND price >= :price_min"
+            params['price_min'] = price_min
+        if price_max is not None:
+            prices += " AND price <= :price_max"
+            params['price_max'] = price_max
+        return spatial, prices, params
+
+    async def get_tile_fingerprint(self, z: int, x: int, y: int, price_min: int = None, price_max: int = None) -> str:
+        """Changes whenever a listing shown in (or removed from) the tile changes
+
+        Only active rows are read, so the partial location index applies: a
+        removal lowers the count, and anything added or edited changes the
+        checksum of (id, updated_at), even when a long transaction commits an
+        updated_at older than the tile's latest one.
+        """
+        spatial, prices, params = self._tile_filters(z, x, y, price_min, price_max)
+        result = await self.db.execute(text(f"""
+            SELECT count(*) AS count,
+                   sum(hashtextextended(id::text || updated_at::text, 0)) AS checksum
+            FROM listings
+            WHERE is_active = true AND {spatial}{prices}
+        """), params)
+        row = result.one()
+        checksum = int(row.checksum or 0) & 0xFFFFFFFFFFFFFFFF
+        return f"{row.count}-{checksum:016x}"
+
+    async def has_tile_changes(self, z: int, x: int, y: int, since: datetime) -> bool:
+        """Whether any listing in the tile's buffer was written at or after `since`
+
+        Inactive rows and every price count, so a deactivation or a price
+        moving out of the filter is a change too. A range scan on the recent
+        end of idx_listings_updated_at, unlike the fingerprint's tile scan.
+        """
+        spatial, _, params = self._tile_filters(z, x, y, None, None)
+        params['since'] = since
+        result = await self.db.execute(text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM listings
+                WHERE updated_at >= :since AND {spatial}
+            )
+        """), params)
+        return bool(result.scalar())
+
+    async def render_listing_tile(self, z: int, x: int, y: int, price_min: int = None, price_max: int = None) -> bytes:
+        """Active listings of an XYZ tile encoded as a Mapbox Vector Tile"""
+        spatial, prices, params = self._tile_filters(z, x, y, price_min, price_max)
+        params.update(z=z, x=x, y=y, extent=MVT_EXTENT, buffer=MVT_BUFFER)
+        result = await self.db.execute(text(f"""
+            WITH features AS (
+                SELECT ST_AsMVTGeom(
+                           ST_Transform(geometry(location), 3857),
+                           ST_TileEnvelope(:z, :x, :y), :extent, :buffer, true
+                       ) AS geom,
+                       id::text AS id, price, rooms, area::float8 AS area, metro_station
+                FROM listings
+                WHERE is_active = true AND {spatial}{prices}
+            )
+            SELECT ST_AsMVT(features, 'listings', :extent, 'geom')
+            FROM features
+            WHERE geom IS NOT NULL
+        """), params)
+        return bytes(result.scalar() or b"")
+
+    async def deactivate_expired(self, batch: int) -> int:
+        """Deactivate up to `batch` active listings past expires_at, returns how many"""
+        result = await self.db.execute(text("""
+            UPDATE listings SET is_active = false, updated_at = now()
+            WHERE id IN (
+                SELECT id FROM listings
+                WHERE is_active = true AND expires_at < now()
+                LIMIT :batch
+                FOR UPDATE SKIP LOCKED
+            )
+        """), {'batch': batch})
+        await self.db.commit()
+        return result.rowcount
+
+    async def archive_inactive(self, batch: int, inactive_days: int) -> int:
+        """Move up to `batch` listings inactive for `inactive_days` into listings_archive
+
+        Their likes move to listing_likes_archive in the same statement rather
+        than cascading away with the listing. They already dropped out of
+        users' liked listings when the listing was deactivated.
+        Returns how many listings were archived.
+        """
+        result = await self.db.execute(text("""
+            WITH moved AS (
+                DELETE FROM listings
+                WHERE id IN (
+                    SELECT id FROM listings
+                    WHERE is_active = false AND updated_at < now() - make_interval(days => :days)
+                    LIMIT :batch
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, external_id, title, description, price, address, location, rooms,
+                          area, floor, total_floors, metro_station, metro_distance,
+                          metro_station_id, photos, created_at, updated_at, expires_at
+            ), archived AS (
+                INSERT INTO listings_archive (
+                    id, external_id, title, description, price, address, location, rooms,
+                    area, floor, total_floors, metro_station, metro_distance,
+                    metro_station_id, photos, created_at, updated_at, expires_at
+                )
+                SELECT * FROM moved
+                RETURNING id
+            ), likes AS (
+                DELETE FROM listing_likes
+                WHERE listing_id IN (SELECT id FROM moved)
+                RETURNING id, user_id, listing_id, created_at
+            ), archived_likes AS (
+                INSERT INTO listing_likes_archive (id, user_id, listing_id, created_at)
+                SELECT * FROM likes
+            )
+            SELECT count(*) FROM archived
+        """), {'batch': batch, 'days': inactive_days})
+        await self.db.commit()
+        return result.scalar()
+
     async def like_listing(self, user_id: uuid.UUID, listing_id: uuid.UUID) -> Dict[str, any]:
         """Like a listing"""
         # Check if like already exists
@@ -395,44 +1055,19 @@ class ListingService:
         
         return {"liked": True}
 
+    async def get_liked_watermark(self, user_id: uuid.UUID) -> tuple:
+        """Count and latest change of a user's liked listings, for ETags"""
+        stmt = select(
+            func.count(), func.max(ListingLike.created_at), func.max(Listing.updated_at)
+        ).select_from(ListingLike).join(Listing).where(ListingLike.user_id == user_id)
+        result = await self.db.execute(stmt)
+        return tuple(result.one())
+
     async def get_user_liked_listings(self, user_id: uuid.UUID) -> List[ListingResponse]:
         """Get user's liked listings"""
-        stmt = select(Listing).join(ListingLike).where(
+        stmt = select(*listing_columns(self.selection)).select_from(Listing).join(ListingLike).where(
             and_(ListingLike.user_id == user_id, Listing.is_active == True)
         ).order_by(ListingLike.created_at.desc())
         
         result = await self.db.execute(stmt)
-        listings = result.scalars().all()
-        
-        listing_responses = []
-        for listing in listings:
-            # Extract coordinates
-            location_stmt = select(func.ST_AsText(listing.location))
-            loc_result = await self.db.execute(location_stmt)
-            location_text = loc_result.scalar()
-            
-            coords = location_text.replace('POINT(', '').replace(')', '').split()
-            listing_lon, listing_lat = float(coords[0]), float(coords[1])
-            
-            listing_response = ListingResponse(
-                id=listing.id,
-                title=listing.title,
-                description=listing.description,
-                price=listing.price,
-                address=listing.address,
-                lat=listing_lat,
-                lon=listing_lon,
-                rooms=listing.rooms,
-                area=listing.area,
-                floor=listing.floor,
-                total_floors=listing.total_floors,
-                metro_station=listing.metro_station,
-                metro_distance=listing.metro_distance,
-                photos=listing.photos,
-                is_liked=True,
-                is_active=listing.is_active,
-                created_at=listing.created_at
-            )
-            listing_responses.append(listing_response)
-        
-        return listing_responses
\ No newline at end of file
+        return [listing_from_row(row, is_liked=True, as_dict=self.as_dict, selection=self.selection) for row in result]
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Set
+
+from database import async_session_maker
+from pagination import distance_key, encode_cursor
+from services import MatchingService
+
+logger = logging.getLogger(__name__)
+
+# Candidates fetched per refill query
+SWIPE_QUEUE_REFILL_SIZE = int(os.getenv("SWIPE_QUEUE_REFILL_SIZE", "100"))
+# A background refill starts when fewer candidates than this are queued
+SWIPE_QUEUE_LOW_WATER = int(os.getenv("SWIPE_QUEUE_LOW_WATER", "20"))
+# Seconds before an exhausted queue looks for new candidates again
+SWIPE_QUEUE_TTL = float(os.getenv("SWIPE_QUEUE_TTL", "300"))
+# Seconds before any queue is rebuilt, so nearer new candidates and search-area
+# changes made through another worker show up without draining the queue first
+SWIPE_QUEUE_MAX_AGE = float(os.getenv("SWIPE_QUEUE_MAX_AGE", "120"))
+# Most candidates handed out per request
+SWIPE_QUEUE_MAX_COUNT = int(os.getenv("SWIPE_QUEUE_MAX_COUNT", "50"))
+# Maximum number of users with a queue in this worker
+SWIPE_QUEUE_MAX_USERS = int(os.getenv("SWIPE_QUEUE_MAX_USERS", "10000"))
+
+
+class SwipeQueue:
+    """Candidates of one user, ahead of the client"""
+
+    def __init__(self):
+        self.items: Deque[dict] = deque()
+        # Candidates the user liked or passed on, never offered again; ones only
+        # handed out come back once the queue is rebuilt
+        self.acted: Set[uuid.UUID] = set()
+        # Keyset position of the last candidate fetched from the database
+        self.cursor: Optional[str] = None
+        self.exhausted = False
+        self.created_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        age = time.monotonic() - self.created_at
+        return age > SWIPE_QUEUE_MAX_AGE or (self.exhausted and not self.items and age > SWIPE_QUEUE_TTL)
+
+
+class SwipeQueueManager:
+    """Per-user server-side candidate queues refilled in the background
+
+    Queues live in one worker. Search-area changes handled by this worker
+    invalidate the queue at once; changes made through another worker apply
+    once the queue is older than SWIPE_QUEUE_MAX_AGE.
+    """
+
+    def __init__(self, max_users: int = SWIPE_QUEUE_MAX_USERS):
+        self.max_users = max_users
+        self.queues: "OrderedDict[uuid.UUID, SwipeQueue]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _queue_for(self, user_id: uuid.UUID) -> SwipeQueue:
+        queue = self.queues.get(user_id)
+        if queue is None or queue.is_stale():
+            fresh = SwipeQueue()
+            if queue is not None:
+                fresh.acted = queue.acted
+            queue = self.queues[user_id] = fresh
+        self.queues.move_to_end(user_id)
+        while len(self.queues) > self.max_users:
+            self.queues.popitem(last=False)
+        return queue
+
+    async def pop(self, user_id: uuid.UUID, count: int) -> List[dict]:
+        """Take the next candidates for a user, refilling in the background when low"""
+        count = max(1, min(count, SWIPE_QUEUE_MAX_COUNT))
+        queue = self._queue_for(user_id)
+        if len(queue.items) < count and not queue.exhausted:
+            # Only the very first load (or a client outrunning the refill) waits
+            await self._refill(user_id, queue)
+
+        popped = [queue.items.popleft() for _ in range(min(count, len(queue.items)))]
+        if len(queue.items) < SWIPE_QUEUE_LOW_WATER and not queue.exhausted and not queue.lock.locked():
+            task = asyncio.create_task(self._refill(user_id, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return popped
+
+    async def _refill(self, user_id: uuid.UUID, queue: SwipeQueue):
+        async with queue.lock:
+            # A rebuilt queue starts again from the nearest candidates, minus those acted on
+            while not queue.exhausted and len(queue.items) < SWIPE_QUEUE_LOW_WATER:
+                try:
+                    async with async_session_maker() as session:
+                        matching_service = MatchingService(session, as_dict=True)
+                        candidates = await matching_service.get_potential_matches(
+                            user_id, SWIPE_QUEUE_REFILL_SIZE, queue.cursor
+                        )
+                except Exception:
+                    logger.exception("Swipe queue refill failed for user %s", user_id)
+                    return
+
+                if candidates:
+                    queue.cursor = encode_cursor(*distance_key(candidates[-1]))
+                if len(candidates) < SWIPE_QUEUE_REFILL_SIZE:
+                    queue.exhausted = True
+                queued = {item['id'] for item in queue.items}
+                for candidate in candidates:
+                    if candidate['id'] not in queue.acted and candidate['id'] not in queued:
+                        queued.add(candidate['id'])
+                        queue.items.append(candidate)
+
+    def discard(self, user_id: uuid.UUID, candidate_ids: List[uuid.UUID]):
+        """Drop candidates the user already acted on through another route"""
+        queue = self.queues.get(user_id)
+        if queue is None:
+            return
+        acted = {uuid.UUID(str(candidate_id)) for candidate_id in candidate_ids}
+        queue.acted.update(acted)
+        queue.items = deque(item for item in queue.items if item['id'] not in acted)
+
+    def invalidate(self, user_id: uuid.UUID):
+        """Forget a user's queue, e.g. after their search area changed"""
+        self.queues.pop(user_id, None)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+swipe_queues = SwipeQueueManager()
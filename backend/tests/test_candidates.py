@@ -0,0 +1,98 @@
+"""refresh_candidates after a move leaves the same pairs as a full rebuild
+
+Needs a migrated PostGIS database at DATABASE_URL and is skipped without one.
+Everything seeded here is rolled back.
+"""
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from models import User
+from services import MatchingService
+
+LAT, LON = 55.7558, 37.6173
+
+
+def point(east_m: float) -> str:
+    # Roughly east_m meters east of (LAT, LON)
+    return f"SRID=4326;POINT({LON + east_m / 63_000} {LAT})"
+
+
+async def candidate_pairs(db: AsyncSession, ids):
+    result = await db.execute(text("""
+        SELECT user_id, candidate_id, round(distance_km::numeric, 6) AS distance_km
+        FROM user_candidates
+        WHERE user_id = ANY(:ids) OR candidate_id = ANY(:ids)
+    """), {'ids': ids})
+    return {tuple(row) for row in result}
+
+
+async def refreshed_and_rebuilt():
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        pytest.skip(f"database unavailable: {e}")
+    try:
+        if await conn.scalar(text("SELECT to_regclass('user_candidates')")) is None:
+            pytest.skip("database is not migrated")
+
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            users = {
+                name: User(
+                    telegram_id=random.randrange(10**12, 10**13), search_location=point(east),
+                    search_radius=radius, is_active=active
+                )
+                for name, east, radius, active in [
+                    ("mover", 0, 1500, True),
+                    ("no_radius_near", 3000, None, True),
+                    ("no_radius_far", 4500, None, True),
+                    ("small_radius", 3200, 300, True),
+                    ("large_radius", -2000, 5000, True),
+                    ("inactive", 3300, 1500, False),
+                ]
+            }
+            db.add_all(users.values())
+            await db.flush()
+            ids = [user.id for user in users.values()]
+            service = MatchingService(db)
+
+            await service.rebuild_candidates()
+            await db.execute(
+                update(User).where(User.id == users["mover"].id).values(search_location=point(3100))
+            )
+            await service.refresh_candidates(users["mover"].id)
+            refreshed = await candidate_pairs(db, ids)
+
+            await service.rebuild_candidates()
+            rebuilt = await candidate_pairs(db, ids)
+            return users, refreshed, rebuilt
+        finally:
+            await db.close()
+            await trans.rollback()
+    finally:
+        await conn.close()
+
+
+def test_refresh_after_move_matches_rebuild():
+    async def run():
+        try:
+            return await refreshed_and_rebuilt()
+        finally:
+            await engine.dispose()
+
+    users, refreshed, rebuilt = asyncio.run(run())
+    assert refreshed == rebuilt
+    pairs = {(user_id, candidate_id) for user_id, candidate_id, _ in refreshed}
+    # A viewer without a radius searches 1000 m and keeps the mover it now overlaps
+    assert (users["no_radius_near"].id, users["mover"].id) in pairs
+    # ...but is never listed to anyone
+    assert (users["mover"].id, users["no_radius_near"].id) not in pairs
+    # Inactive users keep their pairs, reads skip them until they are reactivated
+    assert (users["mover"].id, users["inactive"].id) in pairs
+    assert (users["inactive"].id, users["mover"].id) in pairs
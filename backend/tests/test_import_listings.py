@@ -0,0 +1,80 @@
+"""Row validation and counts of the listing importer"""
+import asyncio
+import contextlib
+import json
+
+import pytest
+from pydantic import ValidationError
+
+import import_listings
+from import_listings import parse_row, read_rows
+
+ROW = {'external_id': 'feed-1', 'title': 'Studio', 'price': 40000, 'lat': 55.75, 'lon': 37.62, 'area': 30.5}
+
+
+def test_malformed_jsonl_line_is_rejected_alone(tmp_path):
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text("\n".join([json.dumps(ROW), '{"external_id": "feed-2", "title": ', '[1, 2]']), encoding='utf-8')
+
+    rows = list(read_rows(str(feed), 'jsonl'))
+    assert len(rows) == 3
+    assert parse_row(rows[0], 'external_id')[0] == 'feed-1'
+    for raw in rows[1:]:
+        with pytest.raises(ValueError):
+            parse_row(raw, 'external_id')
+
+
+@pytest.mark.parametrize("field, value", [
+    ('lat', 90.5), ('lat', -91), ('lon', 180.01), ('lon', -200),
+    ('area', 100000), ('price', 2**31), ('title', 'x' * 256), ('external_id', 'k' * 256),
+])
+def test_values_the_columns_cannot_hold_are_rejected(field, value):
+    with pytest.raises((ValueError, ValidationError)):
+        parse_row(dict(ROW, **{field: value}), 'external_id')
+
+
+def test_values_at_the_column_limits_are_accepted():
+    _, listing = parse_row(dict(ROW, lat=-90, lon=180, area=99999.99, price=2**31 - 1), 'external_id')
+    assert listing.area == 99999.99
+
+
+class FakeConnection:
+    """Reports the rows DISTINCT ON would upsert from the staged batch"""
+
+    def __init__(self):
+        self.staged = []
+
+    def transaction(self):
+        return _no_transaction()
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.staged = list(records)
+
+    async def execute(self, sql, *args):
+        if "INSERT INTO listings" in sql:
+            return f"INSERT 0 {len({record[1] for record in self.staged})}"
+        return "UPDATE 0"
+
+    async def close(self):
+        pass
+
+
+@contextlib.asynccontextmanager
+async def _no_transaction():
+    yield
+
+
+def test_collapsed_duplicate_keys_are_not_counted_as_imported(tmp_path, monkeypatch):
+    conn = FakeConnection()
+
+    async def connect(url):
+        return conn
+
+    monkeypatch.setattr(import_listings.asyncpg, "connect", connect)
+    feed = tmp_path / "feed.jsonl"
+    keys = ['feed-1', 'feed-2', 'feed-1', 'feed-3', 'feed-3']
+    feed.write_text("\n".join(json.dumps(dict(ROW, external_id=key)) for key in keys), encoding='utf-8')
+
+    stats = asyncio.run(import_listings.import_listings(str(feed), batch_size=10))
+    assert stats['imported'] == 3
+    assert stats['duplicates'] == 2
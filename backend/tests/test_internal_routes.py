@@ -0,0 +1,29 @@
+"""Operator-only /internal/* routes require the internal token"""
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import auth
+from auth import verify_internal_token
+
+
+def internal_app() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/internal/status", dependencies=[Depends(verify_internal_token)])
+    async def internal_status():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_internal_routes_are_hidden_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(auth, "INTERNAL_TOKEN", None)
+    assert internal_app().get("/internal/status", headers={"X-Internal-Token": ""}).status_code == 404
+
+
+def test_internal_routes_require_the_token(monkeypatch):
+    monkeypatch.setattr(auth, "INTERNAL_TOKEN", "secret")
+    client = internal_app()
+    assert client.get("/internal/status").status_code == 403
+    assert client.get("/internal/status", headers={"X-Internal-Token": "wrong"}).status_code == 403
+    assert client.get("/internal/status", headers={"X-Internal-Token": "secret"}).json() == {"ok": True}
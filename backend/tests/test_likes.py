@@ -0,0 +1,41 @@
+"""Status codes of the single-like endpoint"""
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+import main
+from schemas import UserPrincipal
+from services import MatchingService
+
+ME = UserPrincipal(
+    id=uuid.uuid4(), telegram_id=1, is_active=True,
+    created_at=datetime.now(timezone.utc), updated_at=datetime.now(timezone.utc),
+)
+
+
+def like_client(monkeypatch, existing):
+    async def like_users(self, liker_id, liked_ids):
+        if str(liker_id) in map(str, liked_ids):
+            raise ValueError("Cannot like yourself")
+        return [
+            {"user_id": uuid.UUID(str(i)), "liked": True, "already_liked": False, "match": False, "match_id": None}
+            for i in liked_ids if str(i) in existing
+        ]
+
+    async def no_database():
+        yield None
+
+    monkeypatch.setattr(MatchingService, "like_users", like_users)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_current_user, lambda: ME)
+    monkeypatch.setitem(main.app.dependency_overrides, main.get_database, no_database)
+    return TestClient(main.app)
+
+
+def test_like_missing_user_is_not_found(monkeypatch):
+    other = str(uuid.uuid4())
+    client = like_client(monkeypatch, {other})
+
+    assert client.post(f"/api/users/{other}/like").status_code == 200
+    assert client.post(f"/api/users/{uuid.uuid4()}/like").status_code == 404
+    assert client.post(f"/api/users/{ME.id}/like").status_code == 400
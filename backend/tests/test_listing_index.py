@@ -0,0 +1,246 @@
+"""Incremental refresh and search of the in-memory listing index"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import listing_index
+from database import engine
+from listing_index import ListingIndex, geodesic_distance
+from models import Listing
+from projections import listing_columns
+from services import ListingService
+
+T0 = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+
+class FakeDatabase:
+    """Answers the horizon query and returns no changed rows"""
+
+    def __init__(self, horizon):
+        self.horizon = horizon
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        await asyncio.sleep(0.05)
+        if "pg_stat_activity" in str(statement):
+            return FakeResult(self.horizon)
+        return FakeResult([])
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def test_concurrent_stale_requests_refresh_once(monkeypatch):
+    db = FakeDatabase(datetime.now(timezone.utc))
+    monkeypatch.setattr(listing_index, "async_session_maker", lambda: db)
+
+    async def scenario():
+        index = ListingIndex()
+        await asyncio.gather(*(index.refresh_if_stale() for _ in range(5)))
+
+    asyncio.run(scenario())
+    assert len(db.statements) == 2
+
+
+def test_refresh_rereads_from_oldest_open_transaction():
+    now = datetime.now(timezone.utc)
+    index = ListingIndex()
+    index.watermark = now
+    index.horizon = now - timedelta(minutes=10)
+    db = FakeDatabase(now)
+
+    asyncio.run(index.refresh(db))
+    # The second statement is the listing read, bounded by the older horizon
+    read = db.statements[1]
+    assert "listings.updated_at >=" in str(read)
+    assert list(read.compile().params.values()) == [now - timedelta(minutes=10)]
+    assert index.horizon == now
+
+
+class FakeRow:
+    def __init__(self, **data):
+        self._mapping = data
+
+
+CENTER = (55.7558, 37.6173)
+IDS = [uuid.UUID(int=i) for i in range(1, 9)]
+
+
+def listing_row(number, lat, lon, price, is_active=True):
+    return FakeRow(
+        id=IDS[number], title=f"Listing {number}", description=None, price=price, address=None,
+        rooms=1, area=None, floor=None, total_floors=None, metro_station=None, metro_distance=None,
+        metro_station_id=None, photos=None, is_active=is_active, created_at=T0, lat=lat, lon=lon,
+        updated_at=T0,
+    )
+
+
+def fixed_index():
+    lat, lon = CENTER
+    index = ListingIndex()
+    index.apply([
+        listing_row(0, lat, lon + 0.010, 40000),
+        # 1 and 2 share a point, so only the id orders them
+        listing_row(2, lat + 0.005, lon, 50000),
+        listing_row(1, lat + 0.005, lon, 60000),
+        listing_row(3, lat, lon - 0.020, 30000),
+        listing_row(4, lat + 0.050, lon, 45000),
+        listing_row(5, lat, lon + 0.001, 45000, is_active=False),
+    ])
+    return index
+
+
+def meters_to(lat, lon):
+    return float(geodesic_distance(*CENTER, np.array([lat]), np.array([lon]))[0])
+
+
+def ids(listings):
+    return [listing.id for listing in listings]
+
+
+def test_search_orders_by_distance_then_id():
+    found = fixed_index().search(*CENTER, radius=2000)
+    assert ids(found) == [IDS[1], IDS[2], IDS[0], IDS[3]]
+    assert found[0].distance == found[1].distance
+    assert [f.distance for f in found] == sorted(f.distance for f in found)
+
+
+def test_radius_boundary_is_inclusive():
+    lat, lon = CENTER
+    edge = meters_to(lat, lon - 0.020)
+    index = fixed_index()
+    assert IDS[3] in ids(index.search(*CENTER, radius=edge))
+    assert IDS[3] not in ids(index.search(*CENTER, radius=edge - 0.01))
+
+
+def test_price_bounds_are_inclusive():
+    found = fixed_index().search(*CENTER, radius=10000, price_min=40000, price_max=50000)
+    assert ids(found) == [IDS[2], IDS[0], IDS[4]]
+
+
+def test_pages_continue_after_the_keyset():
+    index = fixed_index()
+    everything = ids(index.search(*CENTER, radius=10000))
+    pages, after = [], None
+    while True:
+        page = index.search(*CENTER, radius=10000, limit=2, after=after)
+        if not page:
+            break
+        pages += ids(page)
+        after = (page[-1].distance, page[-1].id)
+    assert pages == everything
+
+    # Resuming between the two tied listings keeps the second one
+    first = index.search(*CENTER, radius=10000, limit=1)[0]
+    assert ids(index.search(*CENTER, radius=10000, limit=1, after=(first.distance, first.id))) == [IDS[2]]
+
+
+def test_search_without_location_pages_by_id():
+    index = fixed_index()
+    assert ids(index.search(limit=3)) == IDS[:3]
+    assert ids(index.search(limit=3, after=(None, IDS[2]))) == [IDS[3], IDS[4]]
+
+
+
+# An unlikely price keeps rows already in the database out of the comparison
+PARITY_PRICE = 987_611
+
+
+async def walk_pages(search, page_size=2):
+    """(id, distance) of every row, fetched page by page from the keyset of the last row"""
+    rows, after = [], None
+    while True:
+        page = await search(after, page_size)
+        if not page:
+            return rows
+        rows += page
+        after = page[-1]
+
+
+async def index_and_postgis_walks(queries):
+    """Both engines' paged answers to each query, over listings seeded into a migrated database"""
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        pytest.skip(f"database unavailable: {e}")
+    try:
+        if await conn.scalar(text("SELECT to_regclass('listings')")) is None:
+            pytest.skip("database is not migrated")
+
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            lat, lon = CENTER
+            seeded = []
+            # Two listings share a point, two sit at mirrored points of equal distance
+            for i, (dlat, dlon) in enumerate([
+                (0, 0.010), (0.005, 0), (0.005, 0), (0, -0.020), (0.050, 0), (0, 0.006), (0, -0.006),
+            ]):
+                listing = Listing(
+                    title=f"Parity {i}", price=PARITY_PRICE + i % 3,
+                    location=f"SRID=4326;POINT({lon + dlon} {lat + dlat})",
+                )
+                db.add(listing)
+                seeded.append(listing)
+            await db.flush()
+
+            index = ListingIndex()
+            index.apply(await db.execute(
+                select(*listing_columns(), Listing.updated_at).where(Listing.id.in_([l.id for l in seeded]))
+            ))
+            service = ListingService(db)
+
+            walks = []
+            for query in queries:
+                async def memory(after, limit):
+                    page = index.search(**query, limit=limit, after=after and (after[1], after[0]))
+                    return [(l.id, l.distance) for l in page]
+
+                async def postgis(after, limit):
+                    statement = service.search_statement(**query, limit=limit, after=after and (after[1], after[0]))
+                    return [(row.id, row.distance_km) for row in await db.execute(statement)]
+
+                walks.append((await walk_pages(memory), await walk_pages(postgis)))
+            return walks
+        finally:
+            await db.close()
+            await trans.rollback()
+    finally:
+        await conn.close()
+
+
+def test_memory_search_matches_postgis():
+    lat, lon = CENTER
+    prices = dict(price_min=PARITY_PRICE, price_max=PARITY_PRICE + 2)
+    queries = [dict(lat=lat, lon=lon, radius=radius, **prices) for radius in (300, 700, 2000, 10000)]
+    queries.append(dict(lat=lat, lon=lon, radius=10000, price_min=PARITY_PRICE + 1, price_max=PARITY_PRICE + 1))
+
+    async def run():
+        try:
+            return await index_and_postgis_walks(queries)
+        finally:
+            await engine.dispose()
+
+    for memory, postgis in asyncio.run(run()):
+        assert [listing_id for listing_id, _ in memory] == [listing_id for listing_id, _ in postgis]
+        assert np.allclose([d for _, d in memory], [d for _, d in postgis], rtol=0, atol=1e-6)
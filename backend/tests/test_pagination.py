@@ -0,0 +1,31 @@
+"""Cursor encoding and type checks on decode"""
+import uuid
+from datetime import datetime
+
+import pytest
+
+from pagination import LISTING_CURSOR, decode_cursor, encode_cursor
+
+
+def test_round_trip_keeps_types():
+    listing_id, created_at = uuid.uuid4(), datetime(2026, 1, 2, 3, 4, 5)
+    assert decode_cursor(encode_cursor(1, listing_id), LISTING_CURSOR) == (1.0, listing_id)
+    assert decode_cursor(encode_cursor(None, listing_id), LISTING_CURSOR) == (None, listing_id)
+    assert decode_cursor(encode_cursor(created_at, listing_id), (datetime, uuid.UUID)) == (created_at, listing_id)
+
+
+@pytest.mark.parametrize("values", [
+    ("far", uuid.uuid4()),
+    (1.5, "not-a-uuid"),
+    (True, uuid.uuid4()),
+    (1.5,),
+    (1.5, uuid.uuid4(), 2),
+])
+def test_forged_cursors_are_rejected(values):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(*values), LISTING_CURSOR)
+
+
+def test_garbage_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not base64 json", LISTING_CURSOR)
@@ -0,0 +1,135 @@
+"""Write-behind profile updates, against an in-memory stand-in for UserService"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import profile_writes
+from profile_writes import ProfileWriteBuffer
+from schemas import UserPrincipal, UserUpdate
+
+
+class FakeUsers:
+    """Rows written by update_search_area, with a configurable delay and failures"""
+
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.rows = {}
+        self.writes = 0
+
+    def service(self, session):
+        return self
+
+    async def update_search_area(self, user_id, fields):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.rows.setdefault(user_id, {}).update(fields)
+        self.writes += 1
+        return 1
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def users(monkeypatch):
+    fake = FakeUsers()
+    monkeypatch.setattr(profile_writes, "UserService", fake.service)
+    monkeypatch.setattr(profile_writes, "async_session_maker", FakeSession)
+    monkeypatch.setattr(profile_writes, "PROFILE_WRITE_DELAY", 0.01)
+    monkeypatch.setattr(profile_writes, "PROFILE_WRITE_MAX_DELAY", 0.05)
+    return fake
+
+
+def principal() -> UserPrincipal:
+    now = datetime.now(timezone.utc)
+    return UserPrincipal(
+        id=uuid.uuid4(), telegram_id=1, first_name="Test", is_active=True,
+        created_at=now, updated_at=now, search_radius=500, price_min=10000, price_max=50000
+    )
+
+
+def test_burst_is_written_once(users):
+    async def scenario():
+        buffer, user = ProfileWriteBuffer(), principal()
+        for radius in range(1000, 1010):
+            assert buffer.submit(user, UserUpdate(search_radius=radius)).search_radius == radius
+        await asyncio.sleep(0.1)
+        return user
+
+    user = asyncio.run(scenario())
+    assert users.writes == 1
+    assert users.rows[user.id] == {'search_radius': 1009}
+
+
+def test_flush_waits_for_write_in_flight(users):
+    users.delay = 0.3
+
+    async def scenario():
+        buffer, user = ProfileWriteBuffer(), principal()
+        buffer.submit(user, UserUpdate(search_radius=1000))
+        await asyncio.sleep(0.1)
+        assert user.id in buffer.writing
+        buffer.submit(user, UserUpdate(search_radius=2000))
+        # Let the second burst's own write start waiting on the first one
+        await asyncio.sleep(0.1)
+        await buffer.flush(user.id)
+        assert users.rows[user.id]['search_radius'] == 2000
+        assert not buffer.writing and not buffer.pending
+
+    asyncio.run(scenario())
+
+
+def test_failed_write_stays_buffered(users):
+    users.failures = profile_writes.PROFILE_WRITE_RETRIES + 1
+
+    async def scenario():
+        buffer, user = ProfileWriteBuffer(), principal()
+        buffer.submit(user, UserUpdate(search_radius=3000))
+        for _ in range(users.failures):
+            with pytest.raises(ConnectionError):
+                await buffer.flush(user.id)
+            # Not written, but still visible to the user and queued for retry
+            assert buffer.overlay(user).search_radius == 3000
+            assert buffer.pending[user.id].task is not None
+        await buffer.flush(user.id)
+        assert users.rows[user.id] == {'search_radius': 3000}
+        assert buffer.overlay(user).search_radius == 500
+        assert buffer.failures == profile_writes.PROFILE_WRITE_RETRIES + 1
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_marker_moves_to_the_commit_of_a_retried_write(users):
+    users.failures = 1
+
+    async def scenario():
+        buffer, user = ProfileWriteBuffer(), principal()
+        assert buffer.write_marker(user.id) is None
+        buffer.submit(user, UserUpdate(search_radius=3000))
+        with pytest.raises(ConnectionError):
+            await buffer.flush(user.id)
+        # Still buffered: reads must not trust any replica yet
+        assert buffer.write_marker(user.id) == pytest.approx(time.time(), abs=0.05)
+        assert user.id not in buffer.committed_at
+
+        failed_at = time.time()
+        # The background retry lands; the marker is its commit time
+        await asyncio.sleep(0.2)
+        assert users.rows[user.id] == {'search_radius': 3000}
+        committed_at = buffer.write_marker(user.id)
+        assert committed_at is not None and failed_at < committed_at < time.time()
+        await buffer.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,112 @@
+"""Listing endpoints run a fixed number of statements however many rows they return
+
+Needs a migrated PostGIS database at DATABASE_URL and is skipped without one.
+Everything seeded here is rolled back.
+"""
+import asyncio
+import random
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from listing_index import LISTING_SEARCH_ENGINE
+from models import Listing, ListingLike, User
+from schemas import UserPrincipal
+from services import ListingService
+
+LAT, LON = 55.7558, 37.6173
+# An unlikely price keeps rows already in the database out of the search
+PRICE = 987_653
+
+
+async def seed(db: AsyncSession, count: int) -> User:
+    user = User(
+        telegram_id=random.randrange(10**12, 10**13),
+        first_name="Query count",
+        search_location=f"SRID=4326;POINT({LON} {LAT})",
+        search_radius=5000,
+        price_min=PRICE,
+        price_max=PRICE,
+    )
+    db.add(user)
+    await db.flush()
+    for i in range(count):
+        listing = Listing(
+            title=f"Listing {i}",
+            price=PRICE,
+            location=f"SRID=4326;POINT({LON + i * 0.0001} {LAT})",
+            photos=["a.jpg", "b.jpg"],
+        )
+        db.add(listing)
+        await db.flush()
+        db.add(ListingLike(user_id=user.id, listing_id=listing.id))
+    await db.flush()
+    return user
+
+
+async def statements_per_call(count: int):
+    """Rows returned and statements run by each listing endpoint, with `count` listings seeded"""
+    try:
+        conn = await engine.connect()
+    except Exception as e:
+        pytest.skip(f"database unavailable: {e}")
+    try:
+        if await conn.scalar(text("SELECT to_regclass('listing_likes')")) is None:
+            pytest.skip("database is not migrated")
+
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            user = await seed(db, count)
+            now = datetime.now(timezone.utc)
+            principal = UserPrincipal(
+                id=user.id, telegram_id=user.telegram_id, search_radius=5000,
+                price_min=PRICE, price_max=PRICE, lat=LAT, lon=LON,
+                is_active=True, created_at=now, updated_at=now,
+            )
+            service = ListingService(db)
+            calls = {
+                "search": lambda: service.search_listings(
+                    lat=LAT, lon=LON, radius=5000, price_min=PRICE, price_max=PRICE, limit=50
+                ),
+                "user_search": lambda: service.get_listings_for_user(principal),
+                "liked": lambda: service.get_user_liked_listings(user.id),
+            }
+            counts = {}
+            for name, call in calls.items():
+                statements = []
+
+                def record(conn, cursor, statement, parameters, context, executemany):
+                    statements.append(statement)
+
+                event.listen(engine.sync_engine, "before_cursor_execute", record)
+                try:
+                    rows = await call()
+                finally:
+                    event.remove(engine.sync_engine, "before_cursor_execute", record)
+                counts[name] = (len(rows), len(statements))
+            return counts
+        finally:
+            await db.close()
+            await trans.rollback()
+    finally:
+        await conn.close()
+
+
+def test_statement_count_is_independent_of_result_size():
+    if LISTING_SEARCH_ENGINE != "postgis":
+        pytest.skip("search is answered from the in-process index")
+
+    async def run():
+        try:
+            return await statements_per_call(1), await statements_per_call(20)
+        finally:
+            await engine.dispose()
+
+    small, large = asyncio.run(run())
+    for name in small:
+        assert small[name][0] == 1 and large[name][0] == 20, name
+        assert small[name][1] == large[name][1], name
@@ -0,0 +1,68 @@
+"""Read-your-writes routing from the client-carried write marker"""
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import replica
+from replica import ReadYourWritesMiddleware, ReplicaRouter, write_marker
+
+
+def marker_app() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    @app.post("/write")
+    async def write():
+        return {}
+
+    @app.put("/write-behind")
+    async def write_behind(request: Request):
+        request.state.written_at = time.time() + 3
+        return {}
+
+    @app.get("/read-committed-later")
+    async def read_committed_later(request: Request):
+        request.state.written_at = 1234.5
+        return {}
+
+    @app.get("/read")
+    async def read(request: Request):
+        return {"written_at": write_marker(request)}
+
+    return TestClient(app)
+
+
+def test_marker_round_trips_through_header_and_cookie():
+    client = marker_app()
+    assert client.get("/read").json() == {"written_at": None}
+
+    marker = client.post("/write").headers["x-last-write"]
+    # Same-origin clients send the cookie back, others echo the header
+    assert client.get("/read").json() == {"written_at": float(marker)}
+    client.cookies.clear()
+    assert client.get("/read", headers={"X-Last-Write": marker}).json() == {"written_at": float(marker)}
+    assert client.get("/read", headers={"X-Last-Write": "garbage"}).json() == {"written_at": None}
+
+    later = float(client.put("/write-behind").headers["x-last-write"])
+    assert later > float(marker) + 2
+
+
+def test_replica_used_only_once_write_is_replayed(monkeypatch):
+    monkeypatch.setattr(replica, "read_engine", object())
+    router = ReplicaRouter()
+    # A fresh lag measurement: replayed through 1.5 s ago
+    router.lag, router.checked_at = 0.5, time.monotonic()
+    router.replayed_through = time.time() - 1.5
+
+    assert asyncio.run(router.use_replica(None))
+    assert asyncio.run(router.use_replica(time.time() - 5))
+    assert not asyncio.run(router.use_replica(time.time()))
+
+
+def test_reads_hand_back_a_newer_server_marker():
+    client = marker_app()
+    assert "x-last-write" not in client.get("/read").headers
+    # e.g. a buffered profile write that committed after its PUT was answered
+    assert client.get("/read-committed-later").headers["x-last-write"] == "1234.500"
@@ -0,0 +1,59 @@
+"""Startup schema check against the migration chain"""
+import asyncio
+import glob
+import os
+import re
+
+import pytest
+
+import database
+from database import SCHEMA_REVISION, SchemaVersionError, check_schema_version, migration_chain
+from models import Base
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "migrations", "versions")
+
+
+def check(monkeypatch, revision, chain):
+    async def schema_revision():
+        return revision
+
+    monkeypatch.setattr(database, "schema_revision", schema_revision)
+    monkeypatch.setattr(database, "migration_chain", lambda: chain)
+    return asyncio.run(check_schema_version())
+
+
+def test_chain_runs_from_baseline_to_the_required_revision():
+    chain = migration_chain()
+    assert chain[0] == "0001"
+    assert SCHEMA_REVISION in chain
+
+
+def test_later_revisions_are_accepted(monkeypatch):
+    chain = ["0001", "0002", "0003"]
+    monkeypatch.setattr(database, "SCHEMA_REVISION", "0002")
+
+    assert check(monkeypatch, "0002", chain) == "0002"
+    # Migrated ahead of this code during a rolling deploy
+    assert check(monkeypatch, "0003", chain) == "0003"
+    for rejected in ("0001", None, "9999"):
+        with pytest.raises(SchemaVersionError):
+            check(monkeypatch, rejected, chain)
+
+
+def migrated_indexes():
+    """Index names left by the upgrade steps, in revision order"""
+    names = set()
+    for path in sorted(glob.glob(os.path.join(VERSIONS_DIR, "*.py"))):
+        with open(path) as f:
+            upgrade = f.read().split("def downgrade")[0]
+        names |= set(re.findall(r"CREATE INDEX (?:CONCURRENTLY )?(?:IF NOT EXISTS )?(\w+)", upgrade))
+        names -= set(re.findall(r"DROP INDEX (?:CONCURRENTLY )?(?:IF EXISTS )?(\w+)", upgrade))
+        if "FULL_INDEXES" in upgrade:
+            names -= set(re.findall(r'"(idx_\w+)"', upgrade.split("RESTORED_INDEXES")[0].split("FULL_INDEXES")[1]))
+    return names
+
+
+def test_model_indexes_carry_the_migration_names():
+    # Otherwise autogenerate drops and recreates them under SQLAlchemy's ix_* names
+    model_indexes = {index.name for table in Base.metadata.tables.values() for index in table.indexes}
+    assert model_indexes == migrated_indexes()
@@ -0,0 +1,82 @@
+"""Server-side swipe queues, against an in-memory candidate list"""
+import asyncio
+import uuid
+
+import swipe_queue
+from pagination import decode_cursor
+from swipe_queue import SwipeQueueManager
+
+CANDIDATES = [{'id': uuid.UUID(int=i), 'distance': i / 10} for i in range(1, 301)]
+
+
+class FakeMatching:
+    queries = 0
+
+    def __init__(self, session, as_dict=False):
+        pass
+
+    async def get_potential_matches(self, user_id, limit, cursor):
+        FakeMatching.queries += 1
+        start = 0
+        if cursor:
+            _, after_id = decode_cursor(cursor, (float, uuid.UUID))
+            start = next(i for i, c in enumerate(CANDIDATES) if c['id'] == after_id) + 1
+        return CANDIDATES[start:start + limit]
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def setup(monkeypatch):
+    FakeMatching.queries = 0
+    monkeypatch.setattr(swipe_queue, "MatchingService", FakeMatching)
+    monkeypatch.setattr(swipe_queue, "async_session_maker", FakeSession)
+
+
+def test_count_is_clamped(monkeypatch):
+    setup(monkeypatch)
+
+    async def scenario():
+        queues = SwipeQueueManager()
+        popped = await queues.pop(uuid.uuid4(), 10 ** 9)
+        await queues.close()
+        return popped
+
+    assert len(asyncio.run(scenario())) == swipe_queue.SWIPE_QUEUE_MAX_COUNT
+
+
+def rebuilt_pops(monkeypatch, swipe_first):
+    setup(monkeypatch)
+    monkeypatch.setattr(swipe_queue, "SWIPE_QUEUE_MAX_AGE", 0.05)
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        queues = SwipeQueueManager()
+        first = await queues.pop(user_id, 10)
+        if swipe_first:
+            queues.discard(user_id, [c['id'] for c in first])
+        await asyncio.sleep(0.1)
+        second = await queues.pop(user_id, 10)
+        await queues.close()
+        return first, second
+
+    return asyncio.run(scenario())
+
+
+def test_old_queue_is_rebuilt_without_repeating_swiped_candidates(monkeypatch):
+    first, second = rebuilt_pops(monkeypatch, swipe_first=True)
+    assert [c['id'] for c in first] == [c['id'] for c in CANDIDATES[:10]]
+    # The rebuilt queue queried again from the nearest candidates, minus those swiped
+    assert [c['id'] for c in second] == [c['id'] for c in CANDIDATES[10:20]]
+    assert FakeMatching.queries == 2
+
+
+def test_unswiped_candidates_come_back_after_a_rebuild(monkeypatch):
+    # Handed out but never liked or passed on, e.g. the Matching screen was left
+    first, second = rebuilt_pops(monkeypatch, swipe_first=False)
+    assert [c['id'] for c in second] == [c['id'] for c in first]
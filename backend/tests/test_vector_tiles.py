@@ -0,0 +1,102 @@
+"""When the tile cache fingerprints tiles again"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import vector_tiles
+from vector_tiles import ListingTileCache
+
+T0 = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeListingService:
+    watermark = T0
+    horizon = T0 + timedelta(seconds=1)
+    fingerprints = 0
+    change_checks = 0
+    changed = False
+
+    def __init__(self, db):
+        pass
+
+    async def get_listings_watermark(self):
+        return FakeListingService.watermark
+
+    async def get_open_transactions_horizon(self):
+        return FakeListingService.horizon
+
+    async def get_tile_fingerprint(self, z, x, y, price_min, price_max):
+        FakeListingService.fingerprints += 1
+        return "1-0"
+
+    async def has_tile_changes(self, z, x, y, since):
+        FakeListingService.change_checks += 1
+        return FakeListingService.changed
+
+    async def render_listing_tile(self, z, x, y, price_min, price_max):
+        return b"tile"
+
+
+def fingerprints_per_get(monkeypatch, tmp_path, horizon, changed=False, gets=3):
+    monkeypatch.setattr(vector_tiles, "ListingService", FakeListingService)
+    monkeypatch.setattr(vector_tiles, "TILE_WATERMARK_SECONDS", 0)
+    monkeypatch.setattr(FakeListingService, "horizon", horizon)
+    monkeypatch.setattr(FakeListingService, "changed", changed)
+    monkeypatch.setattr(FakeListingService, "fingerprints", 0)
+    monkeypatch.setattr(FakeListingService, "change_checks", 0)
+    cache = ListingTileCache(directory=str(tmp_path))
+
+    async def run():
+        for _ in range(gets):
+            assert await cache.get(None, 10, 5, 5) == b"tile"
+
+    asyncio.run(run())
+    return FakeListingService.fingerprints
+
+
+def test_unchanged_watermark_skips_the_fingerprint(monkeypatch, tmp_path):
+    assert fingerprints_per_get(monkeypatch, tmp_path, horizon=T0 + timedelta(seconds=1)) == 1
+
+
+def test_open_transaction_under_the_watermark_only_checks_for_changes(monkeypatch, tmp_path):
+    # A transaction that started before the latest write may still commit older rows,
+    # which an EXISTS over the tile finds without taking the fingerprint again
+    assert fingerprints_per_get(monkeypatch, tmp_path, horizon=T0 - timedelta(minutes=5)) == 1
+    assert FakeListingService.change_checks == 2
+
+
+def test_changed_rows_in_the_tile_take_the_fingerprint(monkeypatch, tmp_path):
+    assert fingerprints_per_get(monkeypatch, tmp_path, horizon=T0 - timedelta(minutes=5), changed=True) == 3
+
+
+def test_old_fingerprints_are_taken_again(monkeypatch, tmp_path):
+    # A listing moved out of the tile leaves no changed row in it
+    monkeypatch.setattr(vector_tiles, "TILE_REVALIDATE_SECONDS", 0)
+    assert fingerprints_per_get(monkeypatch, tmp_path, horizon=T0 - timedelta(minutes=5)) == 3
+    assert FakeListingService.change_checks == 0
+
+
+def test_off_step_price_filters_are_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_tiles, "ListingService", FakeListingService)
+    cache = ListingTileCache(directory=str(tmp_path))
+
+    async def run():
+        assert await cache.get(None, 10, 5, 5, price_min=12345) == b"tile"
+        assert await cache.get(None, 10, 5, 5, price_min=10000) == b"tile"
+
+    asyncio.run(run())
+    assert cache.uncached == 1
+    assert [p.name for p in tmp_path.rglob("*.mvt")] == ["5.1-0.mvt"]
+
+
+def test_oldest_tiles_are_evicted_past_the_size_bound(monkeypatch, tmp_path):
+    monkeypatch.setattr(vector_tiles, "ListingService", FakeListingService)
+    # Room for two 4-byte tiles
+    cache = ListingTileCache(directory=str(tmp_path), max_bytes=9)
+
+    async def run():
+        for y in range(5):
+            await cache.get(None, 10, 5, y)
+
+    asyncio.run(run())
+    assert cache.evictions > 0
+    assert sum(p.stat().st_size for p in tmp_path.rglob("*.mvt")) <= 9
@@ -0,0 +1,116 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+# Web Mercator cannot represent the poles
+MAX_LATITUDE = 85.05112878
+# Zoom level from which the map gets individual listings instead of clusters
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "15"))
+# Each tile is split into 2**CLUSTER_CELL_BITS cells per side for clustering
+CLUSTER_CELL_BITS = 3
+# Seconds a cached tile of clusters is served before it is recomputed
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", "60"))
+CLUSTER_CACHE_SIZE = int(os.getenv("CLUSTER_CACHE_SIZE", "20000"))
+# Vector tile geometry resolution and the margin kept around each tile, in tile units
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+# Viewports spanning more tiles than this at the requested zoom are rejected
+MAX_VIEWPORT_TILES = int(os.getenv("MAX_VIEWPORT_TILES", "256"))
+
+
+def tile_for(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """XYZ tile containing a point"""
+    n = 2 ** zoom
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of an XYZ tile in degrees"""
+    n = 2 ** zoom
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def tile_range(min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int) -> Tuple[int, int, int, int]:
+    """(x_min, y_min, x_max, y_max) of the tiles covering a bounding box"""
+    x_min, y_min = tile_for(max_lat, min_lon, zoom)
+    x_max, y_max = tile_for(min_lat, max_lon, zoom)
+    return x_min, y_min, x_max, y_max
+
+
+def buffered_tile_bounds(x: int, y: int, zoom: int, buffer: float = MVT_BUFFER / MVT_EXTENT) -> Tuple[float, float, float, float]:
+    """Tile bounds grown by a fraction of the tile on every side"""
+    west, _, _, north = tile_bounds(x - buffer, y - buffer, zoom)
+    _, south, east, _ = tile_bounds(x + buffer, y + buffer, zoom)
+    return max(west, -180.0), south, min(east, 180.0), north
+
+
+def range_bounds(x_min: int, y_min: int, x_max: int, y_max: int, zoom: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of a block of tiles"""
+    west, _, _, north = tile_bounds(x_min, y_min, zoom)
+    _, south, east, _ = tile_bounds(x_max, y_max, zoom)
+    return west, south, east, north
+
+
+def geography_envelope(west: float, south: float, east: float, north: float) -> Optional[Tuple[float, float, float, float]]:
+    """Bounds whose geography box covers a lon/lat rectangle, None if too wide
+
+    Geography polygon edges are great circles bowing towards the pole, so the
+    rectangle is padded by that bow before it is used as an index filter.
+    """
+    if east - west >= 90:
+        return None
+    half_span = math.radians(east - west) / 2
+
+    def bow(lat: float) -> float:
+        lat = math.radians(abs(lat))
+        return math.degrees(math.atan(math.tan(lat) / math.cos(half_span)) - lat)
+
+    pad = max(bow(south), bow(north)) * 1.1 + 1e-6
+    return west, max(south - pad, -90.0), east, min(north + pad, 90.0)
+
+
+def tiles_in_range(x_min: int, y_min: int, x_max: int, y_max: int) -> Iterator[Tuple[int, int]]:
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            yield x, y
+
+
+class TileCache:
+    """TTL + LRU cache of per-tile results"""
+
+    def __init__(self, ttl: float = CLUSTER_CACHE_TTL, max_size: int = CLUSTER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+cluster_cache = TileCache()
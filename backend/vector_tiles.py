@@ -0,0 +1,254 @@
+import asyncio
+import glob
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services import ListingService
+
+# Directory holding rendered tiles, safe to wipe at any time
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "social_rent_tiles"))
+# Seconds between checks of the listings.updated_at watermark
+TILE_WATERMARK_SECONDS = float(os.getenv("TILE_WATERMARK_SECONDS", "5"))
+# Tiles remembered as validated against the current watermark
+TILE_VALIDATED_SIZE = int(os.getenv("TILE_VALIDATED_SIZE", "100000"))
+# Size the tile directory is kept under; the oldest files go first
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Price filters are cached on disk only on multiples of this, others are rendered each time
+TILE_PRICE_STEP = int(os.getenv("TILE_PRICE_STEP", "5000"))
+# Seconds after which a tile is fingerprinted again even without rows changed in it
+TILE_REVALIDATE_SECONDS = float(os.getenv("TILE_REVALIDATE_SECONDS", "300"))
+TILE_MAX_ZOOM = 22
+
+
+def _read(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write(path: str, data: bytes, stale_pattern: str) -> int:
+    """Atomically write a tile and drop the files of its older fingerprints
+
+    Returns the change in bytes on disk.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    written = len(data)
+    for stale in glob.glob(stale_pattern):
+        if stale != path:
+            try:
+                size = os.path.getsize(stale)
+                os.remove(stale)
+                written -= size
+            except FileNotFoundError:
+                pass
+    return written
+
+
+def _tile_files(directory: str) -> List[tuple]:
+    """(mtime, size, path) of every tile file under the directory"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def _disk_usage(directory: str) -> int:
+    return sum(size for _, size, _ in _tile_files(directory))
+
+
+def _evict(directory: str, target_bytes: int) -> int:
+    """Remove the oldest tile files until the directory fits target_bytes, returns its size"""
+    files = sorted(_tile_files(directory))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+class ListingTileCache:
+    """Mapbox Vector Tiles of listings cached on local disk
+
+    Tile files are named after a fingerprint of their listings (active count
+    and a checksum of their updated_at). A tile is only looked at again once
+    the global listings.updated_at watermark has moved, so an unchanged table
+    costs no SQL per tile. While a transaction that started at or before the
+    watermark is still open, it can commit rows under the watermark, so tiles
+    are looked at again on every watermark check until it ends.
+
+    Looking at a tile again is an EXISTS over rows in the tile written since
+    the horizon of its last validation; every later commit comes from a
+    transaction that started at or after that horizon. Only when it finds
+    rows is the full fingerprint taken. A listing moved out of the tile by a
+    re-import leaves no row behind in it, so tiles are also fingerprinted
+    again TILE_REVALIDATE_SECONDS after their last fingerprint.
+
+    Price filters are part of the tile key, so only multiples of
+    TILE_PRICE_STEP are cached; other values are rendered on every request.
+    Once the directory grows past max_bytes the oldest files are removed
+    down to 90% of it. Each worker tracks the bytes it wrote and re-measures
+    the directory when it evicts, so workers sharing it stay close to the bound.
+    """
+
+    def __init__(
+        self,
+        directory: str = TILE_CACHE_DIR,
+        validated_size: int = TILE_VALIDATED_SIZE,
+        max_bytes: int = TILE_CACHE_MAX_BYTES
+    ):
+        self.directory = directory
+        self.validated_size = validated_size
+        self.max_bytes = max_bytes
+        # Bytes in the directory, measured on the first write
+        self.disk_bytes: Optional[int] = None
+        self._evicting = False
+        self.watermark: Optional[datetime] = None
+        self.horizon: Optional[datetime] = None
+        self.checked_at: Optional[float] = None
+        self.checks = 0
+        # Changes with the watermark, and on every check while it is unsettled
+        self.generation: Optional[tuple] = None
+        # tile key -> (generation the file was validated at, path,
+        #              horizon of that validation, monotonic time of the last fingerprint)
+        self._validated: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.renders = 0
+        self.change_checks = 0
+        self.fingerprints = 0
+        self.uncached = 0
+        self.evictions = 0
+
+    async def _current_generation(self, service: ListingService) -> tuple:
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= TILE_WATERMARK_SECONDS:
+            # Taken before the watermark, so it covers every transaction whose
+            # commit the watermark read may not see
+            self.horizon = await service.get_open_transactions_horizon()
+            self.watermark = await service.get_listings_watermark()
+            settled = self.watermark is None or self.horizon > self.watermark
+            self.checks += 1
+            self.generation = (self.watermark,) if settled else (self.watermark, self.checks)
+            self.checked_at = now
+        return self.generation
+
+    @staticmethod
+    def _cacheable(price_min: Optional[int], price_max: Optional[int]) -> bool:
+        return all(price is None or price % TILE_PRICE_STEP == 0 for price in (price_min, price_max))
+
+    async def _account(self, written: int):
+        """Track bytes on disk after a write and evict the oldest tiles past max_bytes"""
+        if self.disk_bytes is None:
+            self.disk_bytes = await asyncio.to_thread(_disk_usage, self.directory)
+        else:
+            self.disk_bytes += written
+        if self.disk_bytes > self.max_bytes and not self._evicting:
+            self._evicting = True
+            try:
+                self.disk_bytes = await asyncio.to_thread(_evict, self.directory, int(self.max_bytes * 0.9))
+                self.evictions += 1
+            finally:
+                self._evicting = False
+
+    def _tile_dir(self, z: int, x: int, price_min: Optional[int], price_max: Optional[int]) -> str:
+        prices = f"{'' if price_min is None else price_min}-{'' if price_max is None else price_max}"
+        return os.path.join(self.directory, prices, str(z), str(x))
+
+    async def get(
+        self,
+        db: AsyncSession,
+        z: int,
+        x: int,
+        y: int,
+        price_min: Optional[int] = None,
+        price_max: Optional[int] = None
+    ) -> bytes:
+        """Tile bytes from disk, rendered again only when its listings changed"""
+        if not 0 <= z <= TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError("Tile coordinates out of range")
+
+        service = ListingService(db)
+        if not self._cacheable(price_min, price_max):
+            self.uncached += 1
+            return await service.render_listing_tile(z, x, y, price_min, price_max)
+
+        generation = await self._current_generation(service)
+        key = (z, x, y, price_min, price_max)
+
+        validated = self._validated.get(key)
+        if validated is not None and validated[0] != generation:
+            _, path, since, fingerprinted_at = validated
+            if time.monotonic() - fingerprinted_at < TILE_REVALIDATE_SECONDS:
+                self.change_checks += 1
+                if not await service.has_tile_changes(z, x, y, since):
+                    validated = (generation, path, self.horizon, fingerprinted_at)
+                    self._validated[key] = validated
+        if validated is not None and validated[0] == generation:
+            data = await asyncio.to_thread(_read, validated[1])
+            if data is not None:
+                self._validated.move_to_end(key)
+                self.hits += 1
+                return data
+
+        # Horizon of this validation, taken before the fingerprint reads the tile
+        horizon = self.horizon
+        fingerprinted_at = time.monotonic()
+        fingerprint = await service.get_tile_fingerprint(z, x, y, price_min, price_max)
+        self.fingerprints += 1
+        tile_dir = self._tile_dir(z, x, price_min, price_max)
+        path = os.path.join(tile_dir, f"{y}.{fingerprint}.mvt")
+        data = await asyncio.to_thread(_read, path)
+        if data is None:
+            data = await service.render_listing_tile(z, x, y, price_min, price_max)
+            written = await asyncio.to_thread(_write, path, data, os.path.join(tile_dir, f"{y}.*.mvt"))
+            self.renders += 1
+            await self._account(written)
+        else:
+            self.hits += 1
+
+        self._validated[key] = (generation, path, horizon, fingerprinted_at)
+        self._validated.move_to_end(key)
+        while len(self._validated) > self.validated_size:
+            self._validated.popitem(last=False)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "watermark": self.watermark,
+            "horizon": self.horizon,
+            "validated": len(self._validated),
+            "hits": self.hits,
+            "renders": self.renders,
+            "change_checks": self.change_checks,
+            "fingerprints": self.fingerprints,
+            "uncached": self.uncached,
+            "disk_bytes": self.disk_bytes,
+            "evictions": self.evictions,
+        }
+
+
+listing_tiles = ListingTileCache()
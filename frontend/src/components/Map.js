@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import { MapContainer, TileLayer, Marker, Popup, Circle } from 'react-leaflet';
+import React, { useState, useEffect, useRef } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, Circle, CircleMarker, Tooltip, useMap, useMapEvents } from 'react-leaflet';
 import { MapPin, Home, DollarSign, Filter, RefreshCw } from 'lucide-react';
 import { listingAPI } from '../services/api';
 import { useUser } from '../context/UserContext';
@@ -15,10 +15,30 @@ L.Icon.Default.mergeOptions({
   shadowUrl: require('leaflet/dist/images/marker-shadow.png'),
 });
 
+// Reports the visible bounds and zoom on mount and after every pan/zoom
+const ViewportWatcher = ({ onChange }) => {
+  const map = useMap();
+  const report = () => {
+    const bounds = map.getBounds();
+    onChange({
+      min_lat: bounds.getSouth(),
+      min_lon: bounds.getWest(),
+      max_lat: bounds.getNorth(),
+      max_lon: bounds.getEast()
+    }, map.getZoom());
+  };
+
+  useMapEvents({ moveend: report });
+  useEffect(report, []);
+  return null;
+};
+
 const Map = () => {
   const { currentUser } = useUser();
   const { hapticFeedback, showAlert } = useTelegram();
   const [listings, setListings] = useState([]);
+  const [clusters, setClusters] = useState([]);
+  const viewportRef = useRef(null);
   const [loading, setLoading] = useState(true);
   const [userLocation, setUserLocation] = useState(null);
   const [searchRadius, setSearchRadius] = useState(2000); // meters
@@ -31,7 +51,6 @@ const Map = () => {
 
   useEffect(() => {
     getUserLocation();
-    loadListings();
   }, []);
 
   const getUserLocation = () => {
@@ -42,83 +61,59 @@ const Map = () => {
             lat: position.coords.latitude,
             lon: position.coords.longitude
           });
-          loadListingsAtLocation(position.coords.latitude, position.coords.longitude);
         },
         (error) => {
           console.log('Could not get user location:', error);
           // Use Moscow center
           setUserLocation({ lat: moscowCenter[0], lon: moscowCenter[1] });
-          loadListingsAtLocation(moscowCenter[0], moscowCenter[1]);
         }
       );
     } else {
       setUserLocation({ lat: moscowCenter[0], lon: moscowCenter[1] });
-      loadListingsAtLocation(moscowCenter[0], moscowCenter[1]);
     }
   };
 
-  const loadListings = async () => {
+  const loadViewport = async (bounds, zoom) => {
+    viewportRef.current = { bounds, zoom };
     try {
-      const response = await listingAPI.getUserListings();
-      setListings(response.data);
-    } catch (error) {
-      console.error('Error loading listings:', error);
-      // Fallback to general search
-      try {
-        const fallbackResponse = await listingAPI.searchListings({
-          limit: 100
-        });
-        setListings(fallbackResponse.data);
-      } catch (fallbackError) {
-        showAlert('Ошибка при загрузке объявлений на карте');
-      }
-    }
-    setLoading(false);
-  };
-
-  const loadListingsAtLocation = async (lat, lon) => {
-    try {
-      const params = {
-        lat,
-        lon,
-        radius: searchRadius,
-        limit: 100
-      };
-
+      const params = {};
       if (priceFilter.min) params.price_min = parseInt(priceFilter.min);
       if (priceFilter.max) params.price_max = parseInt(priceFilter.max);
 
-      const response = await listingAPI.searchListings(params);
-      setListings(response.data);
+      const response = await listingAPI.getViewport(bounds, zoom, params);
+      // Ignore answers for a viewport the user already moved away from
+      if (viewportRef.current.bounds !== bounds) return;
+      setClusters(response.data.clusters);
+      setListings(response.data.listings);
     } catch (error) {
-      console.error('Error loading listings at location:', error);
-      showAlert('Ошибка при загрузке объявлений');
+      console.error('Error loading viewport listings:', error);
+      showAlert('Ошибка при загрузке объявлений на карте');
+    } finally {
+      // Also after a stale answer, so fast panning never leaves the spinner on
+      setLoading(false);
+    }
+  };
+
+  const reloadViewport = () => {
+    if (viewportRef.current) {
+      loadViewport(viewportRef.current.bounds, viewportRef.current.zoom);
     }
   };
 
   const handleRadiusChange = (newRadius) => {
     setSearchRadius(newRadius);
-    if (userLocation) {
-      loadListingsAtLocation(userLocation.lat, userLocation.lon);
-    }
   };
 
   const handlePriceFilterApply = () => {
     hapticFeedback('selection');
-    if (userLocation) {
-      loadListingsAtLocation(userLocation.lat, userLocation.lon);
-    }
+    reloadViewport();
     setShowFilters(false);
   };
 
   const refreshListings = () => {
     hapticFeedback('impact', 'light');
     setLoading(true);
-    if (userLocation) {
-      loadListingsAtLocation(userLocation.lat, userLocation.lon);
-    } else {
-      loadListings();
-    }
+    reloadViewport();
   };
 
   const formatPrice = (price) => {
@@ -247,6 +242,33 @@ const Map = () => {
                   }}
                 />
 
+                <ViewportWatcher onChange={loadViewport} />
+
+                {/* Clusters when zoomed out */}
+                {clusters.map((cluster) => (
+                  <CircleMarker
+                    key={`${cluster.lat},${cluster.lon}`}
+                    center={[cluster.lat, cluster.lon]}
+                    radius={Math.min(12 + Math.log2(cluster.count) * 3, 32)}
+                    pathOptions={{
+                      fillColor: 'var(--tg-button-color)',
+                      fillOpacity: 0.7,
+                      color: 'var(--tg-button-color)',
+                      weight: 1
+                    }}
+                  >
+                    <Tooltip direction="center" permanent>{cluster.count}</Tooltip>
+                    <Popup>
+                      <div>
+                        <strong>{cluster.count} объявл.</strong>
+                        <div className="text-sm">
+                          {formatPrice(cluster.price_min)} – {formatPrice(cluster.price_max)}
+                        </div>
+                      </div>
+                    </Popup>
+                  </CircleMarker>
+                ))}
+
                 {/* Listings */}
                 {listings.map((listing) => (
                   <Marker
@@ -321,7 +343,9 @@ const Map = () => {
                 <Home size={16} className="tg-text-hint" />
                 <span className="tg-text-hint">Найдено объявлений:</span>
               </div>
-              <span className="font-semibold">{listings.length}</span>
+              <span className="font-semibold">
+                {listings.length + clusters.reduce((total, cluster) => total + cluster.count, 0)}
+              </span>
             </div>
             
             {userLocation && (
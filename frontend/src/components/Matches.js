@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { MessageCircle, MapPin, Calendar, Heart, DollarSign, ExternalLink } from 'lucide-react';
-import { userAPI } from '../services/api';
+import { userAPI, getNextCursor } from '../services/api';
 import { useTelegram } from '../hooks/useTelegram';
 
 const Matches = () => {
@@ -17,8 +17,16 @@ const Matches = () => {
 
   const loadMatches = async () => {
     try {
-      const response = await userAPI.getMatches();
-      setMatches(response.data);
+      // Follow the cursor until the last page, showing each page as it arrives
+      let cursor = null;
+      let loaded = [];
+      do {
+        const response = await userAPI.getMatches(cursor);
+        loaded = [...loaded, ...response.data];
+        setMatches(loaded);
+        setLoading(false);
+        cursor = getNextCursor(response);
+      } while (cursor);
     } catch (error) {
       console.error('Error loading matches:', error);
       showAlert('Ошибка при загрузке матчей');
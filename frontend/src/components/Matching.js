@@ -16,7 +16,7 @@ const Matching = () => {
 
   const loadPotentialMatches = async () => {
     try {
-      const response = await userAPI.getPotentialMatches(20);
+      const response = await userAPI.getSwipeQueue(20);
       setPotentialMatches(response.data);
       setCurrentIndex(0);
     } catch (error) {
@@ -26,6 +26,15 @@ const Matching = () => {
     setLoading(false);
   };
 
+  const loadMorePotentialMatches = async () => {
+    try {
+      const response = await userAPI.getSwipeQueue(20);
+      setPotentialMatches((prev) => [...prev, ...response.data]);
+    } catch (error) {
+      console.error('Error loading more matches:', error);
+    }
+  };
+
   const handleLike = async () => {
     if (currentIndex >= potentialMatches.length) return;
     
@@ -63,7 +72,7 @@ const Matching = () => {
     
     // Load more users if running low
     if (newIndex >= potentialMatches.length - 3) {
-      loadPotentialMatches();
+      loadMorePotentialMatches();
     }
   };
 
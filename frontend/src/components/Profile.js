@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Camera, MapPin, DollarSign, Calendar, Edit3 } from 'lucide-react';
 import { useUser } from '../context/UserContext';
-import { userAPI } from '../services/api';
+import { userAPI, metroAPI } from '../services/api';
 import { useTelegram } from '../hooks/useTelegram';
 
 const Profile = () => {
@@ -10,6 +10,7 @@ const Profile = () => {
   const [editing, setEditing] = useState(false);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
+  const [stations, setStations] = useState([]);
   const [profile, setProfile] = useState({
     first_name: '',
     last_name: '',
@@ -18,6 +19,7 @@ const Profile = () => {
     price_min: '',
     price_max: '',
     metro_station: '',
+    metro_station_id: null,
     search_radius: '1000',
     lat: null,
     lon: null
@@ -50,6 +52,7 @@ const Profile = () => {
         price_min: userData.price_min || '',
         price_max: userData.price_max || '',
         metro_station: userData.metro_station || '',
+        metro_station_id: userData.metro_station_id || null,
         search_radius: userData.search_radius || '1000',
         photo_url: userData.photo_url
       });
@@ -67,6 +70,19 @@ const Profile = () => {
     setLoading(false);
   };
 
+  const handleStationChange = async (value) => {
+    const match = stations.find(station => station.name === value);
+    setProfile(prev => ({ ...prev, metro_station: value, metro_station_id: match ? match.id : null }));
+    if (!match && value) {
+      try {
+        const response = await metroAPI.getStations(value);
+        setStations(response.data);
+      } catch (error) {
+        console.error('Error loading metro stations:', error);
+      }
+    }
+  };
+
   const handleSave = async () => {
     if (!profile.first_name || !profile.age) {
       showAlert('Пожалуйста, заполните обязательные поля (имя и возраст)');
@@ -86,8 +102,8 @@ const Profile = () => {
         search_radius: parseInt(profile.search_radius)
       };
 
-      // Get location if needed
-      if (!profile.lat && !profile.lon && navigator.geolocation) {
+      // Get location if needed; a chosen station gives the search point
+      if (!profile.lat && !profile.lon && !profile.metro_station_id && navigator.geolocation) {
         try {
           const position = await new Promise((resolve, reject) => {
             navigator.geolocation.getCurrentPosition(resolve, reject);
@@ -319,13 +335,21 @@ const Profile = () => {
               <label className="tg-text-hint">Станция метро</label>
             </div>
             {editing ? (
-              <input
-                className="tg-input"
-                type="text"
-                value={profile.metro_station}
-                onChange={(e) => setProfile(prev => ({ ...prev, metro_station: e.target.value }))}
-                placeholder="Например: Сокольники"
-              />
+              <>
+                <input
+                  className="tg-input"
+                  type="text"
+                  list="metro-stations"
+                  value={profile.metro_station}
+                  onChange={(e) => handleStationChange(e.target.value)}
+                  placeholder="Например: Сокольники"
+                />
+                <datalist id="metro-stations">
+                  {stations.map(station => (
+                    <option key={station.id} value={station.name}>{station.line}</option>
+                  ))}
+                </datalist>
+              </>
             ) : (
               <div>{profile.metro_station || 'Не указано'}</div>
             )}
@@ -29,12 +29,19 @@ const getAuthToken = () => {
 };
 
 // Add auth header to requests
+// Time of this client's last write, sent back so any backend worker can
+// keep our reads off a replica that has not replayed it yet
+let lastWrite = null;
+
 api.interceptors.request.use(
   (config) => {
     const token = getAuthToken();
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    if (lastWrite) {
+      config.headers['X-Last-Write'] = lastWrite;
+    }
     return config;
   },
   (error) => {
@@ -44,7 +51,13 @@ api.interceptors.request.use(
 
 // Response interceptor for error handling
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    const marker = response.headers['x-last-write'];
+    if (marker) {
+      lastWrite = marker;
+    }
+    return response;
+  },
   (error) => {
     if (error.response?.status === 401) {
       // Handle unauthorized
@@ -66,14 +79,27 @@ export const userAPI = {
   updateUser: (userData) => api.put('/api/users/me', userData),
   
   // Get potential matches
-  getPotentialMatches: (limit = 10) => 
-    api.get('/api/users/potential-matches', { params: { limit } }),
+  getPotentialMatches: (limit = 10, cursor = null) => 
+    api.get('/api/users/potential-matches', { params: { limit, cursor } }),
+  
+  // Get potential matches ranked by match score, with its components
+  getRankedMatches: (limit = 10, cursor = null) =>
+    api.get('/api/users/potential-matches/ranked', { params: { limit, cursor } }),
+  
+  // Take the next candidates from the server-side swipe queue
+  getSwipeQueue: (count = 10) =>
+    api.get('/api/users/swipe-queue', { params: { count } }),
   
   // Like a user
   likeUser: (userId) => api.post(`/api/users/${userId}/like`),
+
+  // Like a queue of users in one request
+  likeUsersBatch: (userIds) =>
+    api.post('/api/users/likes:batch', { user_ids: userIds }),
   
   // Get matches
-  getMatches: () => api.get('/api/users/matches'),
+  getMatches: (cursor = null) =>
+    api.get('/api/users/matches', { params: { cursor } }),
   
   // Get user's liked listings
   getUserLikedListings: (userId) => 
@@ -84,6 +110,14 @@ export const listingAPI = {
   // Search listings
   searchListings: (params) => api.get('/api/listings/', { params }),
   
+  // Search with room/price/area facet counts; rooms as "1,2,3"
+  searchFacetedListings: (params) => api.get('/api/listings/faceted', { params }),
+  
+  // Listings in a map viewport; grid clusters when zoomed out
+  getViewport: (bounds, zoom, params = {}) => api.get('/api/listings/viewport', {
+    params: { ...bounds, zoom, ...params }
+  }),
+  
   // Get listings for current user
   getUserListings: () => api.get('/api/listings/search'),
   
@@ -94,4 +128,19 @@ export const listingAPI = {
   getLikedListings: () => api.get('/api/listings/liked'),
 };
 
+export const metroAPI = {
+  // Registered metro stations, filtered by name prefix
+  getStations: (q, limit = 20) => api.get('/api/metro/stations', { params: { q, limit } }),
+};
+
+// URL template of the listing vector tiles, for a Leaflet/Mapbox vector tile layer
+export const listingTilesUrl = (params = {}) => {
+  const query = new URLSearchParams(params).toString();
+  return `${API_BASE_URL}/api/tiles/listings/{z}/{x}/{y}.mvt${query ? `?${query}` : ''}`;
+};
+
+// Cursor of the next page for keyset-paginated endpoints, null on the last page
+export const getNextCursor = (response) =>
+  response.headers['x-next-cursor'] || null;
+
 export default api;
\ No newline at end of file
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Lets the db-replica service stream WAL from this primary
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"